@@ -1,33 +1,263 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+import time
+# Measured from here, before the heavy imports, for the startup report in /admin/stats
+_import_started = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, g
 import mysql.connector
 from mysql.connector import Error
-import bcrypt
 import re
+import json
+import hashlib
+import hmac
 from functools import wraps
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, date
 import os
-from dotenv import load_dotenv
+import socket
+from config import db_config as connection_settings, load_config
+from storage import create_database
+from cache import TTLCache
+from pagination import decode_cursor, page_size, split_page
+import repository
+from search_index import LocationIndex
+from events import EventBroker, user_channel
+from passwords import PasswordHasher, HasherBusy
+from seats import reconcile_seat_counts, reserve_seat
+from profiler import QueryProfiler
+from matching import PendingRequestIndex, RideMatcher, apply_assignments, load_open_requests, load_open_ride, load_open_rides
+from scheduler import Scheduler, claim_run
+from sessions import ServerSessionInterface, create_session_store
+from metrics import Metrics, render_stats
+
+# The app and the services its handlers share are built by create_app().
+# They are module globals, so there is one app per process.
+app = None
+db_config = None
+db_pool = None                  # Connections are borrowed from a shared pool instead of being opened per request
+query_profiler = None           # Times every statement run through get_db_connection(); see /admin/stats
+admin_emails = set()            # Emails allowed to see /admin/stats
+password_hasher = None          # bcrypt on a few dedicated threads; logins beyond the queue limit get a 503
+rides_cache = None              # Listing pages shared by all requests, invalidated by the handlers that change them
+location_index = None           # Resolves search terms to stored location names for IN (...) filters
+event_broker = None             # Ride request notifications pushed to open /events streams
+ride_matcher = None             # Assigns open Ride_Request rows to active rides (see /admin/match_rides)
+pending_requests_index = None   # Open requests in memory, so a ride write only rescores the requests it could serve
+scheduler = None                # Ride lifecycle sweeps and archival on a background thread
+session_interface = None        # Server-side sessions behind a per-worker cache; logins can be revoked
+page_loader = None              # Runs the dashboard's and profile's queries at once on spare pooled connections
+metrics = None                  # Request counts, latency histograms and in-flight gauges for /metrics
 
-load_dotenv()
+# How long this process took to start, reported by /admin/stats
+startup = {'import_seconds': None, 'create_app_seconds': None, 'phases': {}}
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here-1234567890'
+_routes = []
 
-# MySQL Configuration
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': 'sanu123',  # Your MySQL password
-    'database': 'ride_sharing'
-}
+def route(rule, **options):
+    # Collects the handlers below; create_app() adds them to the app
+    def decorator(f):
+        _routes.append((rule, f, options))
+        return f
+    return decorator
 
+@contextmanager
 def get_db_connection():
+    # Yields None when no connection could be obtained; the connection always
+    # goes back to the pool when the block exits, even on an early return
     try:
-        connection = mysql.connector.connect(**db_config)
-        return connection
+        connection = db_pool.acquire()
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
-        return None
+        yield None
+        return
+    try:
+        yield query_profiler.wrap(connection)
+    finally:
+        db_pool.release(connection)
+
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    metrics.request_started(request.endpoint or 'none')
+
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+def finish_request_metrics(exc):
+    # Teardown runs for every request, including ones that raised
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics.request_finished(request.endpoint or 'none', request.method,
+                                 g.pop('response_status', 500), time.perf_counter() - started)
+
+def start_query_profile():
+    g.request_started = time.perf_counter()
+    g.query_profile_token = query_profiler.start_request()
+
+def finish_query_profile(response):
+    token = g.pop('query_profile_token', None)
+    if token is not None:
+        elapsed = time.perf_counter() - g.request_started
+        profile = query_profiler.end_request(token, request.endpoint or 'unknown', elapsed)
+        if profile and profile.queries:
+            response.headers['Server-Timing'] = f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"'
+    return response
+
+def upgrade_password_hash(user, password):
+    # Re-hash with the current cost factor after a successful login. Best
+    # effort: the login goes ahead even if this is skipped.
+    try:
+        password_hash = password_hasher.hash(password)
+    except HasherBusy:
+        return
+    with get_db_connection() as conn:
+        if not conn:
+            return
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                'UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s',
+                (password_hash, user['id'], user['password_hash'])
+            )
+            conn.commit()
+        except Error as e:
+            print(f"Error updating password hash: {e}")
+        finally:
+            cursor.close()
+
+# Every user sees the same upcoming rides, so listing pages are cached for all
+# requests and invalidated by the handlers that change them
+RIDES_CACHE_KEY = 'upcoming_rides'
+
+# Search terms are resolved to stored location names in memory, so the rides
+# query filters with IN (...) on indexed columns instead of LIKE '%term%'
+def refresh_location_index(cursor):
+    cursor.execute('''
+        SELECT source_location FROM rides GROUP BY source_location
+        UNION
+        SELECT destination_location FROM rides GROUP BY destination_location
+    ''')
+    location_index.rebuild(row['source_location'] for row in cursor.fetchall())
+
+def not_modified(etag):
+    # 304 when the client already holds this version. Skipped while flash
+    # messages are pending, since they are only shown by a full render.
+    if etag in request.if_none_match and not session.get('_flashes'):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def bump_request_version(cursor, driver_id):
+    # Changes the ETag of the driver's /get_pending_requests list; call inside
+    # the transaction that changes their requests
+    cursor.execute('UPDATE users SET request_version = request_version + 1 WHERE id = %s', (driver_id,))
+
+def match_ride_incrementally(connection, ride_id):
+    # Runs after the handler's own commit, in a separate transaction; the
+    # handler's result stands even if matching fails
+    cursor = connection.cursor(dictionary=True)
+    try:
+        # The scheduler reloads the index in the background; the write path
+        # only loads it when nothing else will (first use, or no scheduler)
+        if pending_requests_index.is_stale() and (not pending_requests_index.is_built() or not scheduler.running):
+            pending_requests_index.rebuild(load_open_requests(cursor))
+        ride = load_open_ride(cursor, ride_id)
+        if not ride:
+            return
+        assignments = ride_matcher.match_ride(ride, pending_requests_index)
+        if not assignments:
+            return
+        requests_by_id = {a.request_id: pending_requests_index.get(a.request_id) for a in assignments}
+
+        applied = apply_assignments(cursor, assignments)
+        if applied:
+            bump_request_version(cursor, ride['driver_id'])
+        connection.commit()
+
+        # Only requests that were matched leave the index; one that did not
+        # apply stays until the next reload shows whether it is still open
+        pending_requests_index.discard(assignment.request_id for assignment in applied)
+        notify_matched_requests(applied, requests_by_id)
+    except Exception as e:
+        connection.rollback()
+        print(f"Error matching requests to ride {ride_id}: {e}")
+    finally:
+        cursor.close()
+
+def notify_matched_requests(applied, requests_by_id):
+    # Matched requests show up as new join requests for their drivers
+    for assignment in applied:
+        ride_request = requests_by_id[assignment.request_id]
+        event_broker.publish(user_channel(assignment.driver_id), 'ride_request', {
+            'request_id': assignment.request_id,
+            'matched_ride_id': assignment.ride_id,
+            'passenger_id': assignment.passenger_id,
+            'rider_source': ride_request['rider_source'],
+            'rider_destination': ride_request['rider_destination'],
+            'preferred_date': ride_request['preferred_date'],
+            'preferred_time': ride_request['preferred_time'],
+            'status': 'pending',
+        })
+
+def run_lifecycle_sweep():
+    from lifecycle import sweep_ride_lifecycle
+
+    with get_db_connection() as connection:
+        if not connection:
+            raise Error(msg='Database connection failed')
+        result = sweep_ride_lifecycle(connection, batch_size=app.config['LIFECYCLE_BATCH_SIZE'])
+    if result['rides']:
+        rides_cache.invalidate()
+    return result
+
+def refresh_pending_requests():
+    # Per process: every worker keeps its own index
+    with get_db_connection() as connection:
+        if not connection:
+            raise Error(msg='Database connection failed')
+        cursor = connection.cursor(dictionary=True)
+        try:
+            pending_requests_index.rebuild(load_open_requests(cursor))
+        finally:
+            cursor.close()
+    return len(pending_requests_index)
+
+def run_archival():
+    from archive import archive_past_rides
+
+    with get_db_connection() as connection:
+        if not connection:
+            raise Error(msg='Database connection failed')
+        return archive_past_rides(
+            connection,
+            keep_days=app.config['ARCHIVE_AFTER_DAYS'],
+            batch_size=app.config['ARCHIVE_BATCH_SIZE'],
+        )
+
+def claim_scheduled_run(name, interval):
+    with get_db_connection() as connection:
+        if not connection:
+            return False
+        return claim_run(connection, name, interval)
+
+def start_scheduler():
+    # Started by the first request, so the thread lives in the serving process
+    if not scheduler.running:
+        scheduler.start()
+
+def page_links(next_cursor):
+    # Links for the rides.html pager, keeping the current search filters
+    args = request.args.to_dict()
+    args.pop('cursor', None)
+    first_url = url_for(request.endpoint, **args) if request.args.get('cursor') else None
+    next_url = url_for(request.endpoint, cursor=next_cursor, **args) if next_cursor else None
+    return {'first_url': first_url, 'next_url': next_url}
 
 # Login required decorator
 def login_required(f):
@@ -39,14 +269,23 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/')
+# Admin required decorator
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get('email') not in admin_emails:
+            return jsonify({'error': 'Forbidden'}), 403
+        return f(*args, **kwargs)
+    return login_required(decorated_function)
+
+@route('/')
 def home():
     # if 'user_id' in session:
     #     return redirect(url_for('dashboard'))
     return render_template('home.html')
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -56,30 +295,43 @@ def login():
             flash('Please fill in all fields.', 'error')
             return redirect(url_for('login'))
         
-        try:
-            conn = get_db_connection()
+        user = None
+        with get_db_connection() as conn:
+            if not conn:
+                flash('Database error occurred.', 'error')
+                return render_template('login.html')
+
             cursor = conn.cursor(dictionary=True)
-            
-            cursor.execute('SELECT * FROM users WHERE email = %s', (email,))
-            user = cursor.fetchone()
-            
-            if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+            try:
+                cursor.execute('SELECT * FROM users WHERE email = %s', (email,))
+                user = cursor.fetchone()
+
+            except mysql.connector.Error as err:
+                flash('Database error occurred.', 'error')
+                return render_template('login.html')
+            finally:
+                cursor.close()
+
+        # The connection is back in the pool before the slow password check
+        try:
+            if user and password_hasher.check(password, user['password_hash']):
+                if password_hasher.needs_rehash(user['password_hash']):
+                    upgrade_password_hash(user, password)
+                # A new session id on login, so an id planted before it is useless
+                session.rotate()
                 session['user_id'] = user['id']
                 session['email'] = user['email']
                 flash('Login successful!', 'success')
                 return redirect(url_for('dashboard'))
             else:
                 flash('Invalid email or password.', 'error')
-                
-        except mysql.connector.Error as err:
-            flash('Database error occurred.', 'error')
-        finally:
-            cursor.close()
-            conn.close()
-            
+        except HasherBusy as e:
+            flash(str(e), 'error')
+            return render_template('login.html'), 503
+
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         roll_number = request.form.get('roll_number')
@@ -96,630 +348,765 @@ def register():
             flash('Invalid email format.', 'error')
             return redirect(url_for('register'))
             
+        # Hash password before borrowing a connection, so a pooled connection
+        # is never held while bcrypt runs
         try:
-            conn = get_db_connection()
+            password_hash = password_hasher.hash(password)
+        except HasherBusy as e:
+            flash(str(e), 'error')
+            return render_template('register.html'), 503
+
+        with get_db_connection() as conn:
+            if not conn:
+                flash('Database error occurred.', 'error')
+                return render_template('register.html')
+
             cursor = conn.cursor()
-            
-            # Check if email or roll number already exists
-            cursor.execute('SELECT * FROM users WHERE email = %s OR roll_number = %s', (email, roll_number))
-            if cursor.fetchone():
-                flash('Email or roll number already exists.', 'error')
-                return redirect(url_for('register'))
-            
-            # Hash password
-            salt = bcrypt.gensalt()
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), salt)
-            
-            # Insert new user
-            cursor.execute(
-                'INSERT INTO users (roll_number, college_name, email, password_hash) VALUES (%s, %s, %s, %s)',
-                (roll_number, college_name, email, password_hash.decode('utf-8'))
-            )
-            conn.commit()
-            
-            flash('Registration successful! Please login.', 'success')
-            return redirect(url_for('login'))
-            
-        except mysql.connector.Error as err:
-            flash('Database error occurred.', 'error')
-        finally:
-            cursor.close()
-            conn.close()
-            
+            try:
+                # Check if email or roll number already exists
+                cursor.execute('SELECT * FROM users WHERE email = %s OR roll_number = %s', (email, roll_number))
+                if cursor.fetchone():
+                    flash('Email or roll number already exists.', 'error')
+                    return redirect(url_for('register'))
+
+                # Insert new user
+                cursor.execute(
+                    'INSERT INTO users (roll_number, college_name, email, password_hash) VALUES (%s, %s, %s, %s)',
+                    (roll_number, college_name, email, password_hash)
+                )
+                conn.commit()
+
+                flash('Registration successful! Please login.', 'success')
+                return redirect(url_for('login'))
+
+            except mysql.connector.Error as err:
+                flash('Database error occurred.', 'error')
+            finally:
+                cursor.close()
+
     return render_template('register.html')
 
-@app.route('/dashboard')
+@route('/dashboard')
 @login_required
 def dashboard():
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
+    with get_db_connection() as connection:
         if not connection:
             flash('Database connection failed', 'error')
             return render_template('dashboard.html', rides=[], vehicles=[], requests=[])
-            
-        cursor = connection.cursor(dictionary=True)
-        
-        # Get user's rides
-        cursor.execute('''
-            SELECT r.*, u.email as driver_email, v.vehicle_model, v.vehicle_no
-            FROM rides r
-            JOIN users u ON r.driver_id = u.id
-            JOIN vehicle v ON r.vehicle_id = v.vehicle_id
-            WHERE r.driver_id = %s
-            ORDER BY r.ride_date DESC, r.ride_time DESC
-        ''', (session['user_id'],))
-        rides = cursor.fetchall()
-        
-        # Get user's vehicles
-        cursor.execute('SELECT * FROM vehicle WHERE user_id = %s', (session['user_id'],))
-        vehicles = cursor.fetchall()
-
-        # Get pending ride requests for the driver's rides
-        cursor.execute('''
-            SELECT rr.*, u.email as passenger_email, r.source_location, r.destination_location, 
-                   r.ride_date, r.ride_time, v.vehicle_model, v.vehicle_no
-            FROM Ride_Request rr
-            JOIN rides r ON rr.matched_ride_id = r.ride_id
-            JOIN users u ON rr.passenger_id = u.id
-            JOIN vehicle v ON r.vehicle_id = v.vehicle_id
-            WHERE r.driver_id = %s AND rr.status = 'pending'
-            ORDER BY rr.created_at DESC
-        ''', (session['user_id'],))
-        requests = cursor.fetchall()
-        
-        return render_template('dashboard.html', rides=rides, vehicles=vehicles, requests=requests)
-        
-    except Exception as e:
-        flash('Error fetching dashboard data: ' + str(e), 'error')
-        return render_template('dashboard.html', rides=[], vehicles=[], requests=[])
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
-@app.route('/logout')
+        try:
+            # Get user's rides, vehicles and the pending ride requests for their rides
+            page = page_loader.load(
+                connection,
+                rides=(repository.list_driver_rides, session['user_id']),
+                vehicles=(repository.list_vehicles, session['user_id']),
+                requests=(repository.list_driver_requests, session['user_id']),
+            )
+            return render_template('dashboard.html', **page)
+
+        except Exception as e:
+            flash('Error fetching dashboard data: ' + str(e), 'error')
+            return render_template('dashboard.html', rides=[], vehicles=[], requests=[])
+
+@route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out.', 'success')
     return redirect(url_for('login'))
 
-@app.route('/create_ride', methods=['GET', 'POST'])
+@route('/logout_everywhere', methods=['POST'])
+@login_required
+def logout_everywhere():
+    # Ends this user's sessions in every browser, not just this one
+    session_interface.revoke_user(session['user_id'])
+    session.clear()
+    flash('You have been logged out on all devices.', 'success')
+    return redirect(url_for('login'))
+
+@route('/create_ride', methods=['GET', 'POST'])
 @login_required
 def create_ride():
     if request.method == 'GET':
-        connection = None
-        cursor = None
-        try:
-            connection = get_db_connection()
+        with get_db_connection() as connection:
             if not connection:
                 flash('Database connection failed', 'error')
                 return render_template('create_ride.html', vehicles=[])
-                
-            cursor = connection.cursor(dictionary=True)
-            
-            # Get user's vehicles
-            cursor.execute('SELECT * FROM vehicle WHERE user_id = %s', (session['user_id'],))
-            vehicles = cursor.fetchall()
-            
-            return render_template('create_ride.html', vehicles=vehicles)
-            
-        except Exception as e:
-            flash('Error fetching vehicles: ' + str(e), 'error')
-            return render_template('create_ride.html', vehicles=[])
-            
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
-                
+
+            try:
+                # Get user's vehicles
+                vehicles = repository.list_vehicles(connection, session['user_id'])
+                return render_template('create_ride.html', vehicles=vehicles)
+
+            except Exception as e:
+                flash('Error fetching vehicles: ' + str(e), 'error')
+                return render_template('create_ride.html', vehicles=[])
+
     elif request.method == 'POST':
-        connection = None
-        cursor = None
-        try:
-            connection = get_db_connection()
+        with get_db_connection() as connection:
             if not connection:
                 flash('Database connection failed', 'error')
                 return redirect(url_for('create_ride'))
-                
+
             cursor = connection.cursor()
-            
-            source = request.form['source']
-            destination = request.form['destination']
-            ride_date = request.form['ride_date']   
-            ride_time = request.form['ride_time']
-            seats_offered = request.form['seats_offered']
-            vehicle_id = request.form['vehicle_id']
-            
-            cursor.execute('''
-                INSERT INTO rides (driver_id, vehicle_id, source_location, destination_location, 
-                                 ride_date, ride_time, seats_offered)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ''', (session['user_id'], vehicle_id, source, destination, ride_date, ride_time, seats_offered))
-            
-            connection.commit()
-            flash('Ride created successfully!', 'success')
-            return redirect(url_for('dashboard'))
-            
-        except Exception as e:
-            flash('Error creating ride: ' + str(e), 'error')
-            return redirect(url_for('create_ride'))
-            
-        finally:
-            if cursor:
+            try:
+                source = request.form['source']
+                destination = request.form['destination']
+                ride_date = request.form['ride_date']   
+                ride_time = request.form['ride_time']
+                seats_offered = request.form['seats_offered']
+                vehicle_id = request.form['vehicle_id']
+
+                cursor.execute('''
+                    INSERT INTO rides (driver_id, vehicle_id, source_location, destination_location, 
+                                     ride_date, ride_time, seats_offered, seats_remaining)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ''', (session['user_id'], vehicle_id, source, destination, ride_date, ride_time,
+                      seats_offered, seats_offered))
+                ride_id = cursor.lastrowid
+
+                connection.commit()
+                rides_cache.invalidate()
+                location_index.add(source, destination)
+                match_ride_incrementally(connection, ride_id)
+                flash('Ride created successfully!', 'success')
+                return redirect(url_for('dashboard'))
+
+            except Exception as e:
+                flash('Error creating ride: ' + str(e), 'error')
+                return redirect(url_for('create_ride'))
+
+            finally:
                 cursor.close()
-            if connection:
-                connection.close()
 
-@app.route('/rides')
+def load_upcoming_rides(position, size):
+    with get_db_connection() as connection:
+        if not connection:
+            raise Error(msg='Database connection failed')
+
+        # Get one page of available rides, plus one row to tell if there is a next page
+        rides, next_cursor = split_page(repository.list_upcoming_rides(connection, position, size + 1), size)
+
+        # Computed once per cache fill and used as the page's ETag
+        digest = hashlib.md5(json.dumps([rides, next_cursor], default=str).encode('utf-8')).hexdigest()
+        return rides, next_cursor, digest
+
+@route('/rides')
 @login_required
 def view_rides():
-    connection = None
-    cursor = None
+    size = page_size(request.args.get('per_page'))
+    position = decode_cursor(request.args.get('cursor'))
     try:
-        connection = get_db_connection()
-        if not connection:
-            flash('Database connection failed', 'error')
-            return render_template('rides.html', rides=[])
-            
-        cursor = connection.cursor(dictionary=True)
-        
-        # Get all available rides
-        cursor.execute('''
-            SELECT r.*, u.email as driver_email, v.vehicle_model, v.vehicle_no
-            FROM rides r
-            JOIN users u ON r.driver_id = u.id
-            JOIN vehicle v ON r.vehicle_id = v.vehicle_id
-            WHERE r.ride_date >= CURDATE()
-            ORDER BY r.ride_date, r.ride_time
-        ''')
-        rides = cursor.fetchall()
-        
-        return render_template('rides.html', rides=rides)
-        
+        rides, next_cursor, digest = rides_cache.get_or_load(
+            (RIDES_CACHE_KEY, position, size),
+            lambda: load_upcoming_rides(position, size)
+        )
+
+        etag = f"rides-{session['user_id']}-{digest}"
+        response = not_modified(etag)
+        if response:
+            return response
+
+        html = render_template('rides.html', rides=rides, **page_links(next_cursor))
+        return with_etag(app.make_response(html), etag)
+
     except Exception as e:
         flash('Error fetching rides: ' + str(e), 'error')
         return render_template('rides.html', rides=[])
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
-@app.route('/join_ride', methods=['POST'])
+@route('/join_ride', methods=['POST'])
 @login_required
 def join_ride():
-    connection = None
-    cursor = None
-    try:
-        data = request.get_json()
-        ride_id = data.get('ride_id')
-        
-        if not ride_id:
-            return jsonify({'error': 'Ride ID is required'}), 400
-            
-        connection = get_db_connection()
+    data = request.get_json(silent=True) or {}
+    ride_id = data.get('ride_id')
+
+    if not ride_id:
+        return jsonify({'error': 'Ride ID is required'}), 400
+
+    with get_db_connection() as connection:
         if not connection:
             return jsonify({'error': 'Database connection failed'}), 500
-            
+
         cursor = connection.cursor(dictionary=True)
-        
-        # Get ride details for the request
-        cursor.execute('''
-            SELECT r.*, u.email as driver_email
-            FROM rides r
-            JOIN users u ON r.driver_id = u.id
-            WHERE r.ride_id = %s
-        ''', (ride_id,))
-        ride = cursor.fetchone()
-        
-        if not ride:
-            return jsonify({'error': 'Ride not found'}), 404
-            
-        # Check if user is the driver of this ride
-        if ride['driver_id'] == session['user_id']:
-            return jsonify({'error': 'You cannot request to join your own ride'}), 400
-            
-        # Check available seats
-        cursor.execute('''
-            SELECT r.seats_offered, COUNT(rp.participation_id) as current_passengers
-            FROM rides r
-            LEFT JOIN Ride_Participation rp ON r.ride_id = rp.ride_id AND rp.role = 'passenger'
-            WHERE r.ride_id = %s
-            GROUP BY r.ride_id
-        ''', (ride_id,))
-        seat_data = cursor.fetchone()
-        
-        if seat_data['current_passengers'] >= seat_data['seats_offered']:
-            return jsonify({'error': 'No seats available'}), 400
-            
-        # Check if user already joined this ride
-        cursor.execute('''
-            SELECT * FROM Ride_Participation 
-            WHERE ride_id = %s AND student_id = %s
-        ''', (ride_id, session['user_id']))
-        if cursor.fetchone():
-            return jsonify({'error': 'You have already joined this ride'}), 400
-            
-        # Create ride request with all required fields
-        cursor.execute('''
-            INSERT INTO Ride_Request 
-            (passenger_id, rider_source, rider_destination, preferred_date, preferred_time, 
-             status, matched_ride_id) 
-            VALUES (%s, %s, %s, %s, %s, 'pending', %s)
-        ''', (session['user_id'], ride['source_location'], ride['destination_location'], 
-              ride['ride_date'], ride['ride_time'], ride_id))
-        
-        connection.commit()
-        return jsonify({'message': 'Join request sent successfully'})
-        
-    except Exception as e:
-        if connection:
+        try:
+            # Get ride details for the request
+            cursor.execute('''
+                SELECT r.*, u.email as driver_email
+                FROM rides r
+                JOIN users u ON r.driver_id = u.id
+                WHERE r.ride_id = %s
+            ''', (ride_id,))
+            ride = cursor.fetchone()
+
+            if not ride:
+                return jsonify({'error': 'Ride not found'}), 404
+
+            # Departed and cancelled rides cannot be joined
+            if ride['status'] != 'active':
+                return jsonify({'error': 'This ride is no longer available'}), 400
+
+            # Check if user is the driver of this ride
+            if ride['driver_id'] == session['user_id']:
+                return jsonify({'error': 'You cannot request to join your own ride'}), 400
+
+            # Check available seats (the seat itself is reserved when the driver accepts)
+            if ride['seats_remaining'] <= 0:
+                return jsonify({'error': 'No seats available'}), 400
+
+            # Check if user already joined this ride
+            cursor.execute('''
+                SELECT * FROM Ride_Participation 
+                WHERE ride_id = %s AND student_id = %s
+            ''', (ride_id, session['user_id']))
+            if cursor.fetchone():
+                return jsonify({'error': 'You have already joined this ride'}), 400
+
+            # Create ride request with all required fields
+            cursor.execute('''
+                INSERT INTO Ride_Request 
+                (passenger_id, rider_source, rider_destination, preferred_date, preferred_time, 
+                 status, matched_ride_id) 
+                VALUES (%s, %s, %s, %s, %s, 'pending', %s)
+            ''', (session['user_id'], ride['source_location'], ride['destination_location'], 
+                  ride['ride_date'], ride['ride_time'], ride_id))
+            request_id = cursor.lastrowid
+            bump_request_version(cursor, ride['driver_id'])
+
+            connection.commit()
+
+            # Tell the driver right away instead of waiting for their next poll
+            event_broker.publish(user_channel(ride['driver_id']), 'ride_request', {
+                'request_id': request_id,
+                'matched_ride_id': int(ride_id),
+                'passenger_id': session['user_id'],
+                'passenger_email': session.get('email'),
+                'rider_source': ride['source_location'],
+                'rider_destination': ride['destination_location'],
+                'preferred_date': ride['ride_date'],
+                'preferred_time': ride['ride_time'],
+                'status': 'pending',
+            })
+            return jsonify({'message': 'Join request sent successfully'})
+
+        except Exception as e:
             connection.rollback()
-        return jsonify({'error': str(e)}), 500
-        
-    finally:
-        if cursor:
+            return jsonify({'error': str(e)}), 500
+
+        finally:
             cursor.close()
-        if connection:
-            connection.close()
 
-@app.route('/handle_request', methods=['POST'])
+@route('/handle_request', methods=['POST'])
 @login_required
 def handle_request():
-    connection = None
-    cursor = None
-    try:
-        if not request.is_json:
-            return jsonify({'error': 'Invalid request format'}), 400
-            
-        data = request.get_json()
-        request_id = data.get('request_id')
-        ride_id = data.get('ride_id')
-        action = data.get('action')
-        
-        if not all([request_id, ride_id, action]):
-            return jsonify({'error': 'Missing required parameters'}), 400
-            
-        if action not in ['accept', 'reject']:
-            return jsonify({'error': 'Invalid action'}), 400
-            
-        # Get database connection
-        connection = get_db_connection()
+    if not request.is_json:
+        return jsonify({'error': 'Invalid request format'}), 400
+
+    data = request.get_json()
+    request_id = data.get('request_id')
+    ride_id = data.get('ride_id')
+    action = data.get('action')
+
+    if not all([request_id, ride_id, action]):
+        return jsonify({'error': 'Missing required parameters'}), 400
+
+    if action not in ['accept', 'reject']:
+        return jsonify({'error': 'Invalid action'}), 400
+
+    # Get database connection
+    with get_db_connection() as connection:
         if not connection:
             return jsonify({'error': 'Database connection failed'}), 500
-            
+
         cursor = connection.cursor(dictionary=True)
-        
-        # Verify that the ride belongs to the current user
-        cursor.execute("SELECT driver_id FROM rides WHERE ride_id = %s", (ride_id,))
-        ride = cursor.fetchone()
-        
-        if not ride or ride['driver_id'] != session['user_id']:
-            return jsonify({'error': 'Unauthorized'}), 403
-            
-        # Get the passenger_id from the request
-        cursor.execute("SELECT passenger_id FROM Ride_Request WHERE request_id = %s", (request_id,))
-        request_data = cursor.fetchone()
-        if not request_data:
-            return jsonify({'error': 'Request not found'}), 404
-            
-        passenger_id = request_data['passenger_id']
-            
-        # Update the request status
-        new_status = 'matched' if action == 'accept' else 'rejected'
-        cursor.execute("""
-            UPDATE Ride_Request 
-            SET status = %s 
-            WHERE request_id = %s AND matched_ride_id = %s
-        """, (new_status, request_id, ride_id))
-        
-        if cursor.rowcount == 0:
-            connection.rollback()
-            return jsonify({'error': 'Request not found or already processed'}), 404
-            
-        # If accepted, update the ride's available seats and add to Ride_Participation
-        if action == 'accept':
-            # Update available seats
-            cursor.execute("""
-                UPDATE rides r
-                SET r.seats_offered = r.seats_offered - 1
-                WHERE r.ride_id = %s
-            """, (ride_id,))
-            
-            # Add to Ride_Participation
-            cursor.execute("""
-                INSERT INTO Ride_Participation (ride_id, student_id, role)
-                VALUES (%s, %s, 'passenger')
-            """, (ride_id, passenger_id))
-            
-            # Reject all other pending requests for this passenger and ride
+        try:
+            # Verify that the ride belongs to the current user
+            cursor.execute("SELECT driver_id FROM rides WHERE ride_id = %s", (ride_id,))
+            ride = cursor.fetchone()
+
+            if not ride or ride['driver_id'] != session['user_id']:
+                return jsonify({'error': 'Unauthorized'}), 403
+
+            # Get the passenger_id from the request
+            cursor.execute("SELECT passenger_id FROM Ride_Request WHERE request_id = %s", (request_id,))
+            request_data = cursor.fetchone()
+            if not request_data:
+                return jsonify({'error': 'Request not found'}), 404
+
+            passenger_id = request_data['passenger_id']
+
+            # Update the request status; only a pending request can change, so
+            # two concurrent accepts of the same request cannot both succeed
+            new_status = 'matched' if action == 'accept' else 'rejected'
             cursor.execute("""
-                UPDATE Ride_Request
-                SET status = 'rejected'
-                WHERE passenger_id = %s AND matched_ride_id = %s AND request_id != %s AND status = 'pending'
-            """, (passenger_id, ride_id, request_id))
-            
-        connection.commit()
-        return jsonify({'message': f'Request {action}ed successfully'})
-        
-    except Exception as e:
-        if connection:
+                UPDATE Ride_Request 
+                SET status = %s 
+                WHERE request_id = %s AND matched_ride_id = %s AND status = 'pending'
+            """, (new_status, request_id, ride_id))
+
+            if cursor.rowcount == 0:
+                connection.rollback()
+                return jsonify({'error': 'Request not found or already processed'}), 404
+
+            # If accepted, reserve a seat and add to Ride_Participation
+            if action == 'accept':
+                if not reserve_seat(cursor, ride_id):
+                    connection.rollback()
+                    return jsonify({'error': 'No seats available'}), 409
+
+                # Add to Ride_Participation
+                cursor.execute("""
+                    INSERT INTO Ride_Participation (ride_id, student_id, role)
+                    VALUES (%s, %s, 'passenger')
+                """, (ride_id, passenger_id))
+
+                # Reject all other pending requests for this passenger and ride
+                cursor.execute("""
+                    UPDATE Ride_Request
+                    SET status = 'rejected'
+                    WHERE passenger_id = %s AND matched_ride_id = %s AND request_id != %s AND status = 'pending'
+                """, (passenger_id, ride_id, request_id))
+
+            bump_request_version(cursor, session['user_id'])
+            connection.commit()
+            if action == 'accept':
+                rides_cache.invalidate()
+
+            update = {'request_id': request_id, 'ride_id': ride_id, 'status': new_status}
+            event_broker.publish(user_channel(passenger_id), 'request_update', update)
+            event_broker.publish(user_channel(session['user_id']), 'request_update', update)
+
+            # A rejection frees a place for another open request
+            if action == 'reject':
+                match_ride_incrementally(connection, ride_id)
+            return jsonify({'message': f'Request {action}ed successfully'})
+
+        except mysql.connector.IntegrityError:
             connection.rollback()
-        return jsonify({'error': str(e)}), 500
-        
-    finally:
-        if cursor:
+            return jsonify({'error': 'Passenger has already joined this ride'}), 409
+
+        except Exception as e:
+            connection.rollback()
+            return jsonify({'error': str(e)}), 500
+
+        finally:
             cursor.close()
-        if connection:
-            connection.close()
 
-@app.route('/add_vehicle', methods=['GET', 'POST'])
+@route('/add_vehicle', methods=['GET', 'POST'])
 @login_required
 def add_vehicle():
     if request.method == 'GET':
         return render_template('add_vehicle.html')
         
     elif request.method == 'POST':
-        connection = None
-        cursor = None
+        # Get form data
+        vehicle_no = request.form.get('vehicle_no')
+        vehicle_model = request.form.get('vehicle_model')
+        seats_available = request.form.get('seats_available')
+
+        # Validate form data
+        if not all([vehicle_no, vehicle_model, seats_available]):
+            flash('Please fill in all fields', 'error')
+            return redirect(url_for('add_vehicle'))
+
+        # Convert seats_available to integer
         try:
-            # Get form data
-            vehicle_no = request.form.get('vehicle_no')
-            vehicle_model = request.form.get('vehicle_model')
-            seats_available = request.form.get('seats_available')
-            
-            # Validate form data
-            if not all([vehicle_no, vehicle_model, seats_available]):
-                flash('Please fill in all fields', 'error')
-                return redirect(url_for('add_vehicle'))
-                
-            # Convert seats_available to integer
-            try:
-                seats_available = int(seats_available)
-                if seats_available <= 0:
-                    flash('Number of seats must be greater than 0', 'error')
-                    return redirect(url_for('add_vehicle'))
-            except ValueError:
-                flash('Invalid number of seats', 'error')
+            seats_available = int(seats_available)
+            if seats_available <= 0:
+                flash('Number of seats must be greater than 0', 'error')
                 return redirect(url_for('add_vehicle'))
-            
-            # Get database connection
-            connection = get_db_connection()
+        except ValueError:
+            flash('Invalid number of seats', 'error')
+            return redirect(url_for('add_vehicle'))
+
+        # Get database connection
+        with get_db_connection() as connection:
             if not connection:
                 flash('Database connection failed', 'error')
                 return redirect(url_for('add_vehicle'))
-                
+
             cursor = connection.cursor()
-            
-            # Check if vehicle number already exists
-            cursor.execute('SELECT vehicle_id FROM vehicle WHERE vehicle_no = %s', (vehicle_no,))
-            if cursor.fetchone():
-                flash('Vehicle with this number already exists', 'error')
+            try:
+                # Check if vehicle number already exists
+                cursor.execute('SELECT vehicle_id FROM vehicle WHERE vehicle_no = %s', (vehicle_no,))
+                if cursor.fetchone():
+                    flash('Vehicle with this number already exists', 'error')
+                    return redirect(url_for('add_vehicle'))
+
+                # Insert new vehicle
+                cursor.execute('''
+                    INSERT INTO vehicle (user_id, vehicle_no, vehicle_model, seats_available)
+                    VALUES (%s, %s, %s, %s)
+                ''', (session['user_id'], vehicle_no, vehicle_model, seats_available))
+
+                connection.commit()
+                flash('Vehicle added successfully!', 'success')
+                return redirect(url_for('dashboard'))
+
+            except mysql.connector.Error as err:
+                flash(f'Database error: {str(err)}', 'error')
                 return redirect(url_for('add_vehicle'))
-            
-            # Insert new vehicle
-            cursor.execute('''
-                INSERT INTO vehicle (user_id, vehicle_no, vehicle_model, seats_available)
-                VALUES (%s, %s, %s, %s)
-            ''', (session['user_id'], vehicle_no, vehicle_model, seats_available))
-            
-            connection.commit()
-            flash('Vehicle added successfully!', 'success')
-            return redirect(url_for('dashboard'))
-            
-        except mysql.connector.Error as err:
-            flash(f'Database error: {str(err)}', 'error')
-            return redirect(url_for('add_vehicle'))
-            
-        except Exception as e:
-            flash(f'Error adding vehicle: {str(e)}', 'error')
-            return redirect(url_for('add_vehicle'))
-            
-        finally:
-            if cursor:
+
+            except Exception as e:
+                flash(f'Error adding vehicle: {str(e)}', 'error')
+                return redirect(url_for('add_vehicle'))
+
+            finally:
                 cursor.close()
-            if connection:
-                connection.close()
 
-@app.route('/profile')
+@route('/profile')
 @login_required
 def profile():
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
+    with get_db_connection() as connection:
         if not connection:
             flash('Database connection failed', 'error')
             return redirect(url_for('dashboard'))
-            
-        cursor = connection.cursor(dictionary=True)
-        
-        # Get user details
-        cursor.execute('SELECT * FROM users WHERE id = %s', (session['user_id'],))
-        user = cursor.fetchone()
-        
-        # Get user's vehicles
-        cursor.execute('SELECT * FROM vehicle WHERE user_id = %s', (session['user_id'],))
-        vehicles = cursor.fetchall()
-        
-        # Get user's rides (as driver)
-        cursor.execute('''
-            SELECT r.*, COUNT(rp.participation_id) as passengers
-            FROM rides r
-            LEFT JOIN Ride_Participation rp ON r.ride_id = rp.ride_id AND rp.role = 'passenger'
-            WHERE r.driver_id = %s
-            GROUP BY r.ride_id
-        ''', (session['user_id'],))
-        driver_rides = cursor.fetchall()
-        
-        # Get user's rides (as passenger)
-        cursor.execute('''
-            SELECT r.*, u.email as driver_email
-            FROM rides r
-            JOIN Ride_Participation rp ON r.ride_id = rp.ride_id
-            JOIN users u ON r.driver_id = u.id
-            WHERE rp.student_id = %s AND rp.role = 'passenger'
-        ''', (session['user_id'],))
-        passenger_rides = cursor.fetchall()
-        
-        
-        return render_template('profile.html', 
-                             user=user, 
-                             vehicles=vehicles, 
-                             driver_rides=driver_rides, 
-                             passenger_rides=passenger_rides)
-                             
-    except Exception as e:
-        flash('Error fetching profile data: ' + str(e), 'error')
-        return redirect(url_for('dashboard'))
-        
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
-@app.route('/search_rides', methods=['GET'])
+        try:
+            # Get user details, vehicles, and rides as driver and as passenger
+            page = page_loader.load(
+                connection,
+                user=(repository.find_user, session['user_id']),
+                vehicles=(repository.list_vehicles, session['user_id']),
+                driver_rides=(repository.list_offered_rides, session['user_id']),
+                passenger_rides=(repository.list_joined_rides, session['user_id']),
+            )
+
+            return render_template('profile.html', **page)
+
+        except Exception as e:
+            flash('Error fetching profile data: ' + str(e), 'error')
+            return redirect(url_for('dashboard'))
+
+@route('/search_rides', methods=['GET'])
 @login_required
 def search_rides():
     source = request.args.get('source', '')
     destination = request.args.get('destination', '')
     date = request.args.get('date', '')
+    size = page_size(request.args.get('per_page'))
+    position = decode_cursor(request.args.get('cursor'))
+    next_cursor = None
     
-    try:
-        conn = get_db_connection()
+    with get_db_connection() as conn:
+        if not conn:
+            flash('Error searching rides.', 'error')
+            return render_template('rides.html', rides=[])
+
         cursor = conn.cursor(dictionary=True)
-        
-        query = '''
-            SELECT r.*, u.email as driver_email, v.vehicle_model, v.vehicle_no
-            FROM rides r
-            JOIN users u ON r.driver_id = u.id
-            JOIN vehicle v ON r.vehicle_id = v.vehicle_id
-            WHERE 1=1
-        '''
-        params = []
-        
-        if source:
-            query += ' AND r.source_location LIKE %s'
-            params.append(f'%{source}%')
-        if destination:
-            query += ' AND r.destination_location LIKE %s'
-            params.append(f'%{destination}%')
-        if date:
-            query += ' AND r.ride_date = %s'
-            params.append(date)
-            
-        query += ' ORDER BY r.ride_date, r.ride_time'
-        
-        cursor.execute(query, tuple(params))
-        rides = cursor.fetchall()
-        
-    except mysql.connector.Error as err:
-        flash('Error searching rides.', 'error')
-        rides = []
-    finally:
-        cursor.close()
-        conn.close()
-    
-    return render_template('rides.html', rides=rides)
+        try:
+            if (source or destination) and location_index.is_stale():
+                refresh_location_index(cursor)
+
+            # Each worker's index may not know a location another worker just
+            # wrote; a term it cannot resolve is matched with LIKE instead
+            source_names = (location_index.search(source) or source) if source else None
+            destination_names = (location_index.search(destination) or destination) if destination else None
+
+            rides, next_cursor = split_page(repository.search_rides(
+                conn, source_names, destination_names, date, position, size + 1), size)
+
+        except mysql.connector.Error as err:
+            flash('Error searching rides.', 'error')
+            rides = []
+        finally:
+            cursor.close()
+
+    return render_template('rides.html', rides=rides, **page_links(next_cursor))
 
-@app.route('/get_pending_requests')
+@route('/get_pending_requests')
 @login_required
 def get_pending_requests():
-    connection = None
-    cursor = None
-    try:
-        connection = get_db_connection()
+    with get_db_connection() as connection:
         if not connection:
             return jsonify({'error': 'Database connection failed'}), 500
-            
+
         cursor = connection.cursor(dictionary=True)
-        
-        # Get all pending requests for rides where the current user is the driver
-        cursor.execute('''
-            SELECT rr.*, u.email as passenger_email
-            FROM Ride_Request rr
-            JOIN rides r ON rr.matched_ride_id = r.ride_id
-            JOIN users u ON rr.passenger_id = u.id
-            WHERE r.driver_id = %s
-            AND rr.status = 'pending'
-            ORDER BY rr.created_at DESC
-        ''', (session['user_id'],))
-        
-        requests = cursor.fetchall()
-        return jsonify({'requests': requests})
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-        
-    finally:
-        if cursor:
+        try:
+            # The driver's request counter changes whenever their pending list
+            # can change, so an unchanged list costs one primary key lookup
+            cursor.execute(repository.REQUEST_VERSION_QUERY, (session['user_id'],))
+            version = cursor.fetchone()['request_version']
+            etag = f"requests-{session['user_id']}-{version}"
+            response = not_modified(etag)
+            if response:
+                return response
+
+            # Get all pending requests for rides where the current user is the driver
+            cursor.execute(repository.PENDING_REQUESTS_QUERY, (session['user_id'],))
+
+            requests = cursor.fetchall()
+            # preferred_time comes back as a timedelta, which jsonify cannot
+            # encode; dates and times are strings, as in asgi.py
+            body = json.dumps({'requests': requests}, default=str)
+            return with_etag(Response(body, mimetype='application/json'), etag)
+
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+        finally:
             cursor.close()
-        if connection:
-            connection.close()
 
-@app.route('/delete_ride/<int:ride_id>', methods=['DELETE'])
+@route('/events')
 @login_required
-def delete_ride(ride_id):
-    connection = None
-    cursor = None
+def events():
+    # Server-Sent Events stream of this user's ride request notifications.
+    # On threaded workers each open stream holds a thread, so there it is
+    # switched off; 204 makes EventSource give up and the page polls instead.
+    if not app.config['SSE_ENABLED']:
+        return '', 204
+    stream = event_broker.stream(user_channel(session['user_id']))
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@route('/admin/stats')
+@admin_required
+def admin_stats():
+    return jsonify({
+        'queries': query_profiler.snapshot(),
+        'db_pool': db_pool.stats(),
+        'password_hasher': password_hasher.stats(),
+        'rides_cache': rides_cache.stats(),
+        'events': event_broker.stats(),
+        'scheduler': scheduler.stats(),
+        'sessions': session_interface.stats(),
+        'page_loader': page_loader.stats(),
+        'startup': startup,
+    })
+
+@route('/metrics')
+def export_metrics():
+    # Scraped by Prometheus with METRICS_TOKEN as a bearer token. Without
+    # a token it is only served by the debug server.
+    token = app.config['METRICS_TOKEN']
+    if not token and not app.debug:
+        return Response('Set METRICS_TOKEN to enable /metrics\n', status=403, mimetype='text/plain')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    lines = metrics.render()
+    lines += render_stats('db_pool', db_pool.stats(), counters=(
+        'checkouts', 'waits', 'wait_time', 'exhausted', 'created', 'recycled', 'failed_checks'))
+    lines += render_stats('bcrypt', password_hasher.stats(), counters=(
+        'jobs', 'rejected', 'hash_time', 'queue_wait'))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@route('/admin/match_rides', methods=['POST'])
+@admin_required
+def match_rides():
+    data = request.get_json(silent=True) or {}
     try:
-        connection = get_db_connection()
+        ride_date = date.fromisoformat(data.get('date') or request.args.get('date') or date.today().isoformat())
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+
+    with get_db_connection() as connection:
         if not connection:
             return jsonify({'error': 'Database connection failed'}), 500
-            
+
         cursor = connection.cursor(dictionary=True)
-        
-        # Verify that the ride belongs to the current user
-        cursor.execute("SELECT driver_id FROM rides WHERE ride_id = %s", (ride_id,))
-        ride = cursor.fetchone()
-        
-        if not ride or ride['driver_id'] != session['user_id']:
-            return jsonify({'error': 'Unauthorized'}), 403
-            
-        # Delete in the correct order to maintain referential integrity
-        
-        # 1. Delete all ride requests for this ride
-        cursor.execute("""
-            DELETE FROM Ride_Request 
-            WHERE matched_ride_id = %s
-        """, (ride_id,))
-        
-        # 2. Delete all ride participations for this ride
-        cursor.execute("""
-            DELETE FROM Ride_Participation 
-            WHERE ride_id = %s
-        """, (ride_id,))
-        
-        # 3. Finally, delete the ride itself
-        cursor.execute("""
-            DELETE FROM rides 
-            WHERE ride_id = %s AND driver_id = %s
-        """, (ride_id, session['user_id']))
-        
-        if cursor.rowcount == 0:
+        try:
+            started = time.perf_counter()
+            open_requests = load_open_requests(cursor, ride_date)
+            open_rides = load_open_rides(cursor, ride_date)
+            assignments = ride_matcher.match(open_requests, open_rides)
+            matched_in = time.perf_counter() - started
+
+            applied = apply_assignments(cursor, assignments)
+            for driver_id in {assignment.driver_id for assignment in applied}:
+                bump_request_version(cursor, driver_id)
+            connection.commit()
+            pending_requests_index.discard(assignment.request_id for assignment in applied)
+
+            notify_matched_requests(applied, {r['request_id']: r for r in open_requests})
+            return jsonify({
+                'date': ride_date.isoformat(),
+                'open_requests': len(open_requests),
+                'open_rides': len(open_rides),
+                'matched': len(applied),
+                'match_ms': round(matched_in * 1000, 1),
+                'assignments': [assignment._asdict() for assignment in applied],
+            })
+
+        except Exception as e:
             connection.rollback()
-            return jsonify({'error': 'Ride not found or already deleted'}), 404
-            
-        connection.commit()
-        return jsonify({'message': 'Ride deleted successfully'})
-        
-    except Exception as e:
-        if connection:
+            return jsonify({'error': str(e)}), 500
+
+        finally:
+            cursor.close()
+
+@route('/admin/reconcile_seats', methods=['POST'])
+@admin_required
+def reconcile_seats():
+    with get_db_connection() as connection:
+        if not connection:
+            return jsonify({'error': 'Database connection failed'}), 500
+        try:
+            repaired = reconcile_seat_counts(connection)
+        except Exception as e:
             connection.rollback()
-        return jsonify({'error': str(e)}), 500
-        
-    finally:
-        if cursor:
+            return jsonify({'error': str(e)}), 500
+
+    if repaired:
+        rides_cache.invalidate()
+    return jsonify({'repaired': repaired})
+
+@route('/admin/revoke_sessions/<int:user_id>', methods=['POST'])
+@admin_required
+def revoke_sessions(user_id):
+    return jsonify({'revoked': session_interface.revoke_user(user_id)})
+
+@route('/delete_ride/<int:ride_id>', methods=['DELETE'])
+@login_required
+def delete_ride(ride_id):
+    with get_db_connection() as connection:
+        if not connection:
+            return jsonify({'error': 'Database connection failed'}), 500
+
+        cursor = connection.cursor(dictionary=True)
+        try:
+            # Verify that the ride belongs to the current user
+            cursor.execute("SELECT driver_id FROM rides WHERE ride_id = %s", (ride_id,))
+            ride = cursor.fetchone()
+
+            if not ride or ride['driver_id'] != session['user_id']:
+                return jsonify({'error': 'Unauthorized'}), 403
+
+            # Delete in the correct order to maintain referential integrity
+
+            # 1. Delete all ride requests for this ride
+            cursor.execute("""
+                DELETE FROM Ride_Request 
+                WHERE matched_ride_id = %s
+            """, (ride_id,))
+
+            # 2. Delete all ride participations for this ride
+            cursor.execute("""
+                DELETE FROM Ride_Participation 
+                WHERE ride_id = %s
+            """, (ride_id,))
+
+            # 3. Finally, delete the ride itself
+            cursor.execute("""
+                DELETE FROM rides 
+                WHERE ride_id = %s AND driver_id = %s
+            """, (ride_id, session['user_id']))
+
+            if cursor.rowcount == 0:
+                connection.rollback()
+                return jsonify({'error': 'Ride not found or already deleted'}), 404
+
+            bump_request_version(cursor, session['user_id'])
+            connection.commit()
+            rides_cache.invalidate()
+            return jsonify({'message': 'Ride deleted successfully'})
+
+        except Exception as e:
+            connection.rollback()
+            return jsonify({'error': str(e)}), 500
+
+        finally:
             cursor.close()
-        if connection:
-            connection.close()
+
+def create_app(config=None):
+    """Build the app and its services.
+
+    Settings come from the environment (see config.py); ``config``
+    overrides them, e.g. in tests. Each phase is timed into ``startup``.
+    """
+    global app, db_config, db_pool, query_profiler, admin_emails, password_hasher, rides_cache
+    global location_index, event_broker, ride_matcher, pending_requests_index, scheduler, session_interface
+    global metrics, page_loader
+
+    started = time.perf_counter()
+    phases = startup['phases'] = {}
+
+    @contextmanager
+    def phase(name):
+        phase_started = time.perf_counter()
+        yield
+        phases[name] = time.perf_counter() - phase_started
+
+    with phase('config'):
+        settings = load_config(config)
+        if not settings['SECRET_KEY']:
+            # Sessions will not survive a restart or be shared between workers
+            print("SECRET_KEY is not set; using a random key for this process")
+            settings['SECRET_KEY'] = os.urandom(32).hex()
+        new_app = Flask(__name__)
+        new_app.config.update(settings)
+
+    with phase('bcrypt'):
+        # Calibrates the bcrypt cost unless BCRYPT_ROUNDS is set; under
+        # gunicorn this runs once in the master, before the workers fork
+        password_hasher = PasswordHasher(
+            workers=settings['BCRYPT_WORKERS'],
+            max_queue=settings['BCRYPT_MAX_QUEUE'],
+            rounds=settings['BCRYPT_ROUNDS'] or None,
+            target_time=settings['BCRYPT_TARGET_MS'] / 1000,
+        )
+
+    with phase('services'):
+        db_config = connection_settings(settings)
+        # MySQL, or the embedded SQLite backend (DB_BACKEND=sqlite)
+        db_pool = create_database(settings, db_config)
+        query_profiler = QueryProfiler(slow_threshold=settings['SLOW_QUERY_MS'] / 1000)
+        page_loader = repository.PageLoader(db_pool, query_profiler, workers=settings['PAGE_LOADER_WORKERS'])
+        metrics = Metrics()
+        admin_emails = set(settings['ADMIN_EMAILS'])
+        rides_cache = TTLCache(ttl=settings['RIDES_CACHE_TTL'])
+        location_index = LocationIndex(max_age=settings['LOCATION_INDEX_MAX_AGE'])
+        event_broker = EventBroker(heartbeat=settings['SSE_HEARTBEAT'])
+        ride_matcher = RideMatcher(
+            time_window=settings['MATCH_TIME_WINDOW_MINUTES'],
+            min_similarity=settings['MATCH_MIN_SIMILARITY'],
+        )
+        pending_requests_index = PendingRequestIndex(
+            slot_minutes=ride_matcher.time_window,
+            max_age=settings['MATCH_INDEX_MAX_AGE'],
+        )
+        session_interface = ServerSessionInterface(
+            create_session_store(
+                settings['SESSION_BACKEND'],
+                sqlite_path=settings['SESSION_SQLITE_PATH'],
+                redis_url=settings['SESSION_REDIS_URL'],
+            ),
+            cache_size=settings['SESSION_CACHE_SIZE'],
+            cache_ttl=settings['SESSION_CACHE_TTL'],
+        )
+        new_app.session_interface = session_interface
+        # Database jobs run in one process per interval, whichever claims it first
+        scheduler = Scheduler(claim=claim_scheduled_run)
+        if settings['SCHEDULER_ENABLED']:
+            scheduler.add_job('ride_lifecycle', settings['LIFECYCLE_INTERVAL'], run_lifecycle_sweep,
+                              initial_delay=5, shared=True)
+            scheduler.add_job('archive_rides', settings['ARCHIVE_INTERVAL'], run_archival,
+                              initial_delay=60, shared=True)
+            # A SQLite session file belongs to one host, so each host purges its own
+            purge_job = 'purge_sessions'
+            if settings['SESSION_BACKEND'] == 'sqlite':
+                purge_job += '@' + socket.gethostname()
+            scheduler.add_job(purge_job, settings['SESSION_PURGE_INTERVAL'], session_interface.store.purge_expired,
+                              initial_delay=60, shared=True)
+            scheduler.add_job('refresh_pending_requests', settings['MATCH_INDEX_MAX_AGE'], refresh_pending_requests,
+                              initial_delay=0)
+
+    with phase('routes'):
+        # Metrics first, so request latency includes the other hooks
+        new_app.before_request(start_request_metrics)
+        new_app.before_request(start_query_profile)
+        new_app.before_request(start_scheduler)
+        new_app.after_request(finish_query_profile)
+        new_app.after_request(record_response_status)
+        new_app.teardown_request(finish_request_metrics)
+        for rule, view_func, options in _routes:
+            new_app.add_url_rule(rule, view_func=view_func, **options)
+
+    app = new_app
+    startup['create_app_seconds'] = time.perf_counter() - started
+    print(f"App created in {startup['create_app_seconds'] * 1000:.1f} ms "
+          f"(imports took {startup['import_seconds'] * 1000:.1f} ms)")
+    return app
+
+startup['import_seconds'] = time.perf_counter() - _import_started
 
 if __name__ == '__main__':
-    app.run(debug=True, host='127.0.0.1', port=8080) 
\ No newline at end of file
+    # Development server only; production runs under gunicorn (gunicorn.conf.py)
+    create_app().run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='127.0.0.1', port=8080) 
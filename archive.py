@@ -0,0 +1,124 @@
+"""Move past rides out of the hot tables.
+
+Rides whose date is more than ``keep_days`` days ago are copied, together
+with their requests and participations, into rides_archive,
+Ride_Request_archive and Ride_Participation_archive and deleted from the
+live tables. Requests that never matched a ride are archived by their
+preferred date.
+
+Work is done in batches of ``batch_size`` rows, one short transaction per
+batch, so only the rows being moved are locked and only briefly. Run it
+from cron (or the app's scheduler):
+
+    python archive.py [KEEP_DAYS]
+"""
+import sys
+import time
+from datetime import date, timedelta
+
+RIDE_COLUMNS = ('ride_id, driver_id, vehicle_id, source_location, destination_location, ride_date, '
+                'ride_time, seats_offered, seats_remaining, passenger_count, created_at, status')
+REQUEST_COLUMNS = ('request_id, passenger_id, rider_source, rider_destination, preferred_date, '
+                   'preferred_time, status, matched_ride_id, created_at, driver_accepted')
+PARTICIPATION_COLUMNS = 'participation_id, ride_id, student_id, role, status'
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def archive_ride_batch(cursor, cutoff, batch_size):
+    """Archive up to ``batch_size`` rides dated before ``cutoff``; returns how many."""
+    cursor.execute('SELECT ride_id FROM rides WHERE ride_date < %s ORDER BY ride_date LIMIT %s FOR UPDATE',
+                   (cutoff, batch_size))
+    ride_ids = [row[0] for row in cursor.fetchall()]
+    if not ride_ids:
+        return 0
+
+    ids = _placeholders(ride_ids)
+    cursor.execute(f'''
+        INSERT INTO Ride_Participation_archive ({PARTICIPATION_COLUMNS})
+        SELECT {PARTICIPATION_COLUMNS} FROM Ride_Participation WHERE ride_id IN ({ids})
+    ''', ride_ids)
+    cursor.execute(f'''
+        INSERT INTO Ride_Request_archive ({REQUEST_COLUMNS})
+        SELECT {REQUEST_COLUMNS} FROM Ride_Request WHERE matched_ride_id IN ({ids})
+    ''', ride_ids)
+    cursor.execute(f'''
+        INSERT INTO rides_archive ({RIDE_COLUMNS})
+        SELECT {RIDE_COLUMNS} FROM rides WHERE ride_id IN ({ids})
+    ''', ride_ids)
+
+    # Children first: Ride_Request would otherwise be updated by ON DELETE SET NULL
+    cursor.execute(f'DELETE FROM Ride_Participation WHERE ride_id IN ({ids})', ride_ids)
+    cursor.execute(f'DELETE FROM Ride_Request WHERE matched_ride_id IN ({ids})', ride_ids)
+    cursor.execute(f'DELETE FROM rides WHERE ride_id IN ({ids})', ride_ids)
+    return len(ride_ids)
+
+
+def archive_request_batch(cursor, cutoff, batch_size):
+    """Archive up to ``batch_size`` unmatched requests for dates before ``cutoff``."""
+    cursor.execute('''
+        SELECT request_id FROM Ride_Request
+        WHERE matched_ride_id IS NULL AND preferred_date < %s
+        LIMIT %s FOR UPDATE
+    ''', (cutoff, batch_size))
+    request_ids = [row[0] for row in cursor.fetchall()]
+    if not request_ids:
+        return 0
+
+    ids = _placeholders(request_ids)
+    cursor.execute(f'''
+        INSERT INTO Ride_Request_archive ({REQUEST_COLUMNS})
+        SELECT {REQUEST_COLUMNS} FROM Ride_Request WHERE request_id IN ({ids})
+    ''', request_ids)
+    cursor.execute(f'DELETE FROM Ride_Request WHERE request_id IN ({ids})', request_ids)
+    return len(request_ids)
+
+
+def archive_past_rides(connection, keep_days=30, batch_size=500, pause=0.1):
+    """Archive everything older than ``keep_days`` days.
+
+    Returns {'rides': n, 'requests': n} with the number of rides and of
+    unmatched requests moved. ``pause`` seconds between batches give
+    other transactions room on a busy server.
+    """
+    cutoff = date.today() - timedelta(days=keep_days)
+    moved = {'rides': 0, 'requests': 0}
+    cursor = connection.cursor()
+    try:
+        for key, archive_batch in (('rides', archive_ride_batch), ('requests', archive_request_batch)):
+            while True:
+                try:
+                    count = archive_batch(cursor, cutoff, batch_size)
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+                moved[key] += count
+                if count < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+        return moved
+    finally:
+        cursor.close()
+
+
+def main(argv):
+    from config import load_config
+    from storage import connect
+
+    config = load_config()
+    keep_days = int(argv[0]) if argv else config['ARCHIVE_AFTER_DAYS']
+    connection = connect(config)
+    try:
+        moved = archive_past_rides(connection, keep_days=keep_days, batch_size=config['ARCHIVE_BATCH_SIZE'])
+    finally:
+        connection.close()
+    print(f"Archived {moved['rides']} ride(s) and {moved['requests']} unmatched request(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,303 @@
+"""ASGI entry point for serving on an asyncio event loop.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 8080
+
+The long-lived and frequently polled endpoints run natively on the event
+loop, so an open connection costs a coroutine instead of a thread:
+
+* /events streams Server-Sent Events straight from the event broker;
+* /get_pending_requests queries MySQL through an aiomysql pool.
+
+Every other route, template and form is served by the Flask app in app.py,
+on a pool of ``WEB_THREADS`` threads per process (``ThreadedWsgi``). Both
+sides share the broker, so events published by Flask handlers reach async
+streams in the same process.
+"""
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from tempfile import SpooledTemporaryFile
+
+import aiomysql
+from werkzeug.http import parse_etags, quote_etag
+
+import app as web
+from events import user_channel
+from repository import PENDING_REQUESTS_QUERY, REQUEST_VERSION_QUERY
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def _respond(send, status, body=b'', headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _json(data, status=200, headers=()):
+    return status, json.dumps(data, default=str).encode('utf-8'), (('Content-Type', 'application/json'),) + tuple(headers)
+
+
+def _environ(scope, body, length):
+    # The WSGI environ for an ASGI HTTP scope (PEP 3333); ``body`` is the
+    # whole request body, already read
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for key, value in scope['headers']:
+        name = key.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    # A chunked body has no Content-Length header, but it is complete here
+    environ['CONTENT_LENGTH'] = str(length)
+    environ.pop('HTTP_TRANSFER_ENCODING', None)
+    return environ
+
+
+class ThreadedWsgi:
+    """Serves a WSGI app to an ASGI server from a bounded thread pool.
+
+    asgiref's WsgiToAsgi runs every request on one shared thread, so the
+    Flask routes of a process would take turns. Here each request runs on
+    its own thread of ``executor``, as it would on a threaded WSGI worker.
+    """
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        body = SpooledTemporaryFile(max_size=65536)
+        length = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            length += body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        try:
+            await loop.run_in_executor(self.executor, self.run, scope, body, length, send_from_thread)
+        finally:
+            body.close()
+
+    def run(self, scope, body, length, send):
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response and response[0] is None:
+                # Headers already went out; all that can be done is to fail
+                raise exc_info[1].with_traceback(exc_info[2])
+            response[:] = [(int(status.split(' ', 1)[0]), headers)]
+            return lambda data: None
+
+        def start():
+            if response[0] is not None:
+                status, headers = response[0]
+                send({'type': 'http.response.start', 'status': status,
+                      'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+                response[0] = None
+
+        iterable = self.wsgi_app(_environ(scope, body, length), start_response)
+        try:
+            for chunk in iterable:
+                if chunk:
+                    start()
+                    send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            start()
+            send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+
+class AsyncApp:
+    def __init__(self, flask_app, db_config, broker, scheduler, metrics, pool_size=20, threads=4):
+        self.flask_app = flask_app
+        self.wsgi = ThreadedWsgi(flask_app, ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi'))
+        self.db_config = db_config
+        self.broker = broker
+        self.scheduler = scheduler
+        self.metrics = metrics
+        self.pool_size = pool_size
+        self.pool = None
+        # path -> (Flask endpoint name, handler); the names keep /metrics
+        # labels the same whichever side serves the route
+        self.routes = {'/events': ('events', self.events)}
+        # Without MySQL (DB_BACKEND=sqlite) the Flask handler serves it
+        if db_config is not None:
+            self.routes['/get_pending_requests'] = ('get_pending_requests', self.pending_requests)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            route = self.routes.get(scope['path'])
+            if route:
+                return await self.measured(*route, scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def measured(self, endpoint, handler, scope, receive, send):
+        status = 500
+
+        async def send_and_record_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        self.metrics.request_started(endpoint)
+        try:
+            await handler(scope, receive, send_and_record_status)
+        finally:
+            self.metrics.request_finished(endpoint, scope['method'], status, time.perf_counter() - started)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.open_pool()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                self.scheduler.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.scheduler.stop(timeout=5)
+                await self.close_pool()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def open_pool(self):
+        if self.db_config is None:
+            return
+        self.pool = await aiomysql.create_pool(
+            host=self.db_config['host'],
+            user=self.db_config['user'],
+            password=self.db_config['password'],
+            db=self.db_config['database'],
+            minsize=1,
+            maxsize=self.pool_size,
+            autocommit=True,
+            pool_recycle=1800,
+        )
+
+    async def close_pool(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    async def load_session(self, scope):
+        # Looks the cookie's session id up the same way Flask does, mostly
+        # in the worker's session cache; an unknown or revoked id is an
+        # empty session. A cache miss reads the session store (SQLite or
+        # redis), so the lookup runs on a thread, off the event loop.
+        cookie = _header(scope, b'cookie')
+        name = self.flask_app.config['SESSION_COOKIE_NAME']
+        if not cookie:
+            return {}
+        morsel = SimpleCookie(cookie).get(name)
+        if morsel is None:
+            return {}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.flask_app.session_interface.load, morsel.value) or {}
+
+    async def events(self, scope, receive, send):
+        session = await self.load_session(scope)
+        if 'user_id' not in session:
+            return await _respond(send, 302, headers=[('Location', '/login')])
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+
+        async def pump():
+            async for frame in self.broker.astream(user_channel(session['user_id'])):
+                await send({'type': 'http.response.body', 'body': frame.encode('utf-8'), 'more_body': True})
+
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # Whichever finishes first cancels the other; cancelling the pump
+        # unsubscribes the stream
+        tasks = {asyncio.ensure_future(pump()), asyncio.ensure_future(wait_disconnect())}
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def pending_requests(self, scope, receive, send):
+        session = await self.load_session(scope)
+        if 'user_id' not in session:
+            return await _respond(send, 302, headers=[('Location', '/login')])
+        user_id = session['user_id']
+
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(REQUEST_VERSION_QUERY, (user_id,))
+                    version = (await cursor.fetchone())['request_version']
+                    etag = f'requests-{user_id}-{version}'
+                    cache_headers = (('ETag', quote_etag(etag)), ('Cache-Control', 'private, no-cache'))
+
+                    # Same rule as not_modified() in app.py
+                    if_none_match = _header(scope, b'if-none-match')
+                    if if_none_match and parse_etags(if_none_match).contains(etag) and not session.get('_flashes'):
+                        return await _respond(send, 304, headers=cache_headers)
+
+                    await cursor.execute(PENDING_REQUESTS_QUERY, (user_id,))
+                    requests = await cursor.fetchall()
+        except Exception as e:
+            return await _respond(send, *_json({'error': str(e)}, 500))
+
+        await _respond(send, *_json({'requests': requests}, headers=cache_headers))
+
+
+flask_app = web.create_app()
+application = AsyncApp(flask_app, web.db_config if flask_app.config['DB_BACKEND'] == 'mysql' else None,
+                       web.event_broker, web.scheduler, web.metrics,
+                       pool_size=flask_app.config['ASYNC_DB_POOL_SIZE'],
+                       threads=flask_app.config['WEB_THREADS'])
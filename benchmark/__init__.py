@@ -0,0 +1,12 @@
+"""Synthetic data and load replay for catching performance regressions.
+
+    python -m benchmark.seed --students 2000 --reset
+    python -m benchmark.load --concurrency 20 --journeys 500 --output run.json
+    python -m benchmark.load --baseline run.json
+
+``seed`` fills the database configured in .env with a synthetic campus and
+writes a manifest of logins and upcoming rides. ``load`` replays user
+journeys against a running server using that manifest and reports
+latency percentiles and queries per request for every route. Point both
+at a dedicated database, never at production data.
+"""
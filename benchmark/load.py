@@ -0,0 +1,260 @@
+"""Replay user journeys against a running server and report latencies.
+
+    python -m benchmark.load [--base-url URL] [--concurrency N] [--journeys N]
+
+A journey is a passenger logging in, opening the dashboard, searching for
+an upcoming ride and asking to join it, then that ride's driver logging
+in, fetching their pending requests and accepting the new one. --concurrency
+journeys run at once, each with its own cookies, until --journeys have
+run.
+
+For every route the report gives the request count, errors (status 400
+and up, or no response) and p50/p95/p99 latency, plus queries and
+database time per request from the app's Server-Timing header.
+--output saves the report as JSON. --baseline compares against a saved
+report and exits with status 1 if any route's p95 got worse by more than
+--max-regression.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+_SERVER_TIMING = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+# p95 differences below this are noise on a shared machine, whatever the ratio
+MIN_REGRESSION_MS = 5.0
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    # A redirect is the answer being measured, not a request to follow
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """One browser: its own cookies, every request recorded as a sample."""
+
+    def __init__(self, base_url, samples, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.samples = samples
+        self.timeout = timeout
+        self._opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect())
+
+    def request(self, route, path, form=None, json_body=None):
+        """Returns (status, body); status 0 when the server did not answer."""
+        headers = {}
+        data = None
+        if form is not None:
+            data = urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        response_headers = {}
+        try:
+            with self._opener.open(Request(self.base_url + path, data=data, headers=headers),
+                                   timeout=self.timeout) as response:
+                status, body, response_headers = response.status, response.read(), response.headers
+        except HTTPError as e:
+            status, body, response_headers = e.code, e.read(), e.headers
+        except (URLError, OSError) as e:
+            status, body = 0, str(e).encode('utf-8')
+        elapsed = time.perf_counter() - started
+
+        queries = db_time = None
+        match = _SERVER_TIMING.search(response_headers.get('Server-Timing', '') if response_headers else '')
+        if match:
+            db_time, queries = float(match.group(1)), int(match.group(2))
+        self.samples.append((route, status, elapsed, queries, db_time))
+        return status, body
+
+    def login(self, email, password):
+        # A successful login redirects to the dashboard; a failed one renders the form again
+        status, _ = self.request('POST /login', '/login', form={'email': email, 'password': password})
+        return status == 302
+
+
+class Journeys:
+    def __init__(self, manifest, base_url, seed):
+        self.manifest = manifest
+        self.base_url = base_url
+        self.students = {int(college): members for college, members in manifest['students'].items()}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._used = set()      # (ride_id, passenger_id) already tried in this run
+
+    def pick(self):
+        """A ride and a passenger of its college who has not asked for it yet."""
+        with self._lock:
+            for _ in range(100):
+                ride = self._rng.choice(self.manifest['rides'])
+                passenger = self._rng.choice(self.students[ride['college']])
+                key = (ride['ride_id'], passenger[0])
+                if passenger[0] not in ride['busy'] and key not in self._used:
+                    self._used.add(key)
+                    return ride, passenger
+        return None, None
+
+    def run(self, samples):
+        """Run one journey; returns True if every step succeeded."""
+        ride, passenger_login = self.pick()
+        if ride is None:
+            return False
+        passenger_id, passenger_email = passenger_login
+        password = self.manifest['password']
+
+        passenger = Client(self.base_url, samples)
+        if not passenger.login(passenger_email, password):
+            return False
+        passenger.request('GET /dashboard', '/dashboard')
+        passenger.request('GET /search_rides', '/search_rides?' + urlencode(
+            {'destination': ride['destination'], 'date': ride['date']}))
+        status, _ = passenger.request('POST /join_ride', '/join_ride', json_body={'ride_id': ride['ride_id']})
+        if status != 200:
+            return False
+
+        driver = Client(self.base_url, samples)
+        if not driver.login(ride['driver'], password):
+            return False
+        status, body = driver.request('GET /get_pending_requests', '/get_pending_requests')
+        if status != 200:
+            return False
+        pending = [r for r in json.loads(body)['requests']
+                   if r['passenger_id'] == passenger_id and r['matched_ride_id'] == ride['ride_id']]
+        if not pending:
+            return False
+        status, _ = driver.request('POST /handle_request', '/handle_request', json_body={
+            'request_id': pending[0]['request_id'], 'ride_id': ride['ride_id'], 'action': 'accept'})
+        return status == 200
+
+
+def percentile(values, fraction):
+    # Nearest rank on sorted values
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+def summarize(samples, journeys, completed, duration):
+    by_route = {}
+    for route, status, elapsed, queries, db_time in samples:
+        by_route.setdefault(route, []).append((status, elapsed, queries, db_time))
+
+    routes = {}
+    for route, entries in sorted(by_route.items()):
+        latencies = sorted(elapsed * 1000 for _, elapsed, _, _ in entries)
+        profiled = [(queries, db_time) for _, _, queries, db_time in entries if queries is not None]
+        routes[route] = {
+            'requests': len(entries),
+            'errors': sum(1 for status, _, _, _ in entries if status == 0 or status >= 400),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'queries_per_request': sum(q for q, _ in profiled) / len(profiled) if profiled else None,
+            'db_ms_per_request': sum(d for _, d in profiled) / len(profiled) if profiled else None,
+        }
+    return {
+        'journeys': journeys,
+        'completed_journeys': completed,
+        'duration_seconds': duration,
+        'requests_per_second': len(samples) / duration if duration else 0.0,
+        'routes': routes,
+    }
+
+
+def print_report(report):
+    print(f"{'route':<28}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'db ms':>8}")
+    for route, stats in report['routes'].items():
+        queries = stats['queries_per_request']
+        db_ms = stats['db_ms_per_request']
+        print(f"{route:<28}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{'-' if queries is None else f'{queries:.1f}':>9}"
+              f"{'-' if db_ms is None else f'{db_ms:.1f}':>8}")
+    print(f"{report['completed_journeys']}/{report['journeys']} journeys completed in "
+          f"{report['duration_seconds']:.1f} s ({report['requests_per_second']:.1f} requests/s)")
+
+
+def regressions(report, baseline, max_regression):
+    """Routes whose p95 is more than ``max_regression`` (a fraction) above the baseline's."""
+    found = []
+    for route, stats in report['routes'].items():
+        before = baseline['routes'].get(route)
+        if before is None:
+            continue
+        limit = max(before['p95_ms'] * (1 + max_regression), before['p95_ms'] + MIN_REGRESSION_MS)
+        if stats['p95_ms'] > limit:
+            found.append((route, before['p95_ms'], stats['p95_ms']))
+    return found
+
+
+def run(journeys, total, concurrency):
+    """Run ``total`` journeys on ``concurrency`` threads; returns (samples, completed, duration)."""
+    counter = itertools.count()
+    # Each thread appends to its own lists; they are merged once all are done
+    results = [([], []) for _ in range(concurrency)]
+
+    def worker(samples, outcomes):
+        while next(counter) < total:
+            outcomes.append(journeys.run(samples))
+
+    threads = [threading.Thread(target=worker, args=result) for result in results]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    samples = [sample for thread_samples, _ in results for sample in thread_samples]
+    completed = sum(sum(outcomes) for _, outcomes in results)
+    return samples, completed, duration
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.load', description='Replay user journeys.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8080')
+    parser.add_argument('--manifest', default='benchmark_manifest.json')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--journeys', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='save the report as JSON')
+    parser.add_argument('--baseline', help='a saved report to compare p95 latencies with')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='allowed p95 increase, as a fraction')
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    if not manifest['rides']:
+        print('The manifest has no joinable rides; run python -m benchmark.seed first')
+        return 2
+
+    samples, completed, duration = run(Journeys(manifest, args.base_url, args.seed), args.journeys, args.concurrency)
+    report = summarize(samples, args.journeys, completed, duration)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.max_regression)
+        for route, before, after in found:
+            print(f'Regression: {route} p95 {before:.1f} ms -> {after:.1f} ms')
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
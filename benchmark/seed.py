@@ -0,0 +1,225 @@
+"""Seed the database with a synthetic campus.
+
+    python -m benchmark.seed [--colleges N] [--students M] [--reset]
+
+Creates students spread over N colleges, a share of them drivers with a
+vehicle, and rides over a term around today. Past rides are completed
+with their passengers; upcoming rides are active with some seats taken
+and some join requests still pending. Students also have unmatched
+requests of their own. Everything is derived from --seed, so a run is
+repeatable.
+
+Seeded users have emails ending in ``.bench.example`` and share one
+password. --reset deletes them, and through the foreign keys everything
+that belongs to them, before seeding. A manifest of logins and upcoming
+rides is written for ``benchmark.load``.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from config import load_config
+from passwords import PasswordHasher
+from storage import connect
+
+EMAIL_DOMAIN = 'bench.example'
+
+COLLEGES = [
+    'North Ridge Institute of Technology', 'Lakeside College of Engineering', 'St. Anne College',
+    'Valley University', 'Hillview Institute of Science', 'Riverside Polytechnic',
+    'Eastgate College of Commerce', 'Westfield Medical College', 'Green Park University',
+    'Harbor Institute of Management', 'Summit College of Arts', 'Metro Technical University',
+]
+DESTINATIONS = [
+    'Central Station', 'Airport Terminal 1', 'Airport Terminal 2', 'City Mall', 'Bus Terminal',
+    'Old Town Square', 'Tech Park', 'Lake View', 'General Hospital', 'Riverside Market',
+    'Sports Stadium', 'Film City', 'Museum Road', 'Beach Road', 'Railway Colony',
+    'Sunrise Apartments', 'Green Valley', 'Industrial Estate', 'Civil Lines', 'Harbor Front',
+]
+VEHICLE_MODELS = [
+    ('Maruti Swift', 4), ('Hyundai i20', 4), ('Honda City', 4), ('Toyota Innova', 6),
+    ('Mahindra XUV500', 6), ('Tata Nexon', 4), ('Kia Carens', 6), ('Renault Kwid', 3),
+]
+
+USER_COLUMNS = ('id', 'roll_number', 'college_name', 'email', 'password_hash')
+VEHICLE_COLUMNS = ('vehicle_id', 'user_id', 'vehicle_no', 'vehicle_model', 'seats_available')
+RIDE_COLUMNS = ('ride_id', 'driver_id', 'vehicle_id', 'source_location', 'destination_location', 'ride_date',
+                'ride_time', 'seats_offered', 'seats_remaining', 'passenger_count', 'status')
+REQUEST_COLUMNS = ('request_id', 'passenger_id', 'rider_source', 'rider_destination', 'preferred_date',
+                   'preferred_time', 'status', 'matched_ride_id', 'driver_accepted')
+PARTICIPATION_COLUMNS = ('participation_id', 'ride_id', 'student_id', 'role', 'status')
+
+
+class Ids:
+    """Explicit ids continuing after the rows already in each table.
+
+    Seeding is the only writer, so rows can reference each other without
+    reading generated keys back.
+    """
+
+    def __init__(self, cursor):
+        self._next = {}
+        for table, column in (('users', 'id'), ('vehicle', 'vehicle_id'), ('rides', 'ride_id'),
+                              ('Ride_Request', 'request_id'), ('Ride_Participation', 'participation_id')):
+            cursor.execute(f'SELECT COALESCE(MAX({column}), 0) FROM {table}')
+            self._next[table] = cursor.fetchone()[0] + 1
+
+    def take(self, table):
+        value = self._next[table]
+        self._next[table] += 1
+        return value
+
+
+def generate(ids, rng, colleges, students, driver_share, rides_per_driver, past_days, future_days, password_hash):
+    """Rows for every table plus the manifest, as ({table: rows}, manifest)."""
+    today = date.today()
+    rows = {'users': [], 'vehicle': [], 'rides': [], 'Ride_Request': [], 'Ride_Participation': []}
+    manifest = {'students': {}, 'rides': []}
+    names = COLLEGES[:colleges] if colleges <= len(COLLEGES) else [f'College {i + 1}' for i in range(colleges)]
+
+    by_college = {index: [] for index in range(colleges)}
+    for i in range(students):
+        college = i % colleges
+        user_id = ids.take('users')
+        email = f'student{user_id}@c{college}.{EMAIL_DOMAIN}'
+        rows['users'].append((user_id, f'BN{user_id:08d}', names[college], email, password_hash))
+        by_college[college].append((user_id, email))
+    for college, members in by_college.items():
+        manifest['students'][str(college)] = members
+
+    def random_time():
+        minutes = rng.randrange(7 * 60, 22 * 60, 15)
+        return timedelta(minutes=minutes)
+
+    def add_request(passenger_id, source, destination, ride_date, ride_time, status, ride_id=None):
+        rows['Ride_Request'].append((ids.take('Ride_Request'), passenger_id, source, destination, ride_date,
+                                     ride_time, status, ride_id, status == 'matched'))
+
+    for college, members in by_college.items():
+        campus = f'{names[college]} Campus'
+        drivers = members[:max(1, int(len(members) * driver_share))]
+        for driver_id, driver_email in drivers:
+            vehicle_id = ids.take('vehicle')
+            model, capacity = rng.choice(VEHICLE_MODELS)
+            rows['vehicle'].append((vehicle_id, driver_id, f'BN-{vehicle_id:08d}', model, capacity))
+
+            for _ in range(rides_per_driver):
+                ride_id = ids.take('rides')
+                ride_date = today + timedelta(days=rng.randint(-past_days, future_days))
+                ride_time = random_time()
+                destination = rng.choice(DESTINATIONS)
+                source, destination = (campus, destination) if rng.random() < 0.5 else (destination, campus)
+                seats = rng.randint(1, capacity)
+                past = ride_date < today
+
+                others = [member for member in members if member[0] != driver_id]
+                taken = rng.sample(others, min(len(others), rng.randint(0, seats)))
+                for passenger_id, _ in taken:
+                    add_request(passenger_id, source, destination, ride_date, ride_time, 'matched', ride_id)
+                    rows['Ride_Participation'].append((ids.take('Ride_Participation'), ride_id, passenger_id,
+                                                       'passenger', 'completed' if past else 'confirmed'))
+                waiting = []
+                if not past and len(taken) < seats:
+                    free = [member for member in others if member not in taken]
+                    waiting = rng.sample(free, min(len(free), rng.randint(0, 2)))
+                    for passenger_id, _ in waiting:
+                        add_request(passenger_id, source, destination, ride_date, ride_time, 'pending', ride_id)
+
+                rows['rides'].append((ride_id, driver_id, vehicle_id, source, destination, ride_date, ride_time,
+                                      seats, seats - len(taken), len(taken), 'completed' if past else 'active'))
+                # Rides from tomorrow on cannot be completed by the lifecycle sweep during a run
+                if ride_date > today and len(taken) < seats:
+                    manifest['rides'].append({
+                        'ride_id': ride_id,
+                        'driver': driver_email,
+                        'college': college,
+                        'destination': destination,
+                        'date': ride_date.isoformat(),
+                        'busy': [member[0] for member in taken + waiting] + [driver_id],
+                    })
+
+        # Requests nobody has matched yet
+        for passenger_id, _ in members:
+            if rng.random() < 0.3:
+                preferred_date = today + timedelta(days=rng.randint(-past_days, future_days))
+                add_request(passenger_id, campus, rng.choice(DESTINATIONS), preferred_date, random_time(),
+                            'expired' if preferred_date < today else 'pending')
+    return rows, manifest
+
+
+def insert_rows(connection, table, columns, rows, batch_size):
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(table, ', '.join(columns), ', '.join(['%s'] * len(columns)))
+    cursor = connection.cursor()
+    try:
+        for start in range(0, len(rows), batch_size):
+            # executemany() sends each batch as one multi-row INSERT
+            cursor.executemany(sql, rows[start:start + batch_size])
+            connection.commit()
+    finally:
+        cursor.close()
+
+
+def reset(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute('DELETE FROM users WHERE email LIKE %s', (f'%.{EMAIL_DOMAIN}',))
+        connection.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmark.seed', description='Seed a synthetic campus.')
+    parser.add_argument('--colleges', type=int, default=5)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--driver-share', type=float, default=0.2, help='share of students who drive')
+    parser.add_argument('--rides-per-driver', type=int, default=10)
+    parser.add_argument('--past-days', type=int, default=90, help='how far back the term started')
+    parser.add_argument('--future-days', type=int, default=30, help='how far ahead rides are offered')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--manifest', default='benchmark_manifest.json')
+    parser.add_argument('--reset', action='store_true', help='delete previously seeded users first')
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    # The cost the app would use, so logins during a run cost the same as in production
+    hasher = PasswordHasher(workers=1, rounds=config['BCRYPT_ROUNDS'] or None,
+                            target_time=config['BCRYPT_TARGET_MS'] / 1000)
+    password_hash = hasher.hash(args.password)
+
+    connection = connect(config)
+    try:
+        if args.reset:
+            print(f'Deleted {reset(connection)} previously seeded user(s)')
+        cursor = connection.cursor()
+        try:
+            ids = Ids(cursor)
+        finally:
+            cursor.close()
+
+        rows, manifest = generate(ids, random.Random(args.seed), args.colleges, args.students, args.driver_share,
+                                  args.rides_per_driver, args.past_days, args.future_days, password_hash)
+        started = time.perf_counter()
+        for table, columns in (('users', USER_COLUMNS), ('vehicle', VEHICLE_COLUMNS), ('rides', RIDE_COLUMNS),
+                               ('Ride_Request', REQUEST_COLUMNS), ('Ride_Participation', PARTICIPATION_COLUMNS)):
+            insert_rows(connection, table, columns, rows[table], args.batch_size)
+            print(f'{table}: {len(rows[table])} row(s)')
+        print(f'Seeded in {time.perf_counter() - started:.1f} s')
+    finally:
+        connection.close()
+
+    manifest['password'] = args.password
+    with open(args.manifest, 'w') as f:
+        json.dump(manifest, f)
+    print(f"Wrote {args.manifest} with {len(manifest['rides'])} joinable ride(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,91 @@
+"""Small process-local cache for query results that every user shares."""
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after ``ttl`` seconds.
+
+    ``get_or_load`` lets only one thread run the loader for a missing key;
+    the others wait for its result instead of issuing the same query.
+    Writers call ``invalidate`` after committing so the next read reloads.
+    """
+
+    def __init__(self, ttl=30, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}      # key -> (expires_at, value)
+        self._loading = {}      # key -> lock held by the thread loading it
+        self._generation = 0    # bumped on every invalidation
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            return None
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            self._store(key, value, generation)
+
+    def _store(self, key, value, generation):
+        # Called with self._lock held. Drops results that were loaded
+        # before a concurrent invalidation.
+        if generation is not None and generation != self._generation:
+            return
+        now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+        self._entries[key] = (now + self.ttl, value)
+
+    def invalidate(self, key=None):
+        # With no key every entry is dropped
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._generation += 1
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another thread may have filled the entry while we waited
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            with self._lock:
+                self.misses += 1
+                generation = self._generation
+            loaded = False
+            try:
+                value = loader()
+                loaded = True
+            finally:
+                # Store the value and retire the loading lock together, so
+                # no caller can find neither and start a second load. A
+                # later loader may have replaced the lock; leave that one.
+                with self._lock:
+                    if loaded:
+                        self._store(key, value, generation)
+                    if self._loading.get(key) is load_lock:
+                        del self._loading[key]
+            return value
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
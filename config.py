@@ -0,0 +1,97 @@
+"""Application settings read from the environment.
+
+Every setting has an environment variable of the same name. During
+development they can live in .env; it is only read (and python-dotenv only
+imported) when SECRET_KEY is not already set in the environment, so
+deployed processes do not pay for it at startup.
+"""
+import os
+
+
+def _load_dotenv():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def _setting(name, default, cast=str):
+    value = os.getenv(name)
+    return default if value is None or value == '' else cast(value)
+
+
+def _flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _emails(value):
+    return {email.strip() for email in value.split(',') if email.strip()}
+
+
+def load_config(overrides=None):
+    """Settings from the environment, with ``overrides`` taking precedence."""
+    if 'SECRET_KEY' not in os.environ:
+        _load_dotenv()
+
+    config = {
+        'SECRET_KEY': _setting('SECRET_KEY', None),
+
+        'DB_BACKEND': _setting('DB_BACKEND', 'mysql'),     # mysql or sqlite (storage.py)
+        'DB_SQLITE_PATH': _setting('DB_SQLITE_PATH', 'ride_sharing.sqlite3'),
+        'DB_HOST': _setting('DB_HOST', 'localhost'),
+        'DB_USER': _setting('DB_USER', 'root'),
+        'DB_PASSWORD': _setting('DB_PASSWORD', ''),
+        'DB_NAME': _setting('DB_NAME', 'ride_sharing'),
+        'DB_POOL_SIZE': _setting('DB_POOL_SIZE', 10, int),
+        'DB_POOL_TIMEOUT': _setting('DB_POOL_TIMEOUT', 5.0, float),
+        'DB_POOL_MAX_LIFETIME': _setting('DB_POOL_MAX_LIFETIME', 1800.0, float),
+        'DB_POOL_PING_AFTER': _setting('DB_POOL_PING_AFTER', 30.0, float),
+        'ASYNC_DB_POOL_SIZE': _setting('ASYNC_DB_POOL_SIZE', 20, int),
+        'WEB_THREADS': _setting('WEB_THREADS', 4, int),    # request threads per process
+        'PAGE_LOADER_WORKERS': _setting('PAGE_LOADER_WORKERS', 4, int),    # 0: run page queries one by one
+
+        'SLOW_QUERY_MS': _setting('SLOW_QUERY_MS', 200.0, float),
+        'ADMIN_EMAILS': _setting('ADMIN_EMAILS', set(), _emails),
+        'METRICS_TOKEN': _setting('METRICS_TOKEN', None),
+
+        'BCRYPT_WORKERS': _setting('BCRYPT_WORKERS', 2, int),
+        'BCRYPT_MAX_QUEUE': _setting('BCRYPT_MAX_QUEUE', 32, int),
+        'BCRYPT_ROUNDS': _setting('BCRYPT_ROUNDS', 0, int),  # 0: calibrate
+        'BCRYPT_TARGET_MS': _setting('BCRYPT_TARGET_MS', 100.0, float),
+
+        'RIDES_CACHE_TTL': _setting('RIDES_CACHE_TTL', 30.0, float),
+        'LOCATION_INDEX_MAX_AGE': _setting('LOCATION_INDEX_MAX_AGE', 300.0, float),
+        'SSE_HEARTBEAT': _setting('SSE_HEARTBEAT', 15.0, float),
+        'SSE_ENABLED': _setting('SSE_ENABLED', True, _flag),    # off: /events answers 204, pages poll
+
+        'SESSION_BACKEND': _setting('SESSION_BACKEND', 'sqlite'),   # sqlite or redis
+        'SESSION_SQLITE_PATH': _setting('SESSION_SQLITE_PATH', 'sessions.sqlite3'),
+        'SESSION_REDIS_URL': _setting('SESSION_REDIS_URL', 'redis://localhost:6379/0'),
+        'SESSION_CACHE_SIZE': _setting('SESSION_CACHE_SIZE', 10000, int),
+        'SESSION_CACHE_TTL': _setting('SESSION_CACHE_TTL', 10.0, float),
+        'SESSION_PURGE_INTERVAL': _setting('SESSION_PURGE_INTERVAL', 3600.0, float),
+
+        'MATCH_TIME_WINDOW_MINUTES': _setting('MATCH_TIME_WINDOW_MINUTES', 30, int),
+        'MATCH_MIN_SIMILARITY': _setting('MATCH_MIN_SIMILARITY', 0.5, float),
+        'MATCH_INDEX_MAX_AGE': _setting('MATCH_INDEX_MAX_AGE', 60.0, float),
+
+        'SCHEDULER_ENABLED': _setting('SCHEDULER_ENABLED', True, _flag),
+        'LIFECYCLE_INTERVAL': _setting('LIFECYCLE_INTERVAL', 60.0, float),
+        'LIFECYCLE_BATCH_SIZE': _setting('LIFECYCLE_BATCH_SIZE', 500, int),
+        'ARCHIVE_INTERVAL': _setting('ARCHIVE_INTERVAL', 86400.0, float),
+        'ARCHIVE_AFTER_DAYS': _setting('ARCHIVE_AFTER_DAYS', 30, int),
+        'ARCHIVE_BATCH_SIZE': _setting('ARCHIVE_BATCH_SIZE', 500, int),
+    }
+    config.update(overrides or {})
+    return config
+
+
+def db_config(config):
+    """mysql.connector.connect() arguments for ``config``."""
+    return {
+        'host': config['DB_HOST'],
+        'user': config['DB_USER'],
+        'password': config['DB_PASSWORD'],
+        'database': config['DB_NAME'],
+    }
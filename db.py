@@ -0,0 +1,179 @@
+"""MySQL connection pool shared by the request handlers in app.py."""
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolExhausted(Error):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class ConnectionPool:
+    """A fixed-size pool of MySQL connections.
+
+    Connections are opened lazily, health-checked when they are borrowed after
+    sitting idle, and recycled once they are older than ``max_lifetime``.
+    """
+
+    def __init__(self, db_config, size=10, timeout=5.0, max_lifetime=1800,
+                 ping_after=30):
+        self.db_config = db_config
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = []        # (connection, created_at, returned_at)
+        self._created_at = {}  # id(connection) -> created_at, for checked out connections
+        self._open = 0
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'exhausted': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_checks': 0,
+            'peak_in_use': 0,
+        }
+
+    def _connect(self):
+        connection = mysql.connector.connect(**self.db_config)
+        self._count('created')
+        return connection
+
+    def _count(self, name):
+        with self._cond:
+            self._stats[name] += 1
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def _is_healthy(self, connection):
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def acquire(self, wait=True):
+        """Borrow a connection; with ``wait=False``, None if none is free right away."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._cond:
+            if not wait and not self._idle and self._open >= self.size:
+                return None
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['exhausted'] += 1
+                    raise PoolExhausted(
+                        msg=f'No database connection available after {self.timeout}s '
+                            f'({self._open} of {self.size} in use)'
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += time.monotonic() - started
+            self._stats['checkouts'] += 1
+
+            if self._idle:
+                connection, created_at, returned_at = self._idle.pop()
+            else:
+                # Reserve the slot now, connect outside the lock
+                connection, created_at, returned_at = None, None, None
+                self._open += 1
+
+            in_use = self._open - len(self._idle)
+            if in_use > self._stats['peak_in_use']:
+                self._stats['peak_in_use'] = in_use
+
+        try:
+            now = time.monotonic()
+            if connection is not None and now - created_at > self.max_lifetime:
+                self._discard(connection)
+                self._count('recycled')
+                connection = None
+            elif connection is not None and now - returned_at > self.ping_after:
+                if not self._is_healthy(connection):
+                    self._discard(connection)
+                    self._count('failed_checks')
+                    connection = None
+
+            if connection is None:
+                connection = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._created_at[id(connection)] = created_at
+        return connection
+
+    def release(self, connection):
+        with self._cond:
+            created_at = self._created_at.pop(id(connection), None)
+        if created_at is None:
+            return
+
+        # Never hand out a connection with a half-finished transaction (or an
+        # open read snapshot that would hide other requests' writes)
+        try:
+            if connection.in_transaction or connection.unread_result:
+                connection.rollback()
+            reusable = True
+        except Error:
+            reusable = False
+
+        with self._cond:
+            if reusable:
+                self._idle.append((connection, created_at, time.monotonic()))
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if not reusable:
+            self._discard(connection)
+
+    def reset_after_fork(self):
+        """Forget everything inherited from the parent process.
+
+        Inherited connections share their sockets with the parent, so they
+        are dropped without being closed; closing them would end the
+        parent's sessions too.
+        """
+        self._cond = threading.Condition()
+        self._idle = []
+        self._created_at = {}
+        self._open = 0
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+        return stats
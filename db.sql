@@ -9,7 +9,9 @@ CREATE TABLE IF NOT EXISTS users (
     college_name VARCHAR(100) NOT NULL,
     email VARCHAR(100) NOT NULL UNIQUE,
     password_hash VARCHAR(255) NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Bumped whenever the pending requests on this user's rides change (ETag of /get_pending_requests)
+    request_version INT NOT NULL DEFAULT 0
 ) 
 
 -- Create rides table
@@ -22,8 +24,12 @@ CREATE TABLE IF NOT EXISTS rides (
     ride_date DATE NOT NULL,
     ride_time TIME NOT NULL,
     seats_offered INT NOT NULL,
+    -- Free seats and accepted passengers, kept in step with Ride_Participation (seats.py)
+    seats_remaining INT NOT NULL,
+    passenger_count INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     status ENUM('active', 'completed', 'cancelled') DEFAULT 'active',
+    CONSTRAINT chk_rides_seats_remaining CHECK (seats_remaining >= 0 AND seats_remaining <= seats_offered),
     FOREIGN KEY (driver_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (vehicle_id) REFERENCES vehicle(vehicle_id) ON DELETE CASCADE
 ) 
@@ -45,6 +51,7 @@ CREATE TABLE IF NOT EXISTS Ride_Participation (
     student_id INT NOT NULL,
     role ENUM('driver', 'passenger') NOT NULL,
     status ENUM('confirmed', 'cancelled', 'completed', 'no-show') NOT NULL DEFAULT 'confirmed',
+    UNIQUE KEY uq_participation_ride_student (ride_id, student_id),
     FOREIGN KEY (ride_id) REFERENCES rides(ride_id) ON DELETE CASCADE,
     FOREIGN KEY (student_id) REFERENCES users(id) ON DELETE CASCADE
 ) 
@@ -57,7 +64,7 @@ CREATE TABLE IF NOT EXISTS Ride_Request (
     rider_destination VARCHAR(100) NOT NULL,
     preferred_date DATE NOT NULL,
     preferred_time TIME NOT NULL,
-    status ENUM('matched', 'pending', 'rejected', 'cancelled') NOT NULL DEFAULT 'pending',
+    status ENUM('matched', 'pending', 'rejected', 'cancelled', 'expired') NOT NULL DEFAULT 'pending',
     matched_ride_id INT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     driver_accepted BOOLEAN DEFAULT FALSE,
@@ -65,6 +72,52 @@ CREATE TABLE IF NOT EXISTS Ride_Request (
     FOREIGN KEY (matched_ride_id) REFERENCES rides(ride_id) ON DELETE SET NULL
 ) 
 
+-- Archive tables: past rides, their requests and participations (archive.py)
+CREATE TABLE IF NOT EXISTS rides_archive (
+    ride_id INT PRIMARY KEY,
+    driver_id INT NOT NULL,
+    vehicle_id INT NOT NULL,
+    source_location VARCHAR(100) NOT NULL,
+    destination_location VARCHAR(100) NOT NULL,
+    ride_date DATE NOT NULL,
+    ride_time TIME NOT NULL,
+    seats_offered INT NOT NULL,
+    seats_remaining INT NOT NULL,
+    passenger_count INT NOT NULL,
+    created_at TIMESTAMP NULL,
+    status ENUM('active', 'completed', 'cancelled'),
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_rides_archive_driver_date (driver_id, ride_date),
+    INDEX idx_rides_archive_date (ride_date)
+);
+
+CREATE TABLE IF NOT EXISTS Ride_Request_archive (
+    request_id INT PRIMARY KEY,
+    passenger_id INT NOT NULL,
+    rider_source VARCHAR(100) NOT NULL,
+    rider_destination VARCHAR(100) NOT NULL,
+    preferred_date DATE NOT NULL,
+    preferred_time TIME NOT NULL,
+    status ENUM('matched', 'pending', 'rejected', 'cancelled', 'expired') NOT NULL,
+    matched_ride_id INT,
+    created_at TIMESTAMP NULL,
+    driver_accepted BOOLEAN,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_ride_request_archive_passenger (passenger_id),
+    INDEX idx_ride_request_archive_ride (matched_ride_id)
+);
+
+CREATE TABLE IF NOT EXISTS Ride_Participation_archive (
+    participation_id INT PRIMARY KEY,
+    ride_id INT NOT NULL,
+    student_id INT NOT NULL,
+    role ENUM('driver', 'passenger') NOT NULL,
+    status ENUM('confirmed', 'cancelled', 'completed', 'no-show') NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_participation_archive_ride (ride_id),
+    INDEX idx_participation_archive_student (student_id, role)
+);
+
 -- ===============================================
 -- Ride Sharing App: SQL Queries with Placeholders
 -- ===============================================
@@ -81,7 +134,7 @@ JOIN vehicle v ON r.vehicle_id = v.vehicle_id
 WHERE r.source_location LIKE '%[search_source]%'
 AND r.destination_location LIKE '%[search_destination]%'
 AND r.ride_date = '[search_date]'
-AND r.seats_offered > 0
+AND r.seats_remaining > 0
 AND r.status = 'active'
 ORDER BY r.ride_time;
 
@@ -102,15 +155,11 @@ INSERT INTO Ride_Request (
 SELECT r.ride_id, r.source_location, r.destination_location, r.ride_date, r.ride_time,
        r.seats_offered, u.roll_number AS driver_roll, u.college_name AS driver_college,
        u.email AS driver_email, v.vehicle_model, v.vehicle_no, v.seats_available,
-       COUNT(rp.participation_id) AS current_passengers
+       r.passenger_count AS current_passengers, r.seats_remaining
 FROM rides r
 JOIN users u ON r.driver_id = u.id
 JOIN vehicle v ON r.vehicle_id = v.vehicle_id
-LEFT JOIN Ride_Participation rp ON r.ride_id = rp.ride_id AND rp.role = 'passenger'
-WHERE r.ride_id = [ride_id]
-GROUP BY r.ride_id, r.source_location, r.destination_location, r.ride_date, r.ride_time,
-         r.seats_offered, u.roll_number, u.college_name, u.email, v.vehicle_model,
-         v.vehicle_no, v.seats_available;
+WHERE r.ride_id = [ride_id];
 
 -- -----------------------------------------------
 -- 4. Get all rides a user has participated in
@@ -142,6 +191,7 @@ AND passenger_id = [user_id];
 
 -- -----------------------------------------------
 -- 7. Mark a ride as completed
+--    (lifecycle.py does 7 and 8 for every ride once it has departed)
 -- -----------------------------------------------
 UPDATE rides
 SET status = 'completed'
@@ -160,12 +210,10 @@ AND status = 'confirmed';
 -- 9. Check available seats for a ride
 -- -----------------------------------------------
 SELECT r.ride_id, r.seats_offered,
-       COUNT(rp.participation_id) AS current_passengers,
-       (r.seats_offered - COUNT(rp.participation_id)) AS available_seats
+       r.passenger_count AS current_passengers,
+       r.seats_remaining AS available_seats
 FROM rides r
-LEFT JOIN Ride_Participation rp ON r.ride_id = rp.ride_id AND rp.role = 'passenger'
-WHERE r.ride_id = [ride_id]
-GROUP BY r.ride_id;
+WHERE r.ride_id = [ride_id];
 
 -- -----------------------------------------------
 -- 10. Find rides that match a passenger's request
@@ -180,7 +228,7 @@ WHERE r.source_location LIKE '%[request_source]%'
 AND r.destination_location LIKE '%[request_destination]%'
 AND r.ride_date = '[request_date]'
 AND r.ride_time BETWEEN '[request_time_min]' AND '[request_time_max]'
-AND r.seats_offered > 0
+AND r.seats_remaining > 0
 AND r.status = 'active'
 ORDER BY r.ride_time;
 
@@ -188,22 +236,37 @@ ORDER BY r.ride_time;
 -- 11. Get all active rides for a driver
 -- -----------------------------------------------
 SELECT r.ride_id, r.source_location, r.destination_location, r.ride_date, r.ride_time,
-       r.seats_offered, COUNT(rp.participation_id) AS current_passengers
+       r.seats_offered, r.passenger_count AS current_passengers
 FROM rides r
-LEFT JOIN Ride_Participation rp ON r.ride_id = rp.ride_id AND rp.role = 'passenger'
 WHERE r.driver_id = [driver_id]
 AND r.status = 'active'
-GROUP BY r.ride_id
 ORDER BY r.ride_date, r.ride_time;
 
 -- Add indexes for better performance
 CREATE INDEX idx_rides_source_dest ON rides(source_location, destination_location);
+-- Destination-only searches and the location index refresh (search_index.py)
+CREATE INDEX idx_rides_destination ON rides(destination_location);
 CREATE INDEX idx_rides_date ON rides(ride_date);
-CREATE INDEX idx_ride_request_status ON Ride_Request(status);
-
-
-
-
-
+-- Keyset pagination walks rides in (ride_date, ride_time, ride_id) order
+CREATE INDEX idx_rides_date_time ON rides(ride_date, ride_time, ride_id);
+-- Active ride listings and the lifecycle sweep
+CREATE INDEX idx_rides_status_date_time ON rides(status, ride_date, ride_time, ride_id);
+-- Hot query indexes (migrations/0006_hot_query_indexes.up.sql)
+CREATE INDEX idx_rides_driver_date_time ON rides(driver_id, ride_date, ride_time);
+CREATE INDEX idx_ride_request_matched_status ON Ride_Request(matched_ride_id, status);
+CREATE INDEX idx_ride_request_open ON Ride_Request(status, matched_ride_id, preferred_date);
+CREATE INDEX idx_participation_ride_role ON Ride_Participation(ride_id, role);
+CREATE INDEX idx_participation_student_role ON Ride_Participation(student_id, role);
+-- Archiving unmatched requests by date
+CREATE INDEX idx_ride_request_unmatched_date ON Ride_Request(matched_ride_id, preferred_date);
 
+-- Shared background jobs claim their runs here (scheduler.py)
+CREATE TABLE scheduler_runs (
+    job VARCHAR(100) PRIMARY KEY,
+    last_run DATETIME NOT NULL
+);
 
+-- Schema changes are applied with versioned migrations (migrations/, migrate.py).
+-- Mirror each change in db_sqlite.sql, the schema of the embedded SQLite backend.
+-- A database created from this file is already at the latest version:
+--     python migrate.py baseline 9
@@ -0,0 +1,131 @@
+-- The schema of db.sql for the embedded SQLite backend (DB_BACKEND=sqlite, storage.py).
+-- storage.py runs this file when it opens a database, so every statement is idempotent.
+-- Keep it in step with db.sql: same tables, columns and indexes.
+--
+-- Column types are declared as DATE, TIME and TIMESTAMP so storage.py returns them as
+-- date, timedelta and datetime, as mysql.connector does.
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    roll_number VARCHAR(20) NOT NULL UNIQUE,
+    college_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    request_version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS vehicle (
+    vehicle_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    vehicle_no VARCHAR(20) NOT NULL UNIQUE,
+    vehicle_model VARCHAR(50) NOT NULL,
+    seats_available INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rides (
+    ride_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    vehicle_id INTEGER NOT NULL REFERENCES vehicle(vehicle_id) ON DELETE CASCADE,
+    source_location VARCHAR(100) NOT NULL,
+    destination_location VARCHAR(100) NOT NULL,
+    ride_date DATE NOT NULL,
+    ride_time TIME NOT NULL,
+    seats_offered INTEGER NOT NULL,
+    seats_remaining INTEGER NOT NULL,
+    passenger_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'completed', 'cancelled')),
+    CONSTRAINT chk_rides_seats_remaining CHECK (seats_remaining >= 0 AND seats_remaining <= seats_offered)
+);
+
+CREATE TABLE IF NOT EXISTS Ride_Participation (
+    participation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ride_id INTEGER NOT NULL REFERENCES rides(ride_id) ON DELETE CASCADE,
+    student_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    role TEXT NOT NULL CHECK (role IN ('driver', 'passenger')),
+    status TEXT NOT NULL DEFAULT 'confirmed' CHECK (status IN ('confirmed', 'cancelled', 'completed', 'no-show')),
+    CONSTRAINT uq_participation_ride_student UNIQUE (ride_id, student_id)
+);
+
+CREATE TABLE IF NOT EXISTS Ride_Request (
+    request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    passenger_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    rider_source VARCHAR(100) NOT NULL,
+    rider_destination VARCHAR(100) NOT NULL,
+    preferred_date DATE NOT NULL,
+    preferred_time TIME NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('matched', 'pending', 'rejected', 'cancelled', 'expired')),
+    matched_ride_id INTEGER REFERENCES rides(ride_id) ON DELETE SET NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    driver_accepted BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS rides_archive (
+    ride_id INTEGER PRIMARY KEY,
+    driver_id INTEGER NOT NULL,
+    vehicle_id INTEGER NOT NULL,
+    source_location VARCHAR(100) NOT NULL,
+    destination_location VARCHAR(100) NOT NULL,
+    ride_date DATE NOT NULL,
+    ride_time TIME NOT NULL,
+    seats_offered INTEGER NOT NULL,
+    seats_remaining INTEGER NOT NULL,
+    passenger_count INTEGER NOT NULL,
+    created_at TIMESTAMP NULL,
+    status TEXT,
+    archived_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS Ride_Request_archive (
+    request_id INTEGER PRIMARY KEY,
+    passenger_id INTEGER NOT NULL,
+    rider_source VARCHAR(100) NOT NULL,
+    rider_destination VARCHAR(100) NOT NULL,
+    preferred_date DATE NOT NULL,
+    preferred_time TIME NOT NULL,
+    status TEXT NOT NULL,
+    matched_ride_id INTEGER,
+    created_at TIMESTAMP NULL,
+    driver_accepted BOOLEAN,
+    archived_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS Ride_Participation_archive (
+    participation_id INTEGER PRIMARY KEY,
+    ride_id INTEGER NOT NULL,
+    student_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    status TEXT NOT NULL,
+    archived_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS scheduler_runs (
+    job VARCHAR(100) PRIMARY KEY,
+    last_run TIMESTAMP NOT NULL
+);
+
+-- InnoDB indexes every foreign key by itself; SQLite does not
+CREATE INDEX IF NOT EXISTS idx_vehicle_user ON vehicle(user_id);
+CREATE INDEX IF NOT EXISTS idx_rides_vehicle ON rides(vehicle_id);
+CREATE INDEX IF NOT EXISTS idx_ride_request_passenger ON Ride_Request(passenger_id);
+
+CREATE INDEX IF NOT EXISTS idx_rides_source_dest ON rides(source_location, destination_location);
+CREATE INDEX IF NOT EXISTS idx_rides_destination ON rides(destination_location);
+CREATE INDEX IF NOT EXISTS idx_rides_date ON rides(ride_date);
+CREATE INDEX IF NOT EXISTS idx_rides_date_time ON rides(ride_date, ride_time, ride_id);
+CREATE INDEX IF NOT EXISTS idx_rides_status_date_time ON rides(status, ride_date, ride_time, ride_id);
+CREATE INDEX IF NOT EXISTS idx_rides_driver_date_time ON rides(driver_id, ride_date, ride_time);
+CREATE INDEX IF NOT EXISTS idx_ride_request_matched_status ON Ride_Request(matched_ride_id, status);
+CREATE INDEX IF NOT EXISTS idx_ride_request_open ON Ride_Request(status, matched_ride_id, preferred_date);
+CREATE INDEX IF NOT EXISTS idx_participation_ride_role ON Ride_Participation(ride_id, role);
+CREATE INDEX IF NOT EXISTS idx_participation_student_role ON Ride_Participation(student_id, role);
+CREATE INDEX IF NOT EXISTS idx_ride_request_unmatched_date ON Ride_Request(matched_ride_id, preferred_date);
+
+CREATE INDEX IF NOT EXISTS idx_rides_archive_driver_date ON rides_archive(driver_id, ride_date);
+CREATE INDEX IF NOT EXISTS idx_rides_archive_date ON rides_archive(ride_date);
+CREATE INDEX IF NOT EXISTS idx_ride_request_archive_passenger ON Ride_Request_archive(passenger_id);
+CREATE INDEX IF NOT EXISTS idx_ride_request_archive_ride ON Ride_Request_archive(matched_ride_id);
+CREATE INDEX IF NOT EXISTS idx_participation_archive_ride ON Ride_Participation_archive(ride_id);
+CREATE INDEX IF NOT EXISTS idx_participation_archive_student ON Ride_Participation_archive(student_id, role);
@@ -0,0 +1,125 @@
+"""In-process publish/subscribe broker behind the /events Server-Sent Events stream.
+
+Handlers publish to a per-user channel after they commit, and every open
+stream for that user receives the event without touching the database.
+Subscribers only see events published in the same process; with several
+workers, the profile page's slow poll of /get_pending_requests picks up
+what was published elsewhere.
+
+``stream`` serves a subscriber from a request thread; ``astream`` serves one
+on an asyncio event loop (asgi.py) while publishers stay on their threads.
+"""
+import asyncio
+import json
+import queue
+import threading
+from collections import defaultdict
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def format_sse(event, data):
+    payload = json.dumps(data, default=str)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+class AsyncSubscriber:
+    """Subscriber queue owned by an event loop; ``put_nowait`` may be called from any thread."""
+
+    def __init__(self, loop, maxsize):
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize)
+
+    def put_nowait(self, item):
+        # Same contract as queue.Queue, so publish() treats both alike
+        if self._queue.full():
+            raise queue.Full
+        self._loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+
+class EventBroker:
+    def __init__(self, max_queue=100, heartbeat=15):
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # channel -> subscriber queues
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, channel, subscriber=None):
+        if subscriber is None:
+            subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+            self.published += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # A stalled client must not block the handler that published
+                with self._lock:
+                    self.dropped += 1
+
+    def stream(self, channel):
+        """Yield SSE frames for ``channel`` until the client disconnects."""
+        subscriber = self.subscribe(channel)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Comment frame so proxies keep the connection open
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(event, data)
+        finally:
+            self.unsubscribe(channel, subscriber)
+
+    async def astream(self, channel):
+        """Async version of ``stream`` for ASGI servers."""
+        subscriber = self.subscribe(channel, AsyncSubscriber(asyncio.get_running_loop(), self.max_queue))
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = await subscriber.get(self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(event, data)
+        finally:
+            self.unsubscribe(channel, subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'channels': len(self._subscribers),
+                'subscribers': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published,
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,68 @@
+"""Production launcher settings.
+
+    gunicorn -c gunicorn.conf.py
+
+Workers are uvicorn workers serving ``asgi:application``, so /events
+streams run on each worker's event loop and an open profile tab holds no
+thread; the Flask routes run on a pool of ``WEB_THREADS`` threads. With
+``WORKER_CLASS=gthread`` the Flask app is served directly instead, and
+/events is refused (SSE_ENABLED=0) so pages fall back to polling, rather
+than each open tab holding one of the worker's ``WEB_THREADS`` threads.
+
+The app is created once in the master; the bcrypt cost is calibrated and
+templates are compiled before the workers fork, so workers start warm and
+share those pages copy-on-write. Each worker gets its own connection pool
+after the fork and is replaced after ``max_requests`` requests.
+
+Send SIGHUP to restart the workers gracefully with the new settings, and
+SIGTERM for a graceful shutdown. Because the app is preloaded, code changes
+need a full restart (or SIGUSR2 followed by SIGTERM to the old master).
+"""
+import multiprocessing
+import os
+
+worker_class = os.getenv('WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+if worker_class == 'gthread':
+    wsgi_app = 'app:create_app()'
+    # Read by create_app() when the preloaded app is created below
+    os.environ['SSE_ENABLED'] = '0'
+else:
+    wsgi_app = 'asgi:application'
+bind = os.getenv('BIND', '0.0.0.0:8080')
+
+# One process per core, a few threads each for requests waiting on MySQL. Uvicorn
+# workers ignore ``threads``; asgi.py sizes its Flask thread pool from WEB_THREADS.
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.getenv('WEB_THREADS', 4))
+
+preload_app = True
+
+# Recycle workers to contain slow leaks; jitter keeps them from restarting together
+max_requests = int(os.getenv('MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', 500))
+
+timeout = int(os.getenv('WORKER_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.getenv('ACCESS_LOG', '-')
+
+
+def when_ready(server):
+    # Runs in the master before the first worker is forked
+    import app as web
+    templates = web.app.jinja_env.list_templates()
+    for name in templates:
+        web.app.jinja_env.get_template(name)
+    server.log.info('Preloaded %d templates, bcrypt cost %d', len(templates), web.password_hasher.rounds)
+
+
+def post_fork(server, worker):
+    import app as web
+    web.db_pool.reset_after_fork()
+
+
+def worker_exit(server, worker):
+    import app as web
+    web.scheduler.stop(timeout=5)
+    web.db_pool.close_all()
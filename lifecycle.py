@@ -0,0 +1,115 @@
+"""Ride lifecycle sweeps.
+
+Once a ride's departure time has passed, it is marked completed, its
+confirmed participations are completed and requests still pending on it
+are expired. Unmatched requests whose preferred time has passed are
+expired too. With that done, listings only need ``status = 'active'``.
+
+Every sweep works in batches of ``batch_size`` rows, one short transaction
+per batch. Rows locked by another worker running the same sweep are
+skipped (``SKIP LOCKED``), so several app processes can sweep at once.
+The app runs the sweep from its scheduler; it can also run as a sidecar:
+
+    python lifecycle.py
+"""
+import sys
+
+DEPARTED = '(ride_date < CURDATE() OR (ride_date = CURDATE() AND ride_time <= CURTIME()))'
+REQUEST_PASSED = '(preferred_date < CURDATE() OR (preferred_date = CURDATE() AND preferred_time <= CURTIME()))'
+
+
+def complete_departed_rides(cursor, batch_size):
+    """Complete up to ``batch_size`` departed rides; returns (rides, expired requests)."""
+    cursor.execute(f'''
+        SELECT ride_id, driver_id FROM rides
+        WHERE status = 'active' AND {DEPARTED}
+        ORDER BY ride_date, ride_time, ride_id
+        LIMIT %s FOR UPDATE SKIP LOCKED
+    ''', (batch_size,))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0, 0
+
+    ride_ids = [row[0] for row in rows]
+    ids = ', '.join(['%s'] * len(ride_ids))
+    cursor.execute(f"UPDATE rides SET status = 'completed' WHERE ride_id IN ({ids})", ride_ids)
+    cursor.execute(f'''
+        UPDATE Ride_Participation SET status = 'completed'
+        WHERE ride_id IN ({ids}) AND status = 'confirmed'
+    ''', ride_ids)
+    cursor.execute(f'''
+        UPDATE Ride_Request SET status = 'expired'
+        WHERE matched_ride_id IN ({ids}) AND status = 'pending'
+    ''', ride_ids)
+    expired = cursor.rowcount
+
+    if expired:
+        # The drivers' pending request lists changed (ETag of /get_pending_requests)
+        driver_ids = sorted({row[1] for row in rows})
+        cursor.execute(
+            'UPDATE users SET request_version = request_version + 1 WHERE id IN (%s)'
+            % ', '.join(['%s'] * len(driver_ids)), driver_ids)
+    return len(ride_ids), expired
+
+
+def expire_unmatched_requests(cursor, batch_size):
+    """Expire up to ``batch_size`` unmatched requests whose time has passed."""
+    cursor.execute(f'''
+        UPDATE Ride_Request SET status = 'expired'
+        WHERE status = 'pending' AND matched_ride_id IS NULL AND {REQUEST_PASSED}
+        LIMIT %s
+    ''', (batch_size,))
+    return cursor.rowcount
+
+
+def sweep_ride_lifecycle(connection, batch_size=500, max_batches=100):
+    """Run both sweeps; returns counts of completed rides and expired requests.
+
+    At most ``max_batches`` batches run per sweep so a large backlog is
+    worked off over several runs instead of one long one.
+    """
+    result = {'rides': 0, 'requests': 0}
+    cursor = connection.cursor()
+    try:
+        for _ in range(max_batches):
+            try:
+                rides, expired = complete_departed_rides(cursor, batch_size)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            result['rides'] += rides
+            result['requests'] += expired
+            if rides < batch_size:
+                break
+
+        for _ in range(max_batches):
+            try:
+                expired = expire_unmatched_requests(cursor, batch_size)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            result['requests'] += expired
+            if expired < batch_size:
+                break
+        return result
+    finally:
+        cursor.close()
+
+
+def main(argv):
+    from config import load_config
+    from storage import connect
+
+    connection = connect(load_config())
+    try:
+        result = sweep_ride_lifecycle(connection, batch_size=int(argv[0]) if argv else 500)
+    finally:
+        connection.close()
+    print(f"Completed {result['rides']} ride(s), expired {result['requests']} request(s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,330 @@
+"""Batch matching of open ride requests to active rides.
+
+A request is open while it is pending and has no ``matched_ride_id``. For
+one date, every open request is scored against the rides it could take:
+
+* location: trigram similarity of source and destination names, looked up
+  once per distinct pair of names rather than once per request and ride;
+* time: how close the ride leaves to the preferred time, within a window;
+* seats: a small preference for rides with more room left.
+
+Rides are bucketed by normalized source and destination, with departure
+times sorted inside each bucket, so a request only looks at buckets with
+similar names and bisects to its time window; only its best few rides are
+kept as candidates. Assignments are chosen
+greedily by score, one ride per request, without exceeding the free seats
+of a ride (minus requests already waiting on it). A matched request stays
+pending with ``matched_ride_id`` set, so its driver accepts or rejects it
+like any other join request.
+
+For ride writes there is an incremental mode: ``PendingRequestIndex`` keeps
+open requests bucketed by (date, source, destination, time slot), and
+``RideMatcher.match_ride`` probes one new or changed ride against only the
+buckets it could serve, so its cost does not grow with the backlog.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta
+
+from search_index import location_similarity, normalize_location
+
+Assignment = namedtuple('Assignment', 'request_id ride_id driver_id passenger_id score')
+
+
+def minutes_of_day(value):
+    # TIME columns come back as timedelta; also accept datetime.time and 'HH:MM[:SS]'
+    if isinstance(value, timedelta):
+        return value.total_seconds() / 60
+    if hasattr(value, 'hour'):
+        return value.hour * 60 + value.minute + value.second / 60
+    parts = [int(part) for part in str(value).split(':')]
+    return parts[0] * 60 + parts[1] + (parts[2] / 60 if len(parts) > 2 else 0)
+
+
+class RideMatcher:
+    def __init__(self, time_window=30, min_similarity=0.5, location_weight=0.6,
+                 time_weight=0.35, seat_weight=0.05, candidates_per_request=5):
+        self.time_window = time_window
+        self.min_similarity = min_similarity
+        self.location_weight = location_weight
+        self.time_weight = time_weight
+        self.seat_weight = seat_weight
+        self.candidates_per_request = candidates_per_request
+
+    def similar(self, name, names, memo):
+        """[(other, score)] for the names in ``names`` similar enough to ``name``."""
+        found = memo.get(name)
+        if found is None:
+            found = memo[name] = [
+                (other, score) for other in names
+                for score in (location_similarity(name, other),)
+                if score >= self.min_similarity
+            ]
+        return found
+
+    def build_index(self, rides):
+        """Bucket rides by date, normalized source and destination.
+
+        Returns {date: ({source: {destination: (times, rides)}}, names)} where
+        ``names`` is every normalized location used by that day's rides.
+        """
+        buckets = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        for ride in rides:
+            source = normalize_location(ride['source_location'])
+            destination = normalize_location(ride['destination_location'])
+            buckets[ride['ride_date']][source][destination].append(
+                (minutes_of_day(ride['ride_time']), ride['ride_id'], ride))
+
+        index = {}
+        for ride_date, by_source in buckets.items():
+            names = set()
+            day = {}
+            for source, by_destination in by_source.items():
+                names.add(source)
+                day[source] = {}
+                for destination, bucket in by_destination.items():
+                    names.add(destination)
+                    bucket.sort(key=lambda item: item[:2])
+                    day[source][destination] = ([item[0] for item in bucket], [item[2] for item in bucket])
+            index[ride_date] = (day, sorted(names))
+        return index
+
+    def candidates(self, request, index, memo=None):
+        """Yield (score, ride) for every ride ``request`` could be matched to."""
+        entry = index.get(request['preferred_date'])
+        if not entry:
+            return
+        by_source, names = entry
+        memo = {} if memo is None else memo.setdefault(request['preferred_date'], {})
+        preferred = minutes_of_day(request['preferred_time'])
+        destinations = self.similar(normalize_location(request['rider_destination']), names, memo)
+
+        for ride_source, source_score in self.similar(normalize_location(request['rider_source']), names, memo):
+            by_destination = by_source.get(ride_source)
+            if not by_destination:
+                continue
+            for ride_destination, destination_score in destinations:
+                bucket = by_destination.get(ride_destination)
+                if not bucket:
+                    continue
+                times, rides = bucket
+                location_score = (source_score + destination_score) / 2
+
+                start = bisect.bisect_left(times, preferred - self.time_window)
+                end = bisect.bisect_right(times, preferred + self.time_window)
+                for position in range(start, end):
+                    ride = rides[position]
+                    if ride['driver_id'] == request['passenger_id']:
+                        continue
+                    yield self.score(location_score, times[position], preferred, ride), ride
+
+    def score(self, location_score, ride_minutes, preferred, ride):
+        time_score = 1 - abs(ride_minutes - preferred) / (self.time_window or 1)
+        seat_score = ride['seats_remaining'] / max(ride['seats_offered'], 1)
+        return (self.location_weight * location_score
+                + self.time_weight * time_score
+                + self.seat_weight * seat_score)
+
+    def free_seats(self, ride):
+        return ride['seats_remaining'] - ride.get('pending_requests', 0)
+
+    def match_ride(self, ride, pending_index):
+        """Assign the best open requests from ``pending_index`` to one ride."""
+        free = self.free_seats(ride)
+        if free <= 0:
+            return []
+        ride_minutes = minutes_of_day(ride['ride_time'])
+
+        scored = []
+        for location_score, request in pending_index.probe(ride, self):
+            if request['passenger_id'] == ride['driver_id']:
+                continue
+            preferred = minutes_of_day(request['preferred_time'])
+            if abs(ride_minutes - preferred) > self.time_window:
+                continue
+            scored.append((self.score(location_score, ride_minutes, preferred, ride), request))
+
+        best = heapq.nlargest(free, scored, key=lambda item: (item[0], -item[1]['request_id']))
+        return [Assignment(request['request_id'], ride['ride_id'], ride['driver_id'],
+                           request['passenger_id'], round(score, 4))
+                for score, request in best]
+
+    def best_candidates(self, request, index, memo=None):
+        return heapq.nlargest(self.candidates_per_request, self.candidates(request, index, memo),
+                              key=lambda candidate: candidate[0])
+
+    def match(self, requests, rides):
+        index = self.build_index(rides)
+        memo = {}
+        edges = []
+        for request in requests:
+            for score, ride in self.best_candidates(request, index, memo):
+                edges.append((score, request, ride))
+        return self.assign(edges)
+
+    def assign(self, edges):
+        # Greedy: best scoring pairs first, ties broken by earliest request
+        edges.sort(key=lambda edge: (-edge[0], edge[1]['request_id'], edge[2]['ride_id']))
+        seats = {}
+        assigned = set()
+        assignments = []
+        for score, request, ride in edges:
+            if request['request_id'] in assigned:
+                continue
+            left = seats.get(ride['ride_id'])
+            if left is None:
+                left = self.free_seats(ride)
+            if left <= 0:
+                continue
+            seats[ride['ride_id']] = left - 1
+            assigned.add(request['request_id'])
+            assignments.append(Assignment(request['request_id'], ride['ride_id'], ride['driver_id'],
+                                          request['passenger_id'], round(score, 4)))
+        return assignments
+
+
+class PendingRequestIndex:
+    """Open ride requests bucketed by (date, source, destination, time slot)."""
+
+    def __init__(self, slot_minutes=30, max_age=60):
+        self.slot_minutes = slot_minutes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._requests = {}                  # request_id -> (bucket key, request)
+        self._buckets = defaultdict(dict)    # bucket key -> {request_id: request}
+        self._names = defaultdict(Counter)   # date -> normalized names in use
+        self._built_at = None
+
+    def _slot(self, minutes):
+        return int(minutes // self.slot_minutes)
+
+    def _add(self, request):
+        source = normalize_location(request['rider_source'])
+        destination = normalize_location(request['rider_destination'])
+        key = (request['preferred_date'], source, destination,
+               self._slot(minutes_of_day(request['preferred_time'])))
+        self._discard(request['request_id'])
+        self._requests[request['request_id']] = (key, request)
+        self._buckets[key][request['request_id']] = request
+        self._names[key[0]].update((source, destination))
+
+    def _discard(self, request_id):
+        entry = self._requests.pop(request_id, None)
+        if entry is None:
+            return
+        key, _ = entry
+        bucket = self._buckets[key]
+        bucket.pop(request_id, None)
+        if not bucket:
+            del self._buckets[key]
+        names = self._names[key[0]]
+        names.subtract((key[1], key[2]))
+        for name in (key[1], key[2]):
+            if names[name] <= 0:
+                del names[name]
+        if not names:
+            del self._names[key[0]]
+
+    def rebuild(self, requests):
+        with self._lock:
+            self._requests.clear()
+            self._buckets.clear()
+            self._names.clear()
+            for request in requests:
+                self._add(request)
+            self._built_at = time.monotonic()
+
+    def discard(self, request_ids):
+        with self._lock:
+            for request_id in request_ids:
+                self._discard(request_id)
+
+    def get(self, request_id):
+        entry = self._requests.get(request_id)
+        return entry[1] if entry else None
+
+    def is_built(self):
+        return self._built_at is not None
+
+    def is_stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def __len__(self):
+        return len(self._requests)
+
+    def probe(self, ride, matcher):
+        """[(location_score, request)] for requests in buckets ``ride`` could serve."""
+        ride_date = ride['ride_date']
+        minutes = minutes_of_day(ride['ride_time'])
+        first = self._slot(minutes - matcher.time_window)
+        last = self._slot(minutes + matcher.time_window)
+
+        with self._lock:
+            names = list(self._names.get(ride_date, ()))
+            if not names:
+                return []
+            memo = {}
+            sources = matcher.similar(normalize_location(ride['source_location']), names, memo)
+            destinations = matcher.similar(normalize_location(ride['destination_location']), names, memo)
+
+            found = []
+            for source, source_score in sources:
+                for destination, destination_score in destinations:
+                    location_score = (source_score + destination_score) / 2
+                    for slot in range(first, last + 1):
+                        bucket = self._buckets.get((ride_date, source, destination, slot))
+                        if bucket:
+                            found.extend((location_score, request) for request in bucket.values())
+            return found
+
+
+def load_open_requests(cursor, ride_date=None):
+    # One day's open requests, or every open request from today on
+    query = '''
+        SELECT request_id, passenger_id, rider_source, rider_destination,
+               preferred_date, preferred_time
+        FROM Ride_Request
+        WHERE status = 'pending' AND matched_ride_id IS NULL
+    '''
+    if ride_date is None:
+        cursor.execute(query + ' AND preferred_date >= CURDATE()')
+    else:
+        cursor.execute(query + ' AND preferred_date = %s', (ride_date,))
+    return cursor.fetchall()
+
+
+OPEN_RIDES_QUERY = '''
+    SELECT r.ride_id, r.driver_id, r.source_location, r.destination_location,
+           r.ride_date, r.ride_time, r.seats_offered, r.seats_remaining,
+           COUNT(rr.request_id) AS pending_requests
+    FROM rides r
+    LEFT JOIN Ride_Request rr ON rr.matched_ride_id = r.ride_id AND rr.status = 'pending'
+    WHERE r.status = 'active' AND r.seats_remaining > 0
+'''
+
+
+def load_open_rides(cursor, ride_date):
+    cursor.execute(OPEN_RIDES_QUERY + ' AND r.ride_date = %s GROUP BY r.ride_id', (ride_date,))
+    return cursor.fetchall()
+
+
+def load_open_ride(cursor, ride_id):
+    cursor.execute(OPEN_RIDES_QUERY + ' AND r.ride_id = %s GROUP BY r.ride_id', (ride_id,))
+    return cursor.fetchone()
+
+
+def apply_assignments(cursor, assignments):
+    """Point each request at its ride; returns the assignments that still applied."""
+    applied = []
+    for assignment in assignments:
+        cursor.execute('''
+            UPDATE Ride_Request
+            SET matched_ride_id = %s
+            WHERE request_id = %s AND status = 'pending' AND matched_ride_id IS NULL
+        ''', (assignment.ride_id, assignment.request_id))
+        if cursor.rowcount == 1:
+            applied.append(assignment)
+    return applied
@@ -0,0 +1,136 @@
+"""Request metrics in the Prometheus text format.
+
+Every thread records into its own shard (request counts by endpoint,
+method and status, a latency histogram and an in-flight count per
+endpoint), so recording a request takes no lock and threads never wait on
+each other. Only a scrape of /metrics walks the shards and adds them up.
+Shards of finished threads are kept, since their counts are cumulative.
+
+In-flight counts are +1/-1 deltas per shard; their sum is right even when
+a request starts and finishes on different threads.
+"""
+import threading
+from bisect import bisect_left
+
+# Upper bounds in seconds; the last histogram slot counts everything slower
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shard:
+    __slots__ = ('requests', 'histograms', 'durations', 'in_flight')
+
+    def __init__(self):
+        self.requests = {}      # (endpoint, method, status) -> count
+        self.histograms = {}    # endpoint -> [count per bucket..., count above the last bucket]
+        self.durations = {}     # endpoint -> total seconds
+        self.in_flight = {}     # endpoint -> started minus finished on this thread
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for name, value in labels)
+    return '{' + pairs + '}'
+
+
+def _sample(name, value, labels=()):
+    return f'{name}{_labels(labels)} {value}'
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()   # only taken when a thread records for the first time
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def request_started(self, endpoint):
+        in_flight = self._shard().in_flight
+        in_flight[endpoint] = in_flight.get(endpoint, 0) + 1
+
+    def request_finished(self, endpoint, method, status, elapsed):
+        shard = self._shard()
+        shard.in_flight[endpoint] = shard.in_flight.get(endpoint, 0) - 1
+        key = (endpoint, method, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        counts = shard.histograms.get(endpoint)
+        if counts is None:
+            counts = shard.histograms[endpoint] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, elapsed)] += 1
+        shard.durations[endpoint] = shard.durations.get(endpoint, 0.0) + elapsed
+
+    def collect(self):
+        """Totals over all shards."""
+        with self._lock:
+            shards = list(self._shards)
+        requests, histograms, durations, in_flight = {}, {}, {}, {}
+        for shard in shards:
+            # dict.copy() is atomic under the GIL, so a shard being written
+            # to by its thread is read consistently enough for a scrape
+            for key, count in shard.requests.copy().items():
+                requests[key] = requests.get(key, 0) + count
+            for endpoint, counts in shard.histograms.copy().items():
+                total = histograms.setdefault(endpoint, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+            for endpoint, seconds in shard.durations.copy().items():
+                durations[endpoint] = durations.get(endpoint, 0.0) + seconds
+            for endpoint, count in shard.in_flight.copy().items():
+                in_flight[endpoint] = in_flight.get(endpoint, 0) + count
+        return {'requests': requests, 'histograms': histograms, 'durations': durations, 'in_flight': in_flight}
+
+    def render(self):
+        """Request metrics as lines of the Prometheus text format."""
+        totals = self.collect()
+        lines = [
+            '# HELP http_requests_total Requests handled, by endpoint, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(totals['requests'].items()):
+            lines.append(_sample('http_requests_total', count,
+                                 (('endpoint', endpoint), ('method', method), ('status', status))))
+
+        lines += [
+            '# HELP http_request_duration_seconds Time to build the response, by endpoint.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for endpoint, counts in sorted(totals['histograms'].items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(_sample('http_request_duration_seconds_bucket', cumulative,
+                                     (('endpoint', endpoint), ('le', repr(bound)))))
+            count = sum(counts)
+            lines.append(_sample('http_request_duration_seconds_bucket', count, (('endpoint', endpoint), ('le', '+Inf'))))
+            lines.append(_sample('http_request_duration_seconds_sum', totals['durations'].get(endpoint, 0.0),
+                                 (('endpoint', endpoint),)))
+            lines.append(_sample('http_request_duration_seconds_count', count, (('endpoint', endpoint),)))
+
+        lines += [
+            '# HELP http_requests_in_flight Requests being handled, by endpoint.',
+            '# TYPE http_requests_in_flight gauge',
+        ]
+        for endpoint, count in sorted(totals['in_flight'].items()):
+            lines.append(_sample('http_requests_in_flight', count, (('endpoint', endpoint),)))
+        return lines
+
+
+def render_stats(prefix, stats, counters=()):
+    """A stats() dict as metrics named ``prefix_key``; keys in ``counters`` are counters, the rest gauges."""
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f'{prefix}_{key}_total' if key in counters else f'{prefix}_{key}'
+        lines.append(f"# TYPE {name} {'counter' if key in counters else 'gauge'}")
+        lines.append(_sample(name, value))
+    return lines
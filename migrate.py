@@ -0,0 +1,210 @@
+"""Versioned schema migrations.
+
+Each migration is a pair of scripts in migrations/: NNNN_name.up.sql and
+NNNN_name.down.sql. Applied versions are recorded in the schema_migrations
+table together with a checksum of the up script, so ``status`` can point
+out scripts edited after they ran.
+
+MySQL commits DDL implicitly, so a migration is not atomic: if a
+statement fails, fix the cause, undo what already ran by hand and run
+``up`` again.
+
+Usage:
+    python migrate.py status
+    python migrate.py up [VERSION]        apply pending migrations (up to VERSION)
+    python migrate.py down [VERSION]      roll back to VERSION (default: the previous one)
+    python migrate.py baseline VERSION    record VERSION and older as applied without running them
+    python migrate.py check               EXPLAIN the app's queries and fail on full scans
+"""
+import hashlib
+import os
+import re
+import sys
+
+import mysql.connector
+
+from config import db_config, load_config
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.(up|down)\.sql$')
+
+
+class Migration:
+    __slots__ = ('version', 'name', 'up_path', 'down_path')
+
+    def __init__(self, version, name):
+        self.version = version
+        self.name = name
+        self.up_path = None
+        self.down_path = None
+
+    def checksum(self):
+        with open(self.up_path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Migrations found in ``directory``, ordered by version."""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        migration = migrations.setdefault(version, Migration(version, name))
+        if migration.name != name:
+            raise ValueError(f'Migration {version} has scripts with different names')
+        setattr(migration, direction + '_path', os.path.join(directory, filename))
+
+    for migration in migrations.values():
+        if not migration.up_path or not migration.down_path:
+            raise ValueError(f'Migration {migration.version} needs both an up and a down script')
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(script):
+    # Statements end with ';' at the end of a line; '--' lines are comments
+    lines = [line for line in script.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in re.split(r';\s*$', '\n'.join(lines), flags=re.M)
+            if statement.strip()]
+
+
+def ensure_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def applied_versions(cursor):
+    cursor.execute('SELECT version, checksum FROM schema_migrations ORDER BY version')
+    return dict(cursor.fetchall())
+
+
+def run_script(cursor, path):
+    with open(path, encoding='utf-8') as f:
+        for statement in split_statements(f.read()):
+            cursor.execute(statement)
+
+
+def migrate_up(connection, migrations, target=None):
+    cursor = connection.cursor()
+    try:
+        ensure_table(cursor)
+        applied = applied_versions(cursor)
+        done = []
+        for migration in migrations:
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            print(f'Applying {migration.version:04d}_{migration.name}')
+            run_script(cursor, migration.up_path)
+            cursor.execute('INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)',
+                           (migration.version, migration.name, migration.checksum()))
+            connection.commit()
+            done.append(migration)
+        return done
+    finally:
+        cursor.close()
+
+
+def migrate_down(connection, migrations, target=None):
+    cursor = connection.cursor()
+    try:
+        ensure_table(cursor)
+        applied = applied_versions(cursor)
+        if target is None:
+            # Roll back the latest migration only
+            versions = sorted(applied)
+            target = versions[-2] if len(versions) > 1 else 0
+
+        done = []
+        for migration in reversed(migrations):
+            if migration.version not in applied or migration.version <= target:
+                continue
+            print(f'Reverting {migration.version:04d}_{migration.name}')
+            run_script(cursor, migration.down_path)
+            cursor.execute('DELETE FROM schema_migrations WHERE version = %s', (migration.version,))
+            connection.commit()
+            done.append(migration)
+        return done
+    finally:
+        cursor.close()
+
+
+def baseline(connection, migrations, target):
+    # For databases created from db.sql or upgraded by hand
+    cursor = connection.cursor()
+    try:
+        ensure_table(cursor)
+        applied = applied_versions(cursor)
+        for migration in migrations:
+            if migration.version <= target and migration.version not in applied:
+                cursor.execute('INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)',
+                               (migration.version, migration.name, migration.checksum()))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def status(connection, migrations):
+    cursor = connection.cursor()
+    try:
+        ensure_table(cursor)
+        applied = applied_versions(cursor)
+    finally:
+        cursor.close()
+
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is None:
+            state = 'pending'
+        elif checksum != migration.checksum():
+            state = 'applied (script changed since)'
+        else:
+            state = 'applied'
+        print(f'{migration.version:04d}_{migration.name}: {state}')
+    for version in sorted(set(applied) - {m.version for m in migrations}):
+        print(f'{version:04d}: applied, script missing')
+
+
+def connect():
+    return mysql.connector.connect(**db_config(load_config()))
+
+
+def main(argv):
+    command = argv[0] if argv else 'status'
+    argument = int(argv[1]) if len(argv) > 1 else None
+    if command not in ('status', 'up', 'down', 'baseline', 'check'):
+        print(__doc__)
+        return 2
+    if command == 'baseline' and argument is None:
+        print('baseline needs a version')
+        return 2
+
+    migrations = load_migrations()
+    connection = connect()
+    try:
+        if command == 'status':
+            status(connection, migrations)
+        elif command == 'up':
+            done = migrate_up(connection, migrations, argument)
+            print(f'{len(done)} migration(s) applied')
+        elif command == 'down':
+            done = migrate_down(connection, migrations, argument)
+            print(f'{len(done)} migration(s) reverted')
+        elif command == 'baseline':
+            baseline(connection, migrations, argument)
+        else:
+            from plan_check import check_plans
+            return 1 if check_plans(connection) else 0
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
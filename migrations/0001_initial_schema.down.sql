@@ -0,0 +1,5 @@
+DROP TABLE Ride_Request;
+DROP TABLE Ride_Participation;
+DROP TABLE rides;
+DROP TABLE vehicle;
+DROP TABLE users;
@@ -0,0 +1,62 @@
+-- Tables and indexes of the original db.sql
+CREATE TABLE users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    roll_number VARCHAR(20) NOT NULL UNIQUE,
+    college_name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE vehicle (
+    vehicle_id INT PRIMARY KEY AUTO_INCREMENT,
+    user_id INT,
+    vehicle_no VARCHAR(20) NOT NULL UNIQUE,
+    vehicle_model VARCHAR(50) NOT NULL,
+    seats_available INT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE rides (
+    ride_id INT AUTO_INCREMENT PRIMARY KEY,
+    driver_id INT NOT NULL,
+    vehicle_id INT NOT NULL,
+    source_location VARCHAR(100) NOT NULL,
+    destination_location VARCHAR(100) NOT NULL,
+    ride_date DATE NOT NULL,
+    ride_time TIME NOT NULL,
+    seats_offered INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status ENUM('active', 'completed', 'cancelled') DEFAULT 'active',
+    FOREIGN KEY (driver_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (vehicle_id) REFERENCES vehicle(vehicle_id) ON DELETE CASCADE
+);
+
+CREATE TABLE Ride_Participation (
+    participation_id INT AUTO_INCREMENT PRIMARY KEY,
+    ride_id INT NOT NULL,
+    student_id INT NOT NULL,
+    role ENUM('driver', 'passenger') NOT NULL,
+    status ENUM('confirmed', 'cancelled', 'completed', 'no-show') NOT NULL DEFAULT 'confirmed',
+    FOREIGN KEY (ride_id) REFERENCES rides(ride_id) ON DELETE CASCADE,
+    FOREIGN KEY (student_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE Ride_Request (
+    request_id INT AUTO_INCREMENT PRIMARY KEY,
+    passenger_id INT NOT NULL,
+    rider_source VARCHAR(100) NOT NULL,
+    rider_destination VARCHAR(100) NOT NULL,
+    preferred_date DATE NOT NULL,
+    preferred_time TIME NOT NULL,
+    status ENUM('matched', 'pending', 'rejected', 'cancelled') NOT NULL DEFAULT 'pending',
+    matched_ride_id INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    driver_accepted BOOLEAN DEFAULT FALSE,
+    FOREIGN KEY (passenger_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (matched_ride_id) REFERENCES rides(ride_id) ON DELETE SET NULL
+);
+
+CREATE INDEX idx_rides_source_dest ON rides(source_location, destination_location);
+CREATE INDEX idx_rides_date ON rides(ride_date);
+CREATE INDEX idx_ride_request_status ON Ride_Request(status);
@@ -0,0 +1,2 @@
+DROP INDEX idx_rides_date_time ON rides;
+DROP INDEX idx_rides_destination ON rides;
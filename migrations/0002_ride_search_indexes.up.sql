@@ -0,0 +1,4 @@
+-- Destination-only searches and the location index refresh (search_index.py)
+CREATE INDEX idx_rides_destination ON rides(destination_location);
+-- Keyset pagination walks rides in (ride_date, ride_time, ride_id) order
+CREATE INDEX idx_rides_date_time ON rides(ride_date, ride_time, ride_id);
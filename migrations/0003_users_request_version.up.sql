@@ -0,0 +1,2 @@
+-- Bumped whenever the pending requests on a user's rides change (ETag of /get_pending_requests)
+ALTER TABLE users ADD COLUMN request_version INT NOT NULL DEFAULT 0;
@@ -0,0 +1,8 @@
+-- The foreign key on ride_id needs an index once the unique key is gone
+ALTER TABLE Ride_Participation ADD INDEX ride_id (ride_id), DROP INDEX uq_participation_ride_student;
+
+ALTER TABLE rides DROP CHECK chk_rides_seats_remaining;
+
+UPDATE rides SET seats_offered = seats_remaining;
+
+ALTER TABLE rides DROP COLUMN seats_remaining;
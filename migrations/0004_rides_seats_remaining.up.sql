@@ -0,0 +1,14 @@
+-- Free seats, taken atomically when a passenger is accepted (seats.py).
+-- Older versions decremented seats_offered on every accept, so it holds
+-- the free seats and the original offer is restored.
+ALTER TABLE rides ADD COLUMN seats_remaining INT NOT NULL DEFAULT 0 AFTER seats_offered;
+
+UPDATE rides r SET r.seats_remaining = r.seats_offered,
+    r.seats_offered = r.seats_offered + (SELECT COUNT(*) FROM Ride_Participation rp
+                                         WHERE rp.ride_id = r.ride_id AND rp.role = 'passenger');
+
+ALTER TABLE rides ALTER COLUMN seats_remaining DROP DEFAULT,
+    ADD CONSTRAINT chk_rides_seats_remaining CHECK (seats_remaining >= 0 AND seats_remaining <= seats_offered);
+
+-- Fails if a student already appears twice on a ride; remove the duplicates first
+ALTER TABLE Ride_Participation ADD UNIQUE KEY uq_participation_ride_student (ride_id, student_id);
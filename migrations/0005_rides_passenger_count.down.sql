@@ -0,0 +1 @@
+ALTER TABLE rides DROP COLUMN passenger_count;
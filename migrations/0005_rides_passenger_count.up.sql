@@ -0,0 +1,5 @@
+-- Accepted passengers, kept in step with Ride_Participation (seats.py)
+ALTER TABLE rides ADD COLUMN passenger_count INT NOT NULL DEFAULT 0 AFTER seats_remaining;
+
+UPDATE rides r SET r.passenger_count = (SELECT COUNT(*) FROM Ride_Participation rp
+                                        WHERE rp.ride_id = r.ride_id AND rp.role = 'passenger');
@@ -0,0 +1,10 @@
+-- Indexes that back a foreign key are swapped for a single-column one in
+-- the same statement, so the constraint always has an index
+ALTER TABLE Ride_Participation ADD INDEX student_id (student_id), DROP INDEX idx_participation_student_role;
+DROP INDEX idx_participation_ride_role ON Ride_Participation;
+
+CREATE INDEX idx_ride_request_status ON Ride_Request(status);
+DROP INDEX idx_ride_request_open ON Ride_Request;
+ALTER TABLE Ride_Request ADD INDEX matched_ride_id (matched_ride_id), DROP INDEX idx_ride_request_matched_status;
+
+ALTER TABLE rides ADD INDEX driver_id (driver_id), DROP INDEX idx_rides_driver_date_time;
@@ -0,0 +1,17 @@
+-- Dashboard and profile: a driver's rides ordered by date and time
+CREATE INDEX idx_rides_driver_date_time ON rides(driver_id, ride_date, ride_time);
+
+-- Pending requests of a ride (dashboard, /get_pending_requests, matching, delete_ride)
+CREATE INDEX idx_ride_request_matched_status ON Ride_Request(matched_ride_id, status);
+
+-- Open requests for the matcher: pending, unmatched, by preferred date.
+-- Covers every lookup idx_ride_request_status served.
+CREATE INDEX idx_ride_request_open ON Ride_Request(status, matched_ride_id, preferred_date);
+DROP INDEX idx_ride_request_status ON Ride_Request;
+
+-- Passengers of a ride (seat reconciliation); (ride_id, student_id) is
+-- already covered by uq_participation_ride_student
+CREATE INDEX idx_participation_ride_role ON Ride_Participation(ride_id, role);
+
+-- Rides a student joined as a passenger (profile)
+CREATE INDEX idx_participation_student_role ON Ride_Participation(student_id, role);
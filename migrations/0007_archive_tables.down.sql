@@ -0,0 +1,5 @@
+-- Archived rows are lost; restore them into the hot tables first if needed
+DROP INDEX idx_ride_request_unmatched_date ON Ride_Request;
+DROP TABLE Ride_Participation_archive;
+DROP TABLE Ride_Request_archive;
+DROP TABLE rides_archive;
@@ -0,0 +1,49 @@
+-- Past rides with their requests and participations, moved out of the hot
+-- tables by archive.py. No foreign keys, so archiving never waits on them.
+CREATE TABLE rides_archive (
+    ride_id INT PRIMARY KEY,
+    driver_id INT NOT NULL,
+    vehicle_id INT NOT NULL,
+    source_location VARCHAR(100) NOT NULL,
+    destination_location VARCHAR(100) NOT NULL,
+    ride_date DATE NOT NULL,
+    ride_time TIME NOT NULL,
+    seats_offered INT NOT NULL,
+    seats_remaining INT NOT NULL,
+    passenger_count INT NOT NULL,
+    created_at TIMESTAMP NULL,
+    status ENUM('active', 'completed', 'cancelled'),
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_rides_archive_driver_date (driver_id, ride_date),
+    INDEX idx_rides_archive_date (ride_date)
+);
+
+CREATE TABLE Ride_Request_archive (
+    request_id INT PRIMARY KEY,
+    passenger_id INT NOT NULL,
+    rider_source VARCHAR(100) NOT NULL,
+    rider_destination VARCHAR(100) NOT NULL,
+    preferred_date DATE NOT NULL,
+    preferred_time TIME NOT NULL,
+    status ENUM('matched', 'pending', 'rejected', 'cancelled') NOT NULL,
+    matched_ride_id INT,
+    created_at TIMESTAMP NULL,
+    driver_accepted BOOLEAN,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_ride_request_archive_passenger (passenger_id),
+    INDEX idx_ride_request_archive_ride (matched_ride_id)
+);
+
+CREATE TABLE Ride_Participation_archive (
+    participation_id INT PRIMARY KEY,
+    ride_id INT NOT NULL,
+    student_id INT NOT NULL,
+    role ENUM('driver', 'passenger') NOT NULL,
+    status ENUM('confirmed', 'cancelled', 'completed', 'no-show') NOT NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_participation_archive_ride (ride_id),
+    INDEX idx_participation_archive_student (student_id, role)
+);
+
+-- Unmatched requests are archived by preferred date
+CREATE INDEX idx_ride_request_unmatched_date ON Ride_Request(matched_ride_id, preferred_date);
@@ -0,0 +1,6 @@
+DROP INDEX idx_rides_status_date_time ON rides;
+
+UPDATE Ride_Request_archive SET status = 'cancelled' WHERE status = 'expired';
+ALTER TABLE Ride_Request_archive MODIFY status ENUM('matched', 'pending', 'rejected', 'cancelled') NOT NULL;
+UPDATE Ride_Request SET status = 'cancelled' WHERE status = 'expired';
+ALTER TABLE Ride_Request MODIFY status ENUM('matched', 'pending', 'rejected', 'cancelled') NOT NULL DEFAULT 'pending';
@@ -0,0 +1,7 @@
+-- Pending requests whose ride or preferred time has passed are expired by lifecycle.py
+ALTER TABLE Ride_Request MODIFY status ENUM('matched', 'pending', 'rejected', 'cancelled', 'expired') NOT NULL DEFAULT 'pending';
+ALTER TABLE Ride_Request_archive MODIFY status ENUM('matched', 'pending', 'rejected', 'cancelled', 'expired') NOT NULL;
+
+-- Listings walk active rides in (ride_date, ride_time, ride_id) order; the
+-- lifecycle sweep finds active rides that have departed with the same index
+CREATE INDEX idx_rides_status_date_time ON rides(status, ride_date, ride_time, ride_id);
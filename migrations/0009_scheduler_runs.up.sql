@@ -0,0 +1,7 @@
+-- One row per shared background job: when a process last started it. The
+-- schedulers of all app processes claim a run here, so each job runs once per
+-- interval across the deployment, and worker restarts do not reset the wait.
+CREATE TABLE scheduler_runs (
+    job VARCHAR(100) PRIMARY KEY,
+    last_run DATETIME NOT NULL
+);
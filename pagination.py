@@ -0,0 +1,70 @@
+"""Keyset (cursor) pagination over rides ordered by date, time and id.
+
+A cursor is the (ride_date, ride_time, ride_id) of the last row on a page,
+so fetching the next page is an index range scan that costs the same no
+matter how deep into the list it is.
+"""
+import base64
+from datetime import date, timedelta
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Rows strictly after the cursor in (ride_date, ride_time, ride_id) order.
+# Spelled out instead of a row constructor so MySQL can use a range scan.
+KEYSET_CONDITION = '''
+    (r.ride_date > %s
+     OR (r.ride_date = %s AND (r.ride_time > %s
+                               OR (r.ride_time = %s AND r.ride_id > %s))))
+'''
+KEYSET_ORDER = ' ORDER BY r.ride_date, r.ride_time, r.ride_id'
+
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def _format_time(value):
+    # mysql.connector returns TIME columns as timedelta
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+    return str(value)
+
+
+def encode_cursor(ride):
+    # ride is a repository record
+    raw = f"{ride.ride_date}|{_format_time(ride.ride_time)}|{ride.ride_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (ride_date, ride_time, ride_id), or None for a missing or bad cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        ride_date, ride_time, ride_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        hours, minutes, seconds = (int(part) for part in ride_time.split(':'))
+        return (date.fromisoformat(ride_date),
+                timedelta(hours=hours, minutes=minutes, seconds=seconds),
+                int(ride_id))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_params(position):
+    ride_date, ride_time, ride_id = position
+    return [ride_date, ride_date, ride_time, ride_time, ride_id]
+
+
+def split_page(rows, size):
+    """Trim the extra look-ahead row and return (rows, next_cursor)."""
+    if len(rows) > size:
+        rows = rows[:size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,143 @@
+"""bcrypt hashing on a bounded worker pool.
+
+Hashing costs hundreds of milliseconds of CPU, so it runs on a fixed
+number of worker threads (bcrypt releases the GIL while it works) instead
+of on every request thread at once. When the workers and the wait queue
+are full, callers get ``HasherBusy`` immediately rather than piling up.
+
+The bcrypt cost factor can be fixed or calibrated at startup so one hash
+takes about a target time on the machine the app runs on. Hashes stored
+with a lower cost are reported by ``needs_rehash``.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+# Measured cost; each extra round doubles the hashing time
+_PROBE_ROUNDS = 8
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+def calibrate_rounds(target=0.1, samples=3):
+    """Pick the bcrypt cost whose hash time is closest to ``target`` seconds."""
+    salt = bcrypt.gensalt(rounds=_PROBE_ROUNDS)
+    elapsed = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        elapsed.append(time.perf_counter() - started)
+    probe = min(elapsed)
+
+    best = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        estimate = probe * 2 ** (rounds - _PROBE_ROUNDS)
+        if abs(estimate - target) < abs(probe * 2 ** (best - _PROBE_ROUNDS) - target):
+            best = rounds
+    return best
+
+
+def hash_rounds(password_hash):
+    # '$2b$12$...' -> 12
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, max_queue=32, timeout=10.0, rounds=None, target_time=0.1):
+        self.rounds = rounds or calibrate_rounds(target_time)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        # One slot per running or queued job
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            'jobs': 0,
+            'rejected': 0,
+            'hash_time': 0.0,
+            'max_hash_time': 0.0,
+            'queue_wait': 0.0,
+            'max_queue_wait': 0.0,
+            'pending': 0,
+            'timeouts': 0,
+        }
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy('Too many password checks in progress, try again shortly')
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._stats['pending'] += 1
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                finished = time.perf_counter()
+                self._record(started - submitted, finished - started)
+
+        try:
+            future = self._executor.submit(job)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Same answer as a full queue; the job still finishes and frees its slot
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HasherBusy('Password check timed out, try again shortly') from None
+
+    def _release(self):
+        with self._lock:
+            self._stats['pending'] -= 1
+        self._slots.release()
+
+    def _record(self, waited, elapsed):
+        with self._lock:
+            stats = self._stats
+            stats['jobs'] += 1
+            stats['queue_wait'] += waited
+            stats['hash_time'] += elapsed
+            stats['max_queue_wait'] = max(stats['max_queue_wait'], waited)
+            stats['max_hash_time'] = max(stats['max_hash_time'], elapsed)
+
+    def hash(self, password):
+        hashed = self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds))
+        return hashed.decode('utf-8')
+
+    def check(self, password, password_hash):
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        # Only upgrades: a machine that calibrates lower never weakens stored hashes
+        rounds = hash_rounds(password_hash)
+        return rounds is None or rounds < self.rounds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        jobs = stats['jobs'] or 1
+        stats['avg_hash_time'] = stats['hash_time'] / jobs
+        stats['avg_queue_wait'] = stats['queue_wait'] / jobs
+        stats['rounds'] = self.rounds
+        stats['workers'] = self.workers
+        stats['max_queue'] = self.max_queue
+        return stats
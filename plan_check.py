@@ -0,0 +1,107 @@
+"""EXPLAIN every query the app runs and flag full table scans.
+
+``QUERIES`` mirrors the statements in app.py and the modules it runs queries from
+with representative parameters. Run it against a database with realistic
+data: on nearly empty tables MySQL may prefer a scan even when a usable
+index exists.
+
+    python migrate.py check
+"""
+from datetime import date
+
+from lifecycle import DEPARTED, REQUEST_PASSED
+from matching import OPEN_RIDES_QUERY
+from repository import (DRIVER_REQUESTS_QUERY, DRIVER_RIDES_QUERY, JOINED_RIDES_QUERY, OFFERED_RIDES_QUERY,
+                        PENDING_REQUESTS_QUERY, REQUEST_VERSION_QUERY, UPCOMING_RIDES_AFTER_QUERY,
+                        UPCOMING_RIDES_QUERY, VEHICLES_QUERY, search_query)
+from seats import RESERVE_SEAT_QUERY
+
+_TODAY = date.today()
+_KEYSET = (_TODAY, _TODAY, '08:00:00', '08:00:00', 1)
+
+# (name, statement, params)
+QUERIES = [
+    ('login', 'SELECT * FROM users WHERE email = %s', ('student@example.com',)),
+    ('register', 'SELECT * FROM users WHERE email = %s OR roll_number = %s', ('student@example.com', 'R001')),
+    ('dashboard rides', DRIVER_RIDES_QUERY, (1,)),
+    ('vehicles', VEHICLES_QUERY, (1,)),
+    ('dashboard requests', DRIVER_REQUESTS_QUERY, (1,)),
+    ('rides first page', UPCOMING_RIDES_QUERY, (21,)),
+    ('rides next page', UPCOMING_RIDES_AFTER_QUERY, _KEYSET + (21,)),
+    ('join ride', '''
+        SELECT r.*, u.email as driver_email
+        FROM rides r
+        JOIN users u ON r.driver_id = u.id
+        WHERE r.ride_id = %s
+    ''', (1,)),
+    ('already joined', 'SELECT * FROM Ride_Participation WHERE ride_id = %s AND student_id = %s', (1, 1)),
+    ('handle request', "UPDATE Ride_Request SET status = %s WHERE request_id = %s AND matched_ride_id = %s"
+     " AND status = 'pending'", ('matched', 1, 1)),
+    ('reject others', "UPDATE Ride_Request SET status = 'rejected' WHERE passenger_id = %s"
+     " AND matched_ride_id = %s AND request_id != %s AND status = 'pending'", (1, 1, 1)),
+    ('reserve seat', RESERVE_SEAT_QUERY, (1,)),
+    ('profile driver rides', OFFERED_RIDES_QUERY, (1,)),
+    ('profile passenger rides', JOINED_RIDES_QUERY, (1,)),
+    ('search by source and destination', search_query(2, 1, False, False), ('Library', 'Main Gate', 'Hostel', 21)),
+    ('search by destination and date', search_query(0, 1, True, False), ('Hostel', _TODAY, 21)),
+    ('request version', REQUEST_VERSION_QUERY, (1,)),
+    ('pending requests', PENDING_REQUESTS_QUERY, (1,)),
+    ('location names', '''
+        SELECT source_location FROM rides GROUP BY source_location
+        UNION
+        SELECT destination_location FROM rides GROUP BY destination_location
+    ''', ()),
+    ('open requests', '''
+        SELECT request_id, passenger_id, rider_source, rider_destination, preferred_date, preferred_time
+        FROM Ride_Request
+        WHERE status = 'pending' AND matched_ride_id IS NULL AND preferred_date >= CURDATE()
+    ''', ()),
+    ('open rides', OPEN_RIDES_QUERY + ' AND r.ride_date = %s GROUP BY r.ride_id', (_TODAY,)),
+    ('delete ride requests', 'DELETE FROM Ride_Request WHERE matched_ride_id = %s', (1,)),
+    ('delete ride participations', 'DELETE FROM Ride_Participation WHERE ride_id = %s', (1,)),
+    ('archive rides', 'SELECT ride_id FROM rides WHERE ride_date < %s ORDER BY ride_date LIMIT %s', (_TODAY, 500)),
+    ('archive unmatched requests', 'SELECT request_id FROM Ride_Request WHERE matched_ride_id IS NULL'
+     ' AND preferred_date < %s LIMIT %s', (_TODAY, 500)),
+    ('departed rides', f"SELECT ride_id, driver_id FROM rides WHERE status = 'active' AND {DEPARTED}"
+     ' ORDER BY ride_date, ride_time, ride_id LIMIT %s', (500,)),
+    ('passed requests', "SELECT request_id FROM Ride_Request WHERE status = 'pending' AND matched_ride_id IS NULL"
+     f' AND {REQUEST_PASSED} LIMIT %s', (500,)),
+    ('reconcile passengers', '''
+        SELECT ride_id, COUNT(*) AS passengers
+        FROM Ride_Participation
+        WHERE role = 'passenger' AND ride_id BETWEEN %s AND %s
+        GROUP BY ride_id
+    ''', (1, 1000)),
+    ('reconcile lock', 'SELECT ride_id FROM rides WHERE ride_id BETWEEN %s AND %s FOR UPDATE', (1, 1000)),
+]
+
+
+def full_scans(connection, sql, params):
+    """Tables ``sql`` reads with a full table scan, according to EXPLAIN."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute('EXPLAIN ' + sql, params)
+        plan = cursor.fetchall()
+    finally:
+        cursor.close()
+    # <derived2>, <union1,2> and the like are temporary results, not tables
+    return [row['table'] for row in plan
+            if row.get('type') == 'ALL' and row.get('table') and not row['table'].startswith('<')]
+
+
+def check_plans(connection, queries=QUERIES):
+    """Print each query's verdict; returns the names of queries that scan."""
+    failed = []
+    for name, sql, params in queries:
+        try:
+            tables = full_scans(connection, sql, params)
+        except Exception as e:
+            print(f'ERROR {name}: {e}')
+            failed.append(name)
+            continue
+        if tables:
+            print(f'SCAN  {name}: full scan of {", ".join(tables)}')
+            failed.append(name)
+        else:
+            print(f'ok    {name}')
+    return failed
@@ -0,0 +1,250 @@
+"""Per-request query profiling and slow-query log.
+
+Connections handed to request handlers are wrapped so every cursor
+records how long its statements take and how many rows they return. At
+the end of a request the numbers are folded into per-endpoint and
+per-statement aggregates. Statements slower than the threshold are logged
+together with their EXPLAIN plan, at most once per statement per
+``explain_interval`` seconds.
+
+The bookkeeping is a couple of ``perf_counter`` calls per statement and
+one lock acquisition per request, so it can stay on in production.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger('slow_queries')
+
+_current = contextvars.ContextVar('query_profile', default=None)
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'%s(\s*,\s*%s)+')
+
+
+def normalize_statement(sql):
+    # Collapse whitespace and variable-length IN lists so one query shape
+    # maps to one aggregate
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    return _PLACEHOLDER_LIST.sub('%s, ...', sql)
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'db_time', 'rows', 'slowest_time', 'slowest_statement', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.statements = []  # (statement, elapsed, rows)
+
+
+class ProfiledCursor:
+    def __init__(self, cursor, connection, profiler, owned=True):
+        self._cursor = cursor
+        self._connection = connection
+        self._profiler = profiler
+        self._owned = owned     # False for cursors that outlive this wrapper
+        self._statement = None
+        self._elapsed = 0.0
+        self._rows = 0
+        self._slow = []  # (sql, params, elapsed) waiting for EXPLAIN
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def _finish_statement(self):
+        if self._statement is not None:
+            self._profiler.record(self._statement, self._elapsed, self._rows)
+            self._statement = None
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._finish_statement()
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._elapsed = time.perf_counter() - started
+            self._statement = operation
+            self._rows = max(self._cursor.rowcount, 0)
+            if self._elapsed >= self._profiler.slow_threshold:
+                self._slow.append((operation, params, self._elapsed))
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        self._elapsed += time.perf_counter() - started
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(self._cursor.fetchone)
+        if row is not None:
+            self._rows = max(self._rows, self._cursor.rowcount, 1)
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._timed_fetch(self._cursor.fetchmany, size)
+        self._rows = max(self._rows, self._cursor.rowcount)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(self._cursor.fetchall)
+        self._rows = max(self._rows, len(rows))
+        return rows
+
+    def close(self):
+        self._finish_statement()
+        try:
+            if self._owned:
+                return self._cursor.close()
+        finally:
+            # Results are consumed by now, so the connection is free for EXPLAIN
+            for sql, params, elapsed in self._slow:
+                self._profiler.log_slow(self._connection, sql, params, elapsed)
+            self._slow = []
+
+
+class ProfiledConnection:
+    def __init__(self, connection, profiler):
+        self._connection = connection
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return ProfiledCursor(self._connection.cursor(*args, **kwargs), self._connection, self._profiler)
+
+    @property
+    def unwrapped(self):
+        return self._connection
+
+    def profile(self, cursor):
+        # Times a cursor opened on the unwrapped connection, such as a prepared
+        # statement kept across requests; closing the wrapper leaves it open
+        return ProfiledCursor(cursor, self._connection, self._profiler, owned=False)
+
+
+class QueryProfiler:
+    def __init__(self, slow_threshold=0.2, explain_interval=300, max_statements=500):
+        self.slow_threshold = slow_threshold
+        self.explain_interval = explain_interval
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._statements = {}
+        self._explained = {}  # statement -> last EXPLAIN time
+
+    def wrap(self, connection):
+        return ProfiledConnection(connection, self)
+
+    def start_request(self):
+        return _current.set(RequestProfile())
+
+    def current(self):
+        return _current.get()
+
+    def record(self, statement, elapsed, rows):
+        profile = _current.get()
+        if profile is None:
+            return
+        profile.queries += 1
+        profile.db_time += elapsed
+        profile.rows += rows
+        if elapsed >= profile.slowest_time:
+            profile.slowest_time = elapsed
+            profile.slowest_statement = statement
+        profile.statements.append((statement, elapsed, rows))
+
+    def merge(self, profile):
+        """Adds a profile recorded on another thread for the current request."""
+        current = _current.get()
+        if current is None or profile is None:
+            return
+        current.queries += profile.queries
+        current.db_time += profile.db_time
+        current.rows += profile.rows
+        if profile.queries and profile.slowest_time >= current.slowest_time:
+            current.slowest_time = profile.slowest_time
+            current.slowest_statement = profile.slowest_statement
+        current.statements.extend(profile.statements)
+
+    def end_request(self, token, endpoint, elapsed):
+        profile = _current.get()
+        _current.reset(token)
+        if profile is None:
+            return None
+
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'db_time': 0.0, 'rows': 0,
+                    'request_time': 0.0, 'max_db_time': 0.0, 'slowest_statement': None,
+                    'slowest_time': 0.0,
+                }
+            stats['requests'] += 1
+            stats['queries'] += profile.queries
+            stats['db_time'] += profile.db_time
+            stats['rows'] += profile.rows
+            stats['request_time'] += elapsed
+            stats['max_db_time'] = max(stats['max_db_time'], profile.db_time)
+            if profile.slowest_time > stats['slowest_time']:
+                stats['slowest_time'] = profile.slowest_time
+                stats['slowest_statement'] = normalize_statement(profile.slowest_statement)
+
+            for statement, took, rows in profile.statements:
+                key = normalize_statement(statement)
+                stats = self._statements.get(key)
+                if stats is None:
+                    if len(self._statements) >= self.max_statements:
+                        continue
+                    stats = self._statements[key] = {'count': 0, 'total_time': 0.0, 'max_time': 0.0, 'rows': 0}
+                stats['count'] += 1
+                stats['total_time'] += took
+                stats['max_time'] = max(stats['max_time'], took)
+                stats['rows'] += rows
+        return profile
+
+    def log_slow(self, connection, sql, params, elapsed):
+        key = normalize_statement(sql)
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained.get(key)
+            explain = last is None or now - last > self.explain_interval
+            if explain:
+                self._explained[key] = now
+
+        plan = None
+        if explain:
+            cursor = None
+            try:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute('EXPLAIN ' + sql, params)
+                plan = cursor.fetchall()
+            except Exception as e:
+                plan = f'EXPLAIN failed: {e}'
+            finally:
+                if cursor is not None:
+                    cursor.close()
+        logger.warning('Slow query (%.1f ms): %s params=%r plan=%r', elapsed * 1000, key, params, plan)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: dict(stats) for name, stats in self._endpoints.items()}
+            statements = {sql: dict(stats) for sql, stats in self._statements.items()}
+        for stats in endpoints.values():
+            stats['avg_queries'] = stats['queries'] / stats['requests']
+            stats['avg_db_time'] = stats['db_time'] / stats['requests']
+        slowest = sorted(statements.items(), key=lambda item: item[1]['total_time'], reverse=True)
+        return {
+            'slow_threshold': self.slow_threshold,
+            'endpoints': endpoints,
+            'statements': [dict(stats, statement=sql) for sql, stats in slowest],
+        }
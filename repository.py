@@ -0,0 +1,346 @@
+"""Read queries shared by the request handlers, as prepared statements.
+
+The ride listing join and the vehicle lookup used to be spelled out in
+several handlers. Here each query is written once and run through a
+prepared cursor that is kept open for as long as its pooled connection
+lives. After the first use on a connection, MySQL skips parsing and
+planning the statement, and only the statement id and parameters are sent.
+The SQLite backend caches compiled statements per connection by itself,
+so there the same code runs on plain cursors.
+
+Rows come back as namedtuple records instead of dicts. Templates read
+them the same way (``ride.ride_date``), but each row costs one tuple
+instead of a dict with a copy of every column name.
+
+``PageLoader`` runs the independent queries of one page at the same time,
+on spare pooled connections.
+"""
+import contextvars
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from pagination import KEYSET_CONDITION, KEYSET_ORDER, keyset_params
+
+# Prepared statements kept per connection; the least recently used one is
+# closed first. Search adds a statement for every shape of its IN (...)
+# lists, so it is bounded.
+MAX_STATEMENTS = 32
+
+RIDE_LISTING = '''
+    SELECT r.*, u.email as driver_email, v.vehicle_model, v.vehicle_no
+    FROM rides r
+    JOIN users u ON r.driver_id = u.id
+    JOIN vehicle v ON r.vehicle_id = v.vehicle_id
+'''
+
+USER_QUERY = 'SELECT * FROM users WHERE id = %s'
+VEHICLES_QUERY = 'SELECT * FROM vehicle WHERE user_id = %s'
+DRIVER_RIDES_QUERY = RIDE_LISTING + ' WHERE r.driver_id = %s ORDER BY r.ride_date DESC, r.ride_time DESC'
+DRIVER_REQUESTS_QUERY = '''
+    SELECT rr.*, u.email as passenger_email, r.source_location, r.destination_location,
+           r.ride_date, r.ride_time, v.vehicle_model, v.vehicle_no
+    FROM Ride_Request rr
+    JOIN rides r ON rr.matched_ride_id = r.ride_id
+    JOIN users u ON rr.passenger_id = u.id
+    JOIN vehicle v ON r.vehicle_id = v.vehicle_id
+    WHERE r.driver_id = %s AND rr.status = 'pending'
+    ORDER BY rr.created_at DESC
+'''
+OFFERED_RIDES_QUERY = 'SELECT r.*, r.passenger_count as passengers FROM rides r WHERE r.driver_id = %s'
+JOINED_RIDES_QUERY = '''
+    SELECT r.*, u.email as driver_email
+    FROM rides r
+    JOIN Ride_Participation rp ON r.ride_id = rp.ride_id
+    JOIN users u ON r.driver_id = u.id
+    WHERE rp.student_id = %s AND rp.role = 'passenger'
+'''
+# Run on plain cursors by /get_pending_requests, and by its async version in asgi.py
+REQUEST_VERSION_QUERY = 'SELECT request_version FROM users WHERE id = %s'
+PENDING_REQUESTS_QUERY = '''
+    SELECT rr.*, u.email as passenger_email
+    FROM Ride_Request rr
+    JOIN rides r ON rr.matched_ride_id = r.ride_id
+    JOIN users u ON rr.passenger_id = u.id
+    WHERE r.driver_id = %s
+    AND rr.status = 'pending'
+    ORDER BY rr.created_at DESC
+'''
+UPCOMING_RIDES_QUERY = RIDE_LISTING + " WHERE r.status = 'active'" + KEYSET_ORDER + ' LIMIT %s'
+UPCOMING_RIDES_AFTER_QUERY = (RIDE_LISTING + " WHERE r.status = 'active' AND " + KEYSET_CONDITION
+                              + KEYSET_ORDER + ' LIMIT %s')
+
+
+@lru_cache(maxsize=None)
+def record_type(name, columns):
+    """The namedtuple class for rows of ``columns``, shared by every query with that shape."""
+    return namedtuple(name, columns, rename=True)
+
+
+class PreparedStatements:
+    """The prepared cursors of one connection, one per statement."""
+
+    def __init__(self, connection, max_statements=MAX_STATEMENTS):
+        self._connection = connection
+        self.max_statements = max_statements
+        self._cursors = OrderedDict()   # sql -> (sql, cursor)
+
+    def get(self, sql):
+        """Returns (sql, cursor) for ``sql``, preparing it on first use.
+
+        Execute the returned string rather than ``sql``: mysql.connector
+        only reuses a prepared statement for the identical string object.
+        """
+        entry = self._cursors.get(sql)
+        if entry is not None:
+            self._cursors.move_to_end(sql)
+            return entry
+        entry = self._cursors[sql] = (sql, self._connection.cursor(prepared=True))
+        if len(self._cursors) > self.max_statements:
+            _, (_, cursor) = self._cursors.popitem(last=False)
+            self._close(cursor)
+        return entry
+
+    def discard(self, sql):
+        entry = self._cursors.pop(sql, None)
+        if entry is not None:
+            self._close(entry[1])
+
+    def __len__(self):
+        return len(self._cursors)
+
+    def _close(self, cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+def prepared_statements(connection):
+    """The statement cache of a pooled connection, created on first use.
+
+    It is kept on the connection itself, so it lives exactly as long as
+    the connection and goes away when the pool discards it.
+    """
+    # Handlers get connections wrapped by profiler.ProfiledConnection
+    raw = getattr(connection, 'unwrapped', connection)
+    statements = getattr(raw, 'prepared_statements', None)
+    if statements is None:
+        statements = raw.prepared_statements = PreparedStatements(raw)
+    return statements
+
+
+def fetch_all(connection, record, sql, params=()):
+    """Run ``sql`` as a prepared statement and return its rows as ``record`` tuples."""
+    statements = prepared_statements(connection)
+    sql, cursor = statements.get(sql)
+    # The cursor stays open for the next request; only the wrapper is closed
+    profile = getattr(connection, 'profile', None)
+    timed = profile(cursor) if profile else cursor
+    try:
+        timed.execute(sql, params)
+        rows = timed.fetchall()
+        columns = tuple(timed.column_names)
+    except Exception:
+        # A failed statement may leave the cursor with unread results
+        statements.discard(sql)
+        raise
+    finally:
+        if timed is not cursor:
+            timed.close()
+    make = record_type(record, columns)._make
+    return [make(row) for row in rows]
+
+
+def fetch_one(connection, record, sql, params=()):
+    rows = fetch_all(connection, record, sql, params)
+    return rows[0] if rows else None
+
+
+def find_user(connection, user_id):
+    return fetch_one(connection, 'User', USER_QUERY, (user_id,))
+
+
+def list_vehicles(connection, user_id):
+    return fetch_all(connection, 'Vehicle', VEHICLES_QUERY, (user_id,))
+
+
+def list_driver_rides(connection, driver_id):
+    """The driver's rides with vehicle details, latest first."""
+    return fetch_all(connection, 'Ride', DRIVER_RIDES_QUERY, (driver_id,))
+
+
+def list_driver_requests(connection, driver_id):
+    """Pending join requests for the driver's rides, newest first."""
+    return fetch_all(connection, 'RideRequest', DRIVER_REQUESTS_QUERY, (driver_id,))
+
+
+def list_offered_rides(connection, driver_id):
+    return fetch_all(connection, 'Ride', OFFERED_RIDES_QUERY, (driver_id,))
+
+
+def list_joined_rides(connection, passenger_id):
+    return fetch_all(connection, 'Ride', JOINED_RIDES_QUERY, (passenger_id,))
+
+
+def list_upcoming_rides(connection, position, limit):
+    """Active rides in keyset order, after ``position`` when it is given."""
+    if position:
+        return fetch_all(connection, 'Ride', UPCOMING_RIDES_AFTER_QUERY, tuple(keyset_params(position)) + (limit,))
+    return fetch_all(connection, 'Ride', UPCOMING_RIDES_QUERY, (limit,))
+
+
+# search_query() filter for a term the location index does not know yet
+LIKE = 'like'
+
+
+def _location_filter(column, names):
+    if names == LIKE:
+        return f" AND {column} LIKE %s ESCAPE '!'"
+    return f' AND {column} IN (%s)' % ', '.join(['%s'] * names)
+
+
+def _like_pattern(term):
+    return '%' + term.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+
+
+@lru_cache(maxsize=256)
+def search_query(sources, destinations, by_date, after):
+    """The search statement for a number of source and destination names, or LIKE."""
+    query = RIDE_LISTING + " WHERE r.status = 'active'"
+    if sources:
+        query += _location_filter('r.source_location', sources)
+    if destinations:
+        query += _location_filter('r.destination_location', destinations)
+    if by_date:
+        query += ' AND r.ride_date = %s'
+    if after:
+        query += ' AND ' + KEYSET_CONDITION
+    return query + KEYSET_ORDER + ' LIMIT %s'
+
+
+def _filter_shape(names):
+    return LIKE if isinstance(names, str) else len(names or ())
+
+
+def _filter_params(names):
+    return [_like_pattern(names)] if isinstance(names, str) else list(names or ())
+
+
+def search_rides(connection, source_names, destination_names, ride_date, position, limit):
+    """Active rides from and to any of the given names, in keyset order.
+
+    An empty or None list of names does not filter on that column. A
+    string instead of a list is a search term matched with LIKE.
+    """
+    sql = search_query(_filter_shape(source_names), _filter_shape(destination_names), bool(ride_date), bool(position))
+    params = _filter_params(source_names) + _filter_params(destination_names)
+    if ride_date:
+        params.append(ride_date)
+    if position:
+        params.extend(keyset_params(position))
+    params.append(limit)
+    return fetch_all(connection, 'Ride', sql, tuple(params))
+
+
+class PageLoader:
+    """Runs the independent queries of one page at the same time.
+
+    The first query runs on the request's connection. Each of the others
+    runs on a worker thread with a connection of its own, if a worker and
+    a pooled connection are free right away; otherwise it runs on the
+    request's connection after the first. A page then waits about as long
+    as its slowest query instead of the sum of all of them. It never waits
+    for the pool, and it never takes more connections than are idle.
+    """
+
+    def __init__(self, pool, profiler=None, workers=4):
+        self.pool = pool
+        self.profiler = profiler
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='page-loader') if workers > 0 else None
+        self._slots = threading.BoundedSemaphore(max(workers, 1))
+        self._lock = threading.Lock()
+        self._stats = {'pages': 0, 'parallel': 0, 'inline': 0}
+
+    def load(self, connection, **queries):
+        """Runs ``name=(function, *args)`` queries; returns {name: result}.
+
+        Each function is called as ``function(connection, *args)``, like the
+        ones above.
+        """
+        items = list(queries.items())
+        inline = items[:1]
+        futures = []
+        for name, query in items[1:]:
+            future = self._submit(query)
+            if future is None:
+                inline.append((name, query))
+            else:
+                futures.append((name, future))
+
+        with self._lock:
+            self._stats['pages'] += 1
+            self._stats['parallel'] += len(futures)
+            self._stats['inline'] += len(inline)
+
+        results = {}
+        error = None
+        try:
+            for name, (function, *args) in inline:
+                results[name] = function(connection, *args)
+        finally:
+            # Wait for the workers even if a query here failed, so none is
+            # still running when the request ends
+            for name, future in futures:
+                try:
+                    results[name], profile = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if self.profiler is not None:
+                    self.profiler.merge(profile)
+        if error is not None:
+            raise error
+        return results
+
+    def _submit(self, query):
+        if self._executor is None or not self._slots.acquire(blocking=False):
+            return None
+        try:
+            connection = self.pool.acquire(wait=False)
+        except Exception as e:
+            # The query still runs, on the request's connection
+            print(f"Error borrowing a connection for a page query: {e}")
+            connection = None
+        if connection is None:
+            self._slots.release()
+            return None
+        # The request's context goes along, so the query profiler sees the worker's statements
+        try:
+            return self._executor.submit(contextvars.copy_context().run, self._run, connection, query)
+        except Exception as e:
+            # e.g. the executor was shut down while the worker exits
+            print(f"Error starting a page query: {e}")
+            self.pool.release(connection)
+            self._slots.release()
+            return None
+
+    def _run(self, connection, query):
+        function, *args = query
+        try:
+            if self.profiler is None:
+                return function(connection, *args), None
+            # A profile of its own, merged into the request's by load()
+            self.profiler.start_request()
+            return function(self.profiler.wrap(connection), *args), self.profiler.current()
+        finally:
+            self.pool.release(connection)
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['workers'] = self.workers
+        return stats
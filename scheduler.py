@@ -0,0 +1,170 @@
+"""Minimal interval scheduler running jobs on one background thread.
+
+Each worker process runs its own scheduler. Jobs that act on the shared
+database (lifecycle sweep, archival) are added with ``shared=True``: when
+one is due, the process first claims the run in the scheduler_runs table
+(``claim_run``), so it runs once per interval across all processes. The
+last run is kept in the database, so recycled workers do not start the
+wait over. Other jobs, like reloading an in-process index, run in every
+process. The thread is started lazily by the first request so that it is
+created after a preforking server has forked.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from mysql.connector import IntegrityError
+
+logger = logging.getLogger('scheduler')
+
+
+def claim_run(connection, job, interval):
+    """Record a run of ``job`` now, unless one started within ``interval`` seconds.
+
+    Returns True when the caller should run the job.
+    """
+    now = datetime.now().replace(microsecond=0)
+    cursor = connection.cursor()
+    try:
+        cursor.execute('UPDATE scheduler_runs SET last_run = %s WHERE job = %s AND last_run <= %s',
+                       (now, job, now - timedelta(seconds=interval)))
+        claimed = cursor.rowcount == 1
+        if not claimed:
+            try:
+                # First run ever; a duplicate key means the job ran recently
+                cursor.execute('INSERT INTO scheduler_runs (job, last_run) VALUES (%s, %s)', (job, now))
+                claimed = True
+            except IntegrityError:
+                pass
+        connection.commit()
+        return claimed
+    finally:
+        cursor.close()
+
+
+class Job:
+    __slots__ = ('name', 'interval', 'func', 'shared', 'next_run', 'runs', 'skipped', 'failures',
+                 'last_run', 'last_duration', 'last_result', 'last_error')
+
+    def __init__(self, name, interval, func, initial_delay, shared):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.shared = shared
+        self.next_run = time.monotonic() + initial_delay
+        self.runs = 0
+        self.skipped = 0        # shared runs another process had claimed
+        self.failures = 0
+        self.last_run = None
+        self.last_duration = None
+        self.last_result = None
+        self.last_error = None
+
+
+class Scheduler:
+    def __init__(self, tick=1.0, claim=None, claim_poll=60.0):
+        self.tick = tick
+        # claim(name, interval) -> bool decides whether this process runs a
+        # shared job now; shared jobs are checked every claim_poll seconds
+        self.claim = claim
+        self.claim_poll = claim_poll
+        self._jobs = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, interval, func, initial_delay=None, shared=False):
+        """Run ``func()`` every ``interval`` seconds, first after ``initial_delay``.
+
+        A ``shared`` job runs in only one process per interval (see ``claim``).
+        """
+        job = Job(name, interval, func, interval if initial_delay is None else initial_delay, shared)
+        with self._lock:
+            self._jobs.append(job)
+        return job
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.tick)
+
+    def run_pending(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [job for job in self._jobs if job.next_run <= now]
+        for job in due:
+            self._run_job(job)
+
+    def _interval(self, job):
+        if job.shared and self.claim is not None:
+            return min(job.interval, self.claim_poll)
+        return job.interval
+
+    def _claimed(self, job):
+        if not job.shared or self.claim is None:
+            return True
+        try:
+            return self.claim(job.name, job.interval)
+        except Exception:
+            logger.exception('Could not claim a run of %s', job.name)
+            return False
+
+    def _run_job(self, job):
+        if not self._claimed(job):
+            job.skipped += 1
+            job.next_run = time.monotonic() + self._interval(job)
+            return
+        started = time.monotonic()
+        try:
+            job.last_result = job.func()
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.exception('Scheduled job %s failed', job.name)
+        finally:
+            finished = time.monotonic()
+            job.runs += 1
+            job.last_run = time.time()
+            job.last_duration = finished - started
+            # Measured from the end of the run, so a slow job never overlaps itself
+            job.next_run = finished + self._interval(job)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs)
+        return {
+            'running': self.running,
+            'jobs': {job.name: {
+                'interval': job.interval,
+                'shared': job.shared,
+                'runs': job.runs,
+                'skipped': job.skipped,
+                'failures': job.failures,
+                'last_run': job.last_run,
+                'last_duration': job.last_duration,
+                'last_result': job.last_result,
+                'last_error': job.last_error,
+            } for job in jobs},
+        }
@@ -0,0 +1,129 @@
+"""In-process trigram index over the distinct ride locations.
+
+A campus has a few hundred distinct pickup/drop-off names but far more
+rides, so the index only holds the location vocabulary. A search term is
+resolved to the exact stored names it matches (substring or fuzzy), and the
+database then filters rides with ``IN (...)``, which can use the location
+indexes instead of scanning for ``LIKE '%term%'``.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+_NUMBER = re.compile(r'\d+')
+
+
+def normalize_location(value):
+    return _NON_WORD.sub(' ', (value or '').lower()).strip()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@lru_cache(maxsize=65536)
+def location_similarity(a, b):
+    """Similarity of two location names between 0 and 1.
+
+    Equal names score 1, a name contained in the other as whole words 0.9,
+    anything else the Jaccard similarity of their padded trigrams. Names
+    with different numbers ("Sector 1", "Sector 12") are different places.
+    """
+    a, b = normalize_location(a), normalize_location(b)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    numbers_a, numbers_b = _NUMBER.findall(a), _NUMBER.findall(b)
+    if numbers_a and numbers_b and numbers_a != numbers_b:
+        return 0.0
+    if f' {a} ' in f' {b} ' or f' {b} ' in f' {a} ':
+        return 0.9
+    grams_a, grams_b = _trigrams(f' {a} '), _trigrams(f' {b} ')
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class LocationIndex:
+    def __init__(self, max_age=300, similarity=0.4, max_matches=200):
+        self.max_age = max_age
+        self.similarity = similarity
+        self.max_matches = max_matches
+        self._lock = threading.Lock()
+        self._names = defaultdict(set)     # normalized name -> stored spellings
+        self._postings = defaultdict(set)  # trigram -> normalized names
+        self._built_at = None
+
+    def _add(self, names, postings, location):
+        key = normalize_location(location)
+        if not key:
+            return
+        if key not in names:
+            for gram in _trigrams(f' {key} '):
+                postings[gram].add(key)
+        names[key].add(location)
+
+    def rebuild(self, locations):
+        names, postings = defaultdict(set), defaultdict(set)
+        for location in locations:
+            self._add(names, postings, location)
+        with self._lock:
+            self._names, self._postings = names, postings
+            self._built_at = time.monotonic()
+
+    def add(self, *locations):
+        with self._lock:
+            for location in locations:
+                self._add(self._names, self._postings, location)
+
+    def is_stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def search(self, term):
+        """Return the stored location names matching ``term``, best first."""
+        query = normalize_location(term)
+        if not query:
+            return []
+
+        with self._lock:
+            if len(query) < 3:
+                # Too short for trigrams; the vocabulary is small enough to scan.
+                # Names with a word starting with the term come first.
+                keys = sorted(
+                    (key for key in self._names if query in key),
+                    key=lambda key: (f' {query}' not in f' {key}', len(key), key)
+                )
+            else:
+                keys = self._ranked(query)
+            matches = []
+            for key in keys[:self.max_matches]:
+                matches.extend(sorted(self._names[key]))
+        return matches
+
+    def _ranked(self, query):
+        # Substring matches: names holding every trigram of the query
+        grams = _trigrams(query)
+        postings = [self._postings.get(gram, ()) for gram in grams]
+        candidates = set.intersection(*map(set, postings)) if all(postings) else set()
+        substring = sorted((key for key in candidates if query in key), key=lambda key: (len(key), key))
+
+        # Fuzzy matches: share of the query's padded trigrams found in the name,
+        # so a misspelt word still matches a longer location name
+        padded = _trigrams(f' {query} ')
+        shared = defaultdict(int)
+        for gram in padded:
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+        seen = set(substring)
+        fuzzy = []
+        for key, count in shared.items():
+            if key in seen:
+                continue
+            score = count / len(padded)
+            if score >= self.similarity:
+                fuzzy.append((score, key))
+        fuzzy.sort(key=lambda item: (-item[0], item[1]))
+
+        return substring + [key for _, key in fuzzy]
@@ -0,0 +1,87 @@
+"""Seat bookkeeping for rides.
+
+``rides.seats_remaining`` and ``rides.passenger_count`` are maintained
+alongside Ride_Participation so pages never need to count participations.
+Each change is one conditional UPDATE, so the check and the write happen
+atomically under the row lock MySQL takes for the update. Call it inside
+the transaction that adds the passenger.
+
+``reconcile_seat_counts`` recomputes both columns from Ride_Participation
+and repairs any drift.
+"""
+
+
+RESERVE_SEAT_QUERY = '''
+    UPDATE rides
+    SET seats_remaining = seats_remaining - 1,
+        passenger_count = passenger_count + 1
+    WHERE ride_id = %s AND status = 'active' AND seats_remaining > 0
+'''
+
+
+def reserve_seat(cursor, ride_id):
+    """Take one seat on an active ride. Returns False when it is full."""
+    cursor.execute(RESERVE_SEAT_QUERY, (ride_id,))
+    return cursor.rowcount == 1
+
+
+RECONCILE_SQLITE = '''
+    UPDATE rides
+    SET passenger_count = p.passengers,
+        seats_remaining = GREATEST(rides.seats_offered - p.passengers, 0)
+    FROM (
+        SELECT r.ride_id, COUNT(rp.participation_id) AS passengers
+        FROM rides r
+        LEFT JOIN Ride_Participation rp ON rp.ride_id = r.ride_id AND rp.role = 'passenger'
+        WHERE r.ride_id BETWEEN %s AND %s
+        GROUP BY r.ride_id
+    ) p
+    WHERE rides.ride_id = p.ride_id AND rides.ride_id BETWEEN %s AND %s
+      AND (rides.passenger_count <> p.passengers
+           OR rides.seats_remaining <> GREATEST(rides.seats_offered - p.passengers, 0))
+'''
+
+
+def reconcile_seat_counts(connection, batch_size=1000):
+    """Repair passenger_count/seats_remaining from Ride_Participation.
+
+    Works through rides in ride_id ranges, committing after each batch so
+    row locks are held briefly. Returns the number of rides repaired.
+
+    Each batch locks its rides before counting, so a passenger accepted
+    meanwhile (reserve_seat locks the same row) is either counted or waits
+    for the repair; a stale count never overwrites it.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute('SELECT COALESCE(MAX(ride_id), 0) FROM rides')
+        last_id = cursor.fetchone()[0]
+        # No read snapshot may predate the first batch's locks
+        connection.commit()
+
+        # SQLite (storage.py) has no UPDATE ... JOIN
+        sqlite = getattr(connection, 'dialect', 'mysql') == 'sqlite'
+        repaired = 0
+        for first in range(1, last_id + 1, batch_size):
+            last = first + batch_size - 1
+            cursor.execute('SELECT ride_id FROM rides WHERE ride_id BETWEEN %s AND %s FOR UPDATE', (first, last))
+            cursor.fetchall()
+            cursor.execute(RECONCILE_SQLITE if sqlite else '''
+                UPDATE rides r
+                LEFT JOIN (
+                    SELECT ride_id, COUNT(*) AS passengers
+                    FROM Ride_Participation
+                    WHERE role = 'passenger' AND ride_id BETWEEN %s AND %s
+                    GROUP BY ride_id
+                ) p ON p.ride_id = r.ride_id
+                SET r.passenger_count = COALESCE(p.passengers, 0),
+                    r.seats_remaining = GREATEST(r.seats_offered - COALESCE(p.passengers, 0), 0)
+                WHERE r.ride_id BETWEEN %s AND %s
+                  AND (r.passenger_count <> COALESCE(p.passengers, 0)
+                       OR r.seats_remaining <> GREATEST(r.seats_offered - COALESCE(p.passengers, 0), 0))
+            ''', (first, last, first, last))
+            repaired += cursor.rowcount
+            connection.commit()
+        return repaired
+    finally:
+        cursor.close()
@@ -0,0 +1,313 @@
+"""Server-side sessions.
+
+The session cookie only carries a random session id; the data lives in a
+SessionStore. Two stores are provided:
+
+* SQLiteSessionStore, a local file shared by the worker processes of one
+  host (the default);
+* KeyValueSessionStore, for a network key/value store shared by several
+  hosts. It works with any client offering the redis-py calls it uses.
+
+Each worker keeps recently used sessions in an LRU cache and trusts a
+cached entry for ``cache_ttl`` seconds, so most requests read no store at
+all. Because the data is server-side, a session can be revoked: logging
+out deletes it, and ``revoke_user`` ends every session of one user. The
+worker doing the revocation forgets them at once; other workers drop them
+from their caches within ``cache_ttl`` seconds.
+"""
+import json
+import secrets
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class SessionStore(ABC):
+    """Where session records live.
+
+    A record is a (user_id, payload, expires_at) tuple: the id of the
+    logged-in user or None, the serialized session data and a Unix time.
+    """
+
+    @abstractmethod
+    def load(self, sid):
+        """The record for ``sid``, or None."""
+
+    @abstractmethod
+    def save(self, sid, user_id, payload, expires_at):
+        pass
+
+    @abstractmethod
+    def update(self, sid, user_id, payload, expires_at):
+        """Overwrite an existing record; returns False if it is gone (revoked)."""
+
+    @abstractmethod
+    def delete(self, sid):
+        pass
+
+    @abstractmethod
+    def delete_user(self, user_id):
+        """Delete every session of ``user_id``; returns how many."""
+
+    def purge_expired(self):
+        """Delete expired records; stores that expire them on their own return 0."""
+        return 0
+
+
+class SQLiteSessionStore(SessionStore):
+    # One connection per thread, opened on first use, so connections are
+    # never shared across a fork. WAL lets readers run alongside a writer.
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        connection = sqlite3.connect(path, timeout=timeout)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    sid TEXT PRIMARY KEY,
+                    user_id INTEGER,
+                    payload TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            connection.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)')
+            connection.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit: every statement below is a transaction on its own
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def load(self, sid):
+        row = self._connection().execute(
+            'SELECT user_id, payload, expires_at FROM sessions WHERE sid = ?', (sid,)).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, sid, user_id, payload, expires_at):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO sessions (sid, user_id, payload, expires_at) VALUES (?, ?, ?, ?)',
+            (sid, user_id, payload, expires_at))
+
+    def update(self, sid, user_id, payload, expires_at):
+        return self._connection().execute(
+            'UPDATE sessions SET user_id = ?, payload = ?, expires_at = ? WHERE sid = ?',
+            (user_id, payload, expires_at, sid)).rowcount > 0
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def delete_user(self, user_id):
+        return self._connection().execute('DELETE FROM sessions WHERE user_id = ?', (user_id,)).rowcount
+
+    def purge_expired(self):
+        return self._connection().execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),)).rowcount
+
+
+class KeyValueSessionStore(SessionStore):
+    """Sessions in a network key/value store such as Redis.
+
+    ``client`` needs get, set(ex=, xx=), delete, sadd, smembers and expire
+    with redis-py semantics, returning str (decode_responses=True). Records
+    expire on their own; each user's session ids are kept in a set so they
+    can be revoked together.
+    """
+
+    def __init__(self, client, prefix='session:'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, sid):
+        return self.prefix + sid
+
+    def _user_key(self, user_id):
+        return f'{self.prefix}user:{user_id}'
+
+    def load(self, sid):
+        value = self.client.get(self._key(sid))
+        return tuple(json.loads(value)) if value else None
+
+    def save(self, sid, user_id, payload, expires_at, existing=False):
+        ttl = max(int(expires_at - time.time()), 1)
+        if not self.client.set(self._key(sid), json.dumps([user_id, payload, expires_at]), ex=ttl, xx=existing):
+            return False
+        if user_id is not None:
+            user_key = self._user_key(user_id)
+            self.client.sadd(user_key, sid)
+            self.client.expire(user_key, ttl)
+        return True
+
+    def update(self, sid, user_id, payload, expires_at):
+        return self.save(sid, user_id, payload, expires_at, existing=True)
+
+    def delete(self, sid):
+        # The id stays in its user's set until that set expires or is revoked
+        self.client.delete(self._key(sid))
+
+    def delete_user(self, user_id):
+        user_key = self._user_key(user_id)
+        keys = [self._key(sid) for sid in self.client.smembers(user_key)]
+        deleted = self.client.delete(*keys) if keys else 0
+        self.client.delete(user_key)
+        return deleted
+
+
+def create_session_store(backend, sqlite_path=None, redis_url=None):
+    if backend == 'sqlite':
+        return SQLiteSessionStore(sqlite_path)
+    if backend == 'redis':
+        import redis
+        return KeyValueSessionStore(redis.Redis.from_url(redis_url, decode_responses=True))
+    raise ValueError(f'Unknown session backend: {backend}')
+
+
+class SessionCache:
+    """Per-worker LRU cache of session records, each trusted for ``ttl`` seconds."""
+
+    def __init__(self, max_entries=10000, ttl=10.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # sid -> (cached_at, record), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None or entry[0] + self.ttl <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sid)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, sid, record):
+        with self._lock:
+            self._entries[sid] = (time.monotonic(), record)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for sid in [sid for sid, (_, record) in self._entries.items() if record[0] == user_id]:
+                del self._entries[sid]
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid          # None until the session is first saved
+        self.modified = False
+        self.previous_sid = None
+
+    def rotate(self):
+        """Move the data to a fresh session id, e.g. on login against session fixation."""
+        if self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, cache_size=10000, cache_ttl=10.0):
+        self.store = store
+        self.cache = SessionCache(max_entries=cache_size, ttl=cache_ttl)
+
+    def load(self, sid):
+        """The data of session ``sid``, or None if it does not exist or has expired."""
+        record = self.cache.get(sid)
+        if record is None:
+            record = self.store.load(sid)
+            if record is None:
+                return None
+            self.cache.put(sid, record)
+        if record[2] <= time.time():
+            self.delete(sid)
+            return None
+        return self.serializer.loads(record[1])
+
+    def delete(self, sid):
+        self.store.delete(sid)
+        self.cache.discard(sid)
+
+    def revoke_user(self, user_id):
+        """End every session of ``user_id``; returns how many were deleted."""
+        count = self.store.delete_user(user_id)
+        self.cache.discard_user(user_id)
+        return count
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        data = self.load(sid) if sid else None
+        if data is None:
+            return ServerSession()
+        return ServerSession(data, sid=sid)
+
+    def save_session(self, app, session, response):
+        name = app.config['SESSION_COOKIE_NAME']
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.previous_sid is not None:
+            self.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.sid is not None and session.modified:
+                self.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        response.vary.add('Cookie')
+        if not session.modified:
+            return
+
+        record = (session.get('user_id'), self.serializer.dumps(dict(session)),
+                  time.time() + app.permanent_session_lifetime.total_seconds())
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            self.store.save(session.sid, *record)
+        elif not self.store.update(session.sid, *record):
+            # Revoked by another worker since it was loaded; do not bring it back
+            self.cache.discard(session.sid)
+            response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                   samesite=samesite, httponly=httponly)
+            return
+        self.cache.put(session.sid, record)
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly)
+
+    def stats(self):
+        return {'store': type(self.store).__name__, 'cache': self.cache.stats()}
@@ -0,0 +1,344 @@
+"""Database backends behind get_db_connection().
+
+DB_BACKEND=mysql (the default) uses db.ConnectionPool. DB_BACKEND=sqlite
+runs the same handlers on an embedded SQLite database (DB_SQLITE_PATH), so
+the app, the matching engine and the benchmarks work without a MySQL
+server, and a single-node deployment can skip MySQL altogether.
+
+SQLiteDatabase has the ConnectionPool interface. Its connections and
+cursors behave like mysql.connector's where the app relies on them:
+
+* statements are translated from MySQL's dialect (``%s`` placeholders,
+  CURDATE()/CURTIME(), GREATEST, UPDATE ... LIMIT, SELECT ... FOR UPDATE);
+* ``cursor(dictionary=True)`` returns rows as dicts, and DATE, TIME and
+  TIMESTAMP columns come back as date, timedelta and datetime;
+* sqlite3 errors are raised as the matching mysql.connector errors, so
+  the handlers' ``except`` clauses need no change.
+
+SQLite allows one writer at a time. ``SELECT ... FOR UPDATE`` therefore
+starts the transaction with ``BEGIN IMMEDIATE``, taking the write lock up
+front. Other writers wait up to DB_POOL_TIMEOUT seconds for it. The
+schema comes from db_sqlite.sql. With ``:memory:`` the data lives in one
+connection and is lost on exit, so that mode only suits a single
+process.
+"""
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, time as time_of_day, timedelta
+
+from mysql.connector import errors
+
+from db import ConnectionPool, PoolExhausted
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db_sqlite.sql')
+
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE(\s+SKIP\s+LOCKED|\s+NOWAIT)?', re.I)
+_FUNCTIONS = [
+    (re.compile(r'\bCURDATE\(\)', re.I), "date('now', 'localtime')"),
+    (re.compile(r'\bCURTIME\(\)', re.I), "time('now', 'localtime')"),
+    (re.compile(r'\bNOW\(\)', re.I), "datetime('now', 'localtime')"),
+    (re.compile(r'\bGREATEST\(', re.I), 'MAX('),
+    (re.compile(r'\bLEAST\(', re.I), 'MIN('),
+]
+_PARAM = re.compile(r'%([s%])')
+# SQLite has no LIMIT on UPDATE/DELETE; limit the rowids instead
+_UPDATE_LIMIT = re.compile(r'^\s*UPDATE\s+(\w+)\s+(SET\s.*?)\s+WHERE\s+(.*\sLIMIT\s+(?:\?|\d+))\s*$', re.I | re.S)
+_DELETE_LIMIT = re.compile(r'^\s*DELETE\s+FROM\s+(\w+)\s+WHERE\s+(.*\sLIMIT\s+(?:\?|\d+))\s*$', re.I | re.S)
+_HH_MM = re.compile(r'^\d{2}:\d{2}$')
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql):
+    """Returns (sqlite_sql, locks): ``locks`` if the statement was SELECT ... FOR UPDATE."""
+    sql, locks = _FOR_UPDATE.subn('', sql)
+    for pattern, replacement in _FUNCTIONS:
+        sql = pattern.sub(replacement, sql)
+    sql = _PARAM.sub(lambda m: '?' if m.group(1) == 's' else '%', sql)
+
+    match = _UPDATE_LIMIT.match(sql)
+    if match:
+        table, assignments, condition = match.groups()
+        sql = f'UPDATE {table} {assignments} WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition})'
+    match = _DELETE_LIMIT.match(sql)
+    if match:
+        table, condition = match.groups()
+        sql = f'DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {condition})'
+
+    if re.match(r'\s*EXPLAIN\s', sql, re.I) and not re.match(r'\s*EXPLAIN\s+QUERY\s+PLAN\s', sql, re.I):
+        sql = re.sub(r'^\s*EXPLAIN', 'EXPLAIN QUERY PLAN', sql, count=1, flags=re.I)
+    return sql, bool(locks)
+
+
+def _format_timedelta(value):
+    seconds = int(value.total_seconds())
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+def _parse_time(value):
+    parts = [int(part) for part in value.decode().split('.')[0].split(':')]
+    return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2] if len(parts) > 2 else 0)
+
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(timedelta, _format_timedelta)
+sqlite3.register_adapter(time_of_day, lambda value: value.strftime('%H:%M:%S'))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('TIME', _parse_time)
+
+
+def _param(value):
+    # MySQL stores '08:30' from a time input as 08:30:00; text comparisons
+    # on TIME columns need the same form
+    if isinstance(value, str) and _HH_MM.match(value):
+        return value + ':00'
+    return value
+
+
+def _params(params):
+    return tuple(_param(value) for value in params) if params else ()
+
+
+def _mysql_error(e):
+    if isinstance(e, sqlite3.IntegrityError):
+        cls = errors.IntegrityError
+    elif isinstance(e, sqlite3.OperationalError):
+        cls = errors.OperationalError
+    elif isinstance(e, sqlite3.ProgrammingError):
+        cls = errors.ProgrammingError
+    else:
+        cls = errors.DatabaseError
+    return cls(msg=str(e))
+
+
+class SQLiteCursor:
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+        self._dictionary = dictionary
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def execute(self, operation, params=None):
+        sql, locks = translate(operation)
+        try:
+            if locks and not self._connection.in_transaction:
+                self._cursor.execute('BEGIN IMMEDIATE')
+            self._cursor.execute(sql, _params(params))
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def executemany(self, operation, seq_params):
+        sql, _ = translate(operation)
+        try:
+            self._cursor.executemany(sql, [_params(params) for params in seq_params])
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """A sqlite3 connection with the parts of the mysql.connector API the app uses."""
+
+    dialect = 'sqlite'
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        try:
+            self.raw.commit()
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+def connect_sqlite(path, timeout=5.0, schema_path=SCHEMA_PATH):
+    """Open ``path``, creating the schema if needed."""
+    # Pooled connections move between threads, one thread at a time;
+    # implicit transactions start with BEGIN IMMEDIATE before the first write
+    raw = sqlite3.connect(path, timeout=timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                          isolation_level='IMMEDIATE', check_same_thread=False)
+    raw.execute('PRAGMA foreign_keys = ON')
+    if path != ':memory:':
+        raw.execute('PRAGMA journal_mode = WAL')
+        raw.execute('PRAGMA synchronous = NORMAL')
+    with open(schema_path) as f:
+        raw.executescript(f.read())
+    return SQLiteConnection(raw)
+
+
+class SQLiteDatabase:
+    """A pool of SQLite connections with the ConnectionPool interface.
+
+    ``:memory:`` keeps a single connection, since each in-memory
+    connection is a database of its own; requests take turns on it.
+    """
+
+    def __init__(self, path, size=4, timeout=5.0):
+        self.path = path
+        self.size = 1 if path == ':memory:' else size
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._idle = []
+        self._checked_out = set()
+        self._open = 0
+        self._stats = {'checkouts': 0, 'waits': 0, 'wait_time': 0.0, 'exhausted': 0, 'created': 0, 'peak_in_use': 0}
+
+    def acquire(self, wait=True):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._cond:
+            if not wait and not self._idle and self._open >= self.size:
+                return None
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['exhausted'] += 1
+                    raise PoolExhausted(msg=f'No database connection available after {self.timeout}s '
+                                            f'({self._open} of {self.size} in use)')
+                waited = True
+                self._cond.wait(remaining)
+
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += time.monotonic() - started
+            self._stats['checkouts'] += 1
+            connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                self._open += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._open - len(self._idle))
+
+        if connection is None:
+            try:
+                connection = connect_sqlite(self.path, timeout=self.timeout)
+            except sqlite3.Error as e:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise _mysql_error(e) from e
+            with self._cond:
+                self._stats['created'] += 1
+
+        with self._cond:
+            self._checked_out.add(connection)
+        return connection
+
+    def release(self, connection):
+        with self._cond:
+            if connection not in self._checked_out:
+                return
+            self._checked_out.discard(connection)
+        # Never hand out a connection with a half-finished transaction
+        if connection.in_transaction:
+            connection.rollback()
+        with self._cond:
+            self._idle.append(connection)
+            self._cond.notify()
+
+    def reset_after_fork(self):
+        """Drop connections inherited from the parent; SQLite connections must not cross a fork.
+
+        The single ``:memory:`` connection is the database itself, so it is kept.
+        """
+        self._cond = threading.Condition()
+        self._checked_out = set()
+        if self.path != ':memory:':
+            self._idle = []
+            self._open = 0
+
+    def close_all(self):
+        if self.path == ':memory:':
+            return
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+        return stats
+
+
+def create_database(config, db_config):
+    """The connection pool for config['DB_BACKEND']."""
+    if config['DB_BACKEND'] == 'sqlite':
+        return SQLiteDatabase(config['DB_SQLITE_PATH'], size=config['DB_POOL_SIZE'],
+                              timeout=config['DB_POOL_TIMEOUT'])
+    if config['DB_BACKEND'] == 'mysql':
+        return ConnectionPool(
+            db_config,
+            size=config['DB_POOL_SIZE'],
+            timeout=config['DB_POOL_TIMEOUT'],
+            max_lifetime=config['DB_POOL_MAX_LIFETIME'],
+            ping_after=config['DB_POOL_PING_AFTER'],
+        )
+    raise ValueError(f"Unknown DB_BACKEND: {config['DB_BACKEND']}")
+
+
+def connect(config):
+    """One connection for command-line tools (seeding, sweeps, archival)."""
+    if config['DB_BACKEND'] == 'sqlite':
+        return connect_sqlite(config['DB_SQLITE_PATH'], timeout=config['DB_POOL_TIMEOUT'])
+    import mysql.connector
+    from config import db_config
+    return mysql.connector.connect(**db_config(config))
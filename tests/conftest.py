@@ -0,0 +1,62 @@
+"""Fixtures on the embedded SQLite backend (storage.py); no MySQL server needed."""
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SQLiteDatabase  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    # A file, so several threads can each hold a connection
+    db = SQLiteDatabase(str(tmp_path / 'rides.sqlite3'), size=8)
+    yield db
+    db.close_all()
+
+
+@pytest.fixture
+def driver(database):
+    """(user id, vehicle id) of a driver with a car."""
+    connection = database.acquire()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('''
+            INSERT INTO users (roll_number, college_name, email, password_hash)
+            VALUES (%s, %s, %s, %s)
+        ''', ('D001', 'Test College', 'driver@example.com', 'x'))
+        user_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO vehicle (user_id, vehicle_no, vehicle_model, seats_available)
+            VALUES (%s, %s, %s, %s)
+        ''', (user_id, 'KA01AB1234', 'Swift', 4))
+        vehicle_id = cursor.lastrowid
+        connection.commit()
+        return user_id, vehicle_id
+    finally:
+        database.release(connection)
+
+
+@pytest.fixture
+def add_ride(database, driver):
+    """Inserts an active ride and returns its id."""
+    driver_id, vehicle_id = driver
+
+    def add(ride_date=None, ride_time='08:30', seats=3):
+        connection = database.acquire()
+        try:
+            cursor = connection.cursor()
+            cursor.execute('''
+                INSERT INTO rides (driver_id, vehicle_id, source_location, destination_location,
+                                   ride_date, ride_time, seats_offered, seats_remaining)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ''', (driver_id, vehicle_id, 'Hostel', 'Campus',
+                  ride_date or date.today() + timedelta(days=1), ride_time, seats, seats))
+            connection.commit()
+            return cursor.lastrowid
+        finally:
+            database.release(connection)
+    return add
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from cache import TTLCache
+
+
+def test_invalidate_drops_one_key_or_all():
+    cache = TTLCache(ttl=60)
+    cache.set('rides', [1])
+    cache.set('locations', ['Hostel'])
+
+    cache.invalidate('rides')
+    assert cache.get('rides') is None
+    assert cache.get('locations') == ['Hostel']
+
+    cache.invalidate()
+    assert cache.get('locations') is None
+
+
+def test_reload_after_invalidate():
+    cache = TTLCache(ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get_or_load('rides', loader) == 1
+    assert cache.get_or_load('rides', loader) == 1
+    cache.invalidate('rides')
+    assert cache.get_or_load('rides', loader) == 2
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = TTLCache(ttl=60)
+    loading = threading.Event()
+    invalidated = threading.Event()
+
+    def stale_loader():
+        # Reads the old rows, then a writer commits and invalidates
+        loading.set()
+        invalidated.wait(5)
+        return 'stale'
+
+    thread = threading.Thread(target=cache.get_or_load, args=('rides', stale_loader))
+    thread.start()
+    loading.wait(5)
+    cache.invalidate('rides')
+    invalidated.set()
+    thread.join()
+
+    assert cache.get('rides') is None
+    assert cache.get_or_load('rides', lambda: 'fresh') == 'fresh'
+
+
+def test_expired_entries_are_misses():
+    cache = TTLCache(ttl=0)
+    cache.set('rides', [1])
+    assert cache.get('rides') is None
+
+
+def test_concurrent_misses_load_once():
+    cache = TTLCache(ttl=60)
+    calls = []
+    start = threading.Barrier(8)
+    results = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'rides'
+
+    def reader():
+        start.wait()
+        results.append(cache.get_or_load('rides', loader))
+
+    threads = [threading.Thread(target=reader) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['rides'] * 8
+    assert cache._loading == {}
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+import repository
+from pagination import decode_cursor, encode_cursor, split_page
+
+
+def test_cursor_round_trip(database, add_ride):
+    next_week = date.today() + timedelta(days=7)
+    ride_id = add_ride(ride_date=next_week, ride_time='07:05')
+    connection = database.acquire()
+    try:
+        ride, = repository.list_upcoming_rides(connection, None, 10)
+    finally:
+        database.release(connection)
+
+    assert decode_cursor(encode_cursor(ride)) == (next_week, timedelta(hours=7, minutes=5), ride_id)
+
+
+def test_pages_cover_every_ride_once(database, add_ride):
+    tomorrow = date.today() + timedelta(days=1)
+    # Equal dates and times, so the ride id has to break the tie
+    expected = [add_ride(ride_date=tomorrow, ride_time=time) for time in ('09:00', '08:00', '08:00', '08:00', '10:00')]
+    expected = [expected[1], expected[2], expected[3], expected[0], expected[4]]
+
+    seen = []
+    position = None
+    connection = database.acquire()
+    try:
+        while True:
+            rows = repository.list_upcoming_rides(connection, position, 2 + 1)
+            rows, cursor = split_page(rows, 2)
+            seen += [ride.ride_id for ride in rows]
+            if cursor is None:
+                break
+            position = decode_cursor(cursor)
+    finally:
+        database.release(connection)
+
+    assert seen == expected
+
+
+def test_bad_cursor_is_ignored():
+    assert decode_cursor('') is None
+    assert decode_cursor('not-a-cursor') is None
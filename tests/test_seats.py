@@ -0,0 +1,47 @@
+import threading
+
+from seats import reserve_seat
+
+
+def test_concurrent_reservations_never_overbook(database, add_ride):
+    ride_id = add_ride(seats=3)
+    start = threading.Barrier(12)
+    results = []
+
+    def passenger():
+        start.wait()
+        connection = database.acquire()
+        try:
+            cursor = connection.cursor()
+            results.append(reserve_seat(cursor, ride_id))
+            connection.commit()
+        finally:
+            database.release(connection)
+
+    # More passengers than pooled connections, so some wait for the pool too
+    threads = [threading.Thread(target=passenger) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 3
+    assert results.count(False) == 9
+    connection = database.acquire()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT seats_remaining, passenger_count FROM rides WHERE ride_id = %s', (ride_id,))
+        assert cursor.fetchone() == (0, 3)
+    finally:
+        database.release(connection)
+
+
+def test_no_seat_on_a_cancelled_ride(database, add_ride):
+    ride_id = add_ride(seats=2)
+    connection = database.acquire()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("UPDATE rides SET status = 'cancelled' WHERE ride_id = %s", (ride_id,))
+        assert not reserve_seat(cursor, ride_id)
+    finally:
+        database.release(connection)
@@ -0,0 +1,75 @@
+from http.cookies import SimpleCookie
+
+import pytest
+from flask import Flask, session
+
+from sessions import ServerSessionInterface, SQLiteSessionStore
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSessionInterface(SQLiteSessionStore(str(tmp_path / 'sessions.sqlite3')))
+
+    @app.route('/visit')
+    def visit():
+        session['visits'] = session.get('visits', 0) + 1
+        return str(session['visits'])
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session.rotate()
+        session['user_id'] = user_id
+        return 'ok'
+
+    @app.route('/whoami')
+    def whoami():
+        return str(session.get('user_id'))
+
+    return app
+
+
+def session_id(response, app):
+    """The session id a response set in its cookie."""
+    return SimpleCookie(response.headers['Set-Cookie'])[app.config['SESSION_COOKIE_NAME']].value
+
+
+def test_login_rotates_the_session_id(app):
+    interface = app.session_interface
+    client = app.test_client()
+    before = session_id(client.get('/visit'), app)
+
+    after = session_id(client.get('/login/7'), app)
+
+    assert after and after != before
+    # The pre-login id is gone, so a fixed id cannot be reused
+    assert interface.store.load(before) is None
+    assert interface.load(after) == {'visits': 1, 'user_id': 7}
+    assert client.get('/whoami').get_data(as_text=True) == '7'
+
+
+def test_revoke_user_ends_every_session(app):
+    interface = app.session_interface
+    phone, laptop, other = app.test_client(), app.test_client(), app.test_client()
+    phone.get('/login/7')
+    laptop.get('/login/7')
+    other.get('/login/8')
+
+    assert interface.revoke_user(7) == 2
+
+    assert phone.get('/whoami').get_data(as_text=True) == 'None'
+    assert laptop.get('/whoami').get_data(as_text=True) == 'None'
+    assert other.get('/whoami').get_data(as_text=True) == '8'
+
+
+def test_revoked_session_is_not_saved_back(app):
+    interface = app.session_interface
+    client = app.test_client()
+    sid = session_id(client.get('/login/7'), app)
+    # Revoked in the store by another worker; this worker still caches it
+    interface.store.delete_user(7)
+
+    client.get('/visit')
+
+    assert interface.store.load(sid) is None
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+
+from storage import translate
+
+
+def test_update_limit_becomes_a_rowid_subquery():
+    sql, locks = translate("UPDATE rides SET status = 'completed' WHERE status = 'active' LIMIT %s")
+    assert sql == ("UPDATE rides SET status = 'completed' WHERE rowid IN "
+                   "(SELECT rowid FROM rides WHERE status = 'active' LIMIT ?)")
+    assert not locks
+
+
+def test_delete_limit_becomes_a_rowid_subquery():
+    sql, _ = translate('DELETE FROM rides WHERE ride_date < %s LIMIT 500')
+    assert sql == 'DELETE FROM rides WHERE rowid IN (SELECT rowid FROM rides WHERE ride_date < ? LIMIT 500)'
+
+
+def test_for_update_is_dropped_and_reported():
+    assert translate('SELECT seats_remaining FROM rides WHERE ride_id = %s FOR UPDATE') == \
+        ('SELECT seats_remaining FROM rides WHERE ride_id = ?', True)
+    assert translate('SELECT ride_id FROM rides FOR UPDATE SKIP LOCKED') == ('SELECT ride_id FROM rides', True)
+    assert translate('SELECT ride_id FROM rides WHERE ride_id = %s') == ('SELECT ride_id FROM rides WHERE ride_id = ?', False)
+
+
+def test_update_limit_only_touches_the_limit(database, add_ride):
+    yesterday = date.today() - timedelta(days=1)
+    for _ in range(5):
+        add_ride(ride_date=yesterday)
+    connection = database.acquire()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('''
+            UPDATE rides SET status = 'completed'
+            WHERE status = 'active' AND ride_date < CURDATE()
+            LIMIT %s
+        ''', (2,))
+        assert cursor.rowcount == 2
+        connection.commit()
+        cursor.execute('SELECT status, COUNT(*) FROM rides GROUP BY status ORDER BY status')
+        assert cursor.fetchall() == [('active', 3), ('completed', 2)]
+    finally:
+        database.release(connection)
+
+
+def test_for_update_takes_the_write_lock(database):
+    connection = database.acquire()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT ride_id FROM rides WHERE ride_id = %s FOR UPDATE', (1,))
+        cursor.fetchall()
+        # BEGIN IMMEDIATE: the transaction holds the write lock before any write
+        assert connection.in_transaction
+        connection.rollback()
+    finally:
+        database.release(connection)